@@ -0,0 +1,61 @@
+from typing import Dict, Any, List
+from loguru import logger
+
+class AgentContext:
+    """Per-session conversation state for one agent.
+
+    The underlying Autogen agent only holds configuration, so a single
+    instance can serve many sessions as long as each session passes its own
+    context to ``BaseAgent.process_message``.
+    """
+
+    __slots__ = ("agent_name", "message_history", "summary", "state")
+
+    def __init__(self, agent_name: str = None):
+        self.agent_name = agent_name
+        self.message_history: List[Dict[str, str]] = []
+        # Running summary of messages folded out of message_history
+        self.summary = ""
+        self.state: Dict[str, Any] = {}
+
+    def clear(self):
+        """Forget the conversation but keep the context usable."""
+        self.message_history = []
+        self.summary = ""
+        self.state = {}
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {"message_history": self.message_history, "summary": self.summary, "state": self.state}
+
+    def restore(self, payload: Dict[str, Any]):
+        """Take over a conversation saved with ``to_payload``."""
+        self.message_history = list(payload.get("message_history", []))
+        self.summary = payload.get("summary", "")
+        self.state = dict(payload.get("state", {}))
+
+    def reset(self, agent_name: str = None):
+        """Prepare the context for reuse by another session."""
+        self.agent_name = agent_name
+        self.clear()
+
+class AgentContextPool:
+    """Recycles AgentContext objects between sessions."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._free: List[AgentContext] = []
+
+    def acquire(self, agent_name: str) -> AgentContext:
+        if self._free:
+            context = self._free.pop()
+            context.reset(agent_name)
+            return context
+        return AgentContext(agent_name)
+
+    def release(self, context: AgentContext):
+        if len(self._free) < self.max_size:
+            context.reset()
+            self._free.append(context)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"free": len(self._free), "max_size": self.max_size}
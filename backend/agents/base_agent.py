@@ -1,95 +1,454 @@
-from typing import Dict, Any, List
-import autogen
+from typing import Dict, Any, List, AsyncIterator
+import asyncio
+import time
 from loguru import logger
-from services.websocket_manager import WebSocketManager
+from services.websocket_manager import WebSocketManager, DeltaCoalescer
+from services.response_cache import ResponseCache
+from services.single_flight import SingleFlight
+from services.llm_scheduler import LLMScheduler, PRIORITY_CHAT
+from services.hedging import Hedger
+from services.metrics import AGENT_PROCESS_SECONDS, LLM_CALL_SECONDS, LLM_TIME_TO_FIRST_TOKEN_SECONDS, LLM_TOKENS
+from services.tracing import tracer
+from config import Config
+from .agent_context import AgentContext
+from .context_budget import ContextBudgetManager, estimate_tokens, estimate_message_tokens
+from .llm_backend import LLMBackend, create_backend
+
+# Shared by all agents unless one is given its own cache, or None for no caching
+default_response_cache = ResponseCache.from_config(Config)
+# Default for BaseAgent's response_cache: use default_response_cache
+_SHARED_CACHE = object()
+# Identical requests in flight at the same time share one upstream call
+default_single_flight = SingleFlight()
+# Every model call goes through the scheduler's concurrency and rate limits
+default_scheduler = LLMScheduler.from_config(Config)
+# Duplicates slow calls to the hedge backend and tracks backend health
+default_hedger = Hedger.from_config(Config)
+
+# Reply that accepts a speculative draft unchanged
+ACCEPT_DRAFT = "ACCEPT_DRAFT"
 
 class BaseAgent:
-    def __init__(self, name: str, system_message: str, ws_manager: WebSocketManager = None):
+    def __init__(self, name: str, system_message: str, ws_manager: WebSocketManager = None, response_cache: ResponseCache = _SHARED_CACHE):
         self.name = name
         self.system_message = system_message
-        self.agent = None
+        self.backend: LLMBackend = None
         self.ws_manager = ws_manager
-        self.message_history = []  # Store message history
+        # Used when no per-session context is passed to process_message
+        self.default_context = AgentContext(name)
+        self.llm_config = {
+            "config_list": [{"model": Config.MODEL_NAME}],
+            "temperature": 0.7,
+            "timeout": Config.AGENT_TIMEOUT,
+            "max_tokens": Config.MAX_TOKENS,
+        }
+        self.response_cache = default_response_cache if response_cache is _SHARED_CACHE else response_cache
+        self.single_flight = default_single_flight
+        self.scheduler = default_scheduler
+        self.hedger = default_hedger
+        self.latency_budget = Config.AGENT_LATENCY_BUDGETS.get(name, Config.AGENT_TIMEOUT)
+        # Second backend to hedge slow calls to, if hedging is enabled
+        self.hedge_backend: LLMBackend = None
+        self.context_budget = ContextBudgetManager.from_config(Config)
         self._initialize_agent()
     
     def _initialize_agent(self):
-        """Initialize the Autogen agent with the given configuration."""
-        self.agent = autogen.AssistantAgent(
-            name=self.name,
-            system_message=self.system_message,
-            llm_config={
-                "config_list": [{"model": "gpt-4o-mini"}],
-                "temperature": 0.7,
-                "timeout": 300,
-            }
-        )
+        """Create the model backend selected by Config.LLM_BACKEND."""
+        self.backend = create_backend(Config, self.name, self.system_message, self.llm_config)
+        if Config.HEDGING_ENABLED:
+            self.hedge_backend = create_backend(
+                Config,
+                self.name,
+                self.system_message,
+                {**self.llm_config, "config_list": Config.HEDGE_CONFIG_LIST},
+                hedge=True
+            )
+
+    def warm_up(self):
+        """Build the model clients now instead of on the first message. Blocking."""
+        self.backend.warm_up()
+        if self.hedge_backend is not None:
+            self.hedge_backend.warm_up()
+
+    @property
+    def message_history(self) -> List[Dict[str, str]]:
+        """History of the default context."""
+        return self.default_context.message_history
     
-    def add_to_history(self, role: str, content: str):
+    def _resolve_context(self, agent_context: AgentContext = None) -> AgentContext:
+        return agent_context if agent_context is not None else self.default_context
+    
+    def add_to_history(self, role: str, content: str, agent_context: AgentContext = None):
         """Add a message to the history."""
-        self.message_history.append({"role": role, "content": content})
+        self._resolve_context(agent_context).message_history.append({"role": role, "content": content})
     
-    def get_history(self) -> List[Dict[str, str]]:
+    def get_history(self, agent_context: AgentContext = None) -> List[Dict[str, str]]:
         """Get the message history."""
-        return self.message_history
+        return self._resolve_context(agent_context).message_history
     
-    def clear_history(self):
+    def clear_history(self, agent_context: AgentContext = None):
         """Clear the message history."""
-        self.message_history = []
+        self._resolve_context(agent_context).clear()
     
-    def get_conversation_context(self) -> str:
+    def get_conversation_context(self, agent_context: AgentContext = None) -> str:
         """Get a formatted string of the conversation history."""
-        if not self.message_history:
+        agent_context = self._resolve_context(agent_context)
+        if not agent_context.message_history and not agent_context.summary:
             return ""
         
-        context = "Previous conversation:\n"
-        for msg in self.message_history:
+        parts = ["Previous conversation:"]
+        if agent_context.summary:
+            parts.append(f"Summary of earlier messages:\n{agent_context.summary}\n")
+        for msg in agent_context.message_history:
             role = "User" if msg["role"] == "user" else self.name
-            context += f"{role}: {msg['content']}\n\n"
-        return context
+            parts.append(f"{role}: {msg['content']}\n")
+        return "\n".join(parts) + "\n"
     
-    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None, previous_agent_response: str = None) -> str:
-        """Process a message and return the agent's response."""
-        try:
-            if self.ws_manager and client_id:
-                await self.ws_manager.send_agent_trace(client_id, self.name, f"Starting to process message: {message}")
-            
-            # Get conversation context
-            conversation_context = self.get_conversation_context()
-            
-            # Prepare the full message with context
-            full_message = message
-            if conversation_context:
-                full_message = f"{conversation_context}\nCurrent message: {message}"
-            
-            # Add previous agent's response if available
-            if previous_agent_response:
-                full_message = f"""Previous agent's response:
+    def _build_messages(self, message: str, agent_context: AgentContext, previous_agent_response: str = None) -> List[Dict[str, str]]:
+        """Build the chat messages for the current turn.
+        
+        The history is sent as chat messages, trimmed to the context budget
+        with older turns summarized; upstream agents' output is only added
+        to the current turn so it is not repeated on later turns.
+        """
+        self.context_budget.fit(agent_context, reserved_tokens=estimate_tokens(previous_agent_response))
+        
+        messages = list(agent_context.message_history)
+        if previous_agent_response:
+            messages = messages[:-1] + [{
+                "role": "user",
+                "content": f"""Previous agent's response:
 {previous_agent_response}
 
-{full_message}"""
-            
-            # Add message to history
-            self.add_to_history("user", message)
-            
-            response = await self.agent.a_generate_reply(
-                messages=self.message_history,
-                sender=self.agent,
-                context=context
+Current message: {message}"""
+            }]
+        return self.context_budget.build_messages(agent_context, messages)
+    
+    def _build_refine_messages(self, messages: List[Dict[str, str]], draft: str) -> List[Dict[str, str]]:
+        """Ask the model to check a speculative draft against the current turn."""
+        current = messages[-1]
+        return messages[:-1] + [{
+            "role": current["role"],
+            "content": f"""{current['content']}
+
+Your draft answer, written before the previous agent's response was available:
+{draft}
+
+If the draft already answers the current message well, reply with exactly {ACCEPT_DRAFT}. Otherwise reply with the revised answer."""
+        }]
+    
+    async def draft_reply(self, message: str, context: Dict[str, Any] = None, client_id: str = None, agent_context: AgentContext = None, use_cache: bool = True, priority: int = PRIORITY_CHAT, **kwargs) -> str:
+        """Speculatively answer ``message`` before upstream agents have finished.
+        
+        Nothing is added to the history and nothing is sent to the client;
+        the draft is passed back to ``process_message`` once the upstream
+        output is known.
+        """
+        agent_context = self._resolve_context(agent_context)
+        self.context_budget.fit(agent_context)
+        messages = self.context_budget.build_messages(
+            agent_context,
+            list(agent_context.message_history) + [{"role": "user", "content": message}]
+        )
+        return await self._generate_reply(messages, context, client_id, False, None, use_cache, priority)
+    
+    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None, previous_agent_response: str = None, agent_context: AgentContext = None, stream: bool = False, agent_id: str = None, use_cache: bool = True, priority: int = PRIORITY_CHAT, draft: str = None, refine_draft: bool = True, speculation: Dict[str, Any] = None) -> str:
+        """Process a message and return the agent's response.
+        
+        ``agent_context`` holds the session's history for this agent; the
+        agent's default context is used when it is omitted. With ``stream``
+        the reply is also pushed to the client as ``agent_delta`` frames
+        while it is generated. ``use_cache=False`` bypasses the response cache.
+        ``priority`` selects the scheduler lane for the model call.
+        
+        A ``draft`` from ``draft_reply`` is used as the response, after the
+        model has checked it against ``previous_agent_response`` when
+        ``refine_draft`` is set. ``speculation["accepted"]`` tells whether
+        the draft was kept unchanged.
+        
+        The call runs in an ``agent.process`` span under the caller's
+        current trace span, so model calls and frames it sends nest under it.
+        """
+        with tracer.span("agent.process", agent=self.name, stream=stream, draft=draft is not None):
+            started_at = time.monotonic()
+            try:
+                if self.ws_manager and client_id:
+                    await self.ws_manager.send_agent_trace(client_id, self.name, f"Starting to process message: {message}")
+                
+                # Hold on to the history list itself: if the context is cleared or
+                # recycled while the call is in flight, the reply is dropped with it
+                # instead of leaking into the next conversation.
+                agent_context = self._resolve_context(agent_context)
+                message_history = agent_context.message_history
+                
+                # Add message to history
+                message_history.append({"role": "user", "content": message})
+                messages = self._build_messages(message, agent_context, previous_agent_response)
+                
+                if draft is None:
+                    response = await self._generate_reply(messages, context, client_id, stream, agent_id, use_cache, priority)
+                else:
+                    response = await self._resolve_draft(messages, draft, refine_draft, context, client_id, stream, agent_id, use_cache, priority)
+                    if speculation is not None:
+                        speculation["accepted"] = response is draft
+                
+                # Add response to history
+                message_history.append({"role": "assistant", "content": response})
+                
+                if self.ws_manager and client_id:
+                    await self.ws_manager.send_agent_trace(client_id, self.name, f"Processing complete. Response: {response}")
+                
+                return response
+            except Exception as e:
+                logger.error("Error in {} processing message: {}", self.name, e)
+                if self.ws_manager and client_id:
+                    await self.ws_manager.send_agent_trace(client_id, self.name, f"Error occurred: {str(e)}")
+                raise e
+            finally:
+                AGENT_PROCESS_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+    
+    async def _resolve_draft(self, messages: List[Dict[str, str]], draft: str, refine: bool, context: Dict[str, Any] = None, client_id: str = None, stream: bool = False, agent_id: str = None, use_cache: bool = True, priority: int = PRIORITY_CHAT) -> str:
+        """Return ``draft`` if it is accepted, otherwise the refined reply."""
+        response = draft
+        if refine:
+            # Not streamed: the client should not see the accept marker
+            reply = await self._refine_draft(messages, draft, client_id, use_cache, priority)
+            if reply is not None:
+                response = reply
+        if stream and self.ws_manager and client_id:
+            await self.ws_manager.send_agent_delta(client_id, self.name, response, agent_id, done=True)
+        return response
+    
+    async def _refine_draft(self, messages: List[Dict[str, str]], draft: str, client_id: str = None, use_cache: bool = True, priority: int = PRIORITY_CHAT) -> str:
+        """Check ``draft`` against the current turn: None if it is accepted, else the revised reply.
+        
+        The check is read as a stream and closed as soon as the reply turns
+        out to be the accept marker, so accepting costs a few output tokens
+        rather than a whole reply.
+        """
+        refine_messages = self._build_refine_messages(messages, draft)
+        key = None
+        reply = None
+        if use_cache and self.response_cache is not None:
+            key = ResponseCache.make_key(self.name, self.system_message, refine_messages, self.llm_config)
+            reply = await self.response_cache.get(key)
+        if reply is None:
+            parts = []
+            chunks = self._scheduled_stream(refine_messages, client_id, priority)
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    text = "".join(parts).lstrip()
+                    if text.startswith(ACCEPT_DRAFT):
+                        break
+            finally:
+                await chunks.aclose()
+            reply = "".join(parts)
+            if key is not None and reply:
+                await self.response_cache.set(key, reply)
+        if reply.lstrip().startswith(ACCEPT_DRAFT):
+            return None
+        return reply
+    
+    async def _generate_reply(self, messages: List[Dict[str, str]], context: Dict[str, Any] = None, client_id: str = None, stream: bool = False, agent_id: str = None, use_cache: bool = True, priority: int = PRIORITY_CHAT) -> str:
+        """Get a reply for ``messages``, from the response cache when possible.
+        
+        On a cache miss, identical requests that are already in flight are
+        joined instead of calling the model again. ``use_cache=False`` asks
+        for a fresh reply and skips both.
+        """
+        stream = stream and self.ws_manager is not None and client_id is not None
+        
+        if not use_cache:
+            return await self._call_llm(messages, context, client_id, stream, agent_id, priority)
+        
+        key = ResponseCache.make_key(self.name, self.system_message, messages, self.llm_config)
+        if self.response_cache is not None:
+            with tracer.span("cache.lookup", agent=self.name) as span:
+                response = await self.response_cache.get(key)
+                if span is not None:
+                    span.set_attribute("hit", response is not None)
+            if response is not None:
+                if stream:
+                    await self.ws_manager.send_agent_delta(client_id, self.name, response, agent_id, done=True)
+                return response
+        
+        joined = self.single_flight.is_in_flight(key)
+        response = await self.single_flight.do(
+            key,
+            lambda: self._call_llm(messages, context, client_id, stream, agent_id, priority)
+        )
+        if joined and stream:
+            # The leader streamed to its own client; send ours the result at once
+            await self.ws_manager.send_agent_delta(client_id, self.name, response, agent_id, done=True)
+        
+        if self.response_cache is not None and not joined and isinstance(response, str) and response:
+            await self.response_cache.set(key, response)
+        return response
+    
+    async def _call_llm(self, messages: List[Dict[str, str]], context: Dict[str, Any] = None, client_id: str = None, stream: bool = False, agent_id: str = None, priority: int = PRIORITY_CHAT) -> str:
+        """Call the model through the scheduler, streaming to the client if asked.
+        
+        Non-streamed calls are hedged to the hedge backend when one is
+        configured.
+        """
+        if stream:
+            return await self.scheduler.run(
+                lambda: self._timed_call(messages, True, lambda: self._stream_to_client(messages, client_id, agent_id)),
+                client_id,
+                priority
             )
+        
+        def attempt(backend: LLMBackend):
+            return lambda: self.scheduler.run(
+                lambda: self._timed_call(messages, False, lambda: backend.generate(messages, context)),
+                client_id,
+                priority
+            )
+        
+        if self.hedge_backend is None:
+            return await attempt(self.backend)()
+        return await self.hedger.run(self.name, self.latency_budget, [
+            ("primary:" + self.backend.name, attempt(self.backend)),
+            ("hedge:" + self.hedge_backend.name, attempt(self.hedge_backend)),
+        ])
+    
+    async def _timed_call(self, messages: List[Dict[str, str]], stream: bool, call) -> str:
+        """Run one model call in an ``llm.call`` span, recording its time and tokens."""
+        LLM_TOKENS.labels(self.name, "in").inc(
+            estimate_tokens(self.system_message) + sum(estimate_message_tokens(message) for message in messages)
+        )
+        started_at = time.monotonic()
+        try:
+            with tracer.span("llm.call", agent=self.name, stream=stream):
+                response = await call()
+        finally:
+            LLM_CALL_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+        if isinstance(response, str):
+            LLM_TOKENS.labels(self.name, "out").inc(estimate_tokens(response))
+        return response
+    
+    async def process_message_stream(self, message: str, context: Dict[str, Any] = None, client_id: str = None, previous_agent_response: str = None, agent_context: AgentContext = None, use_cache: bool = True, priority: int = PRIORITY_CHAT) -> AsyncIterator[str]:
+        """Process a message and yield the raw response text as it is generated.
+        
+        The model call is scheduled, cached and measured like one from
+        ``process_message``; a cached reply is yielded as a single chunk.
+        The complete response is added to the history once the stream ends.
+        Subclass formatting is not applied to the chunks.
+        """
+        # Not a ``tracer.span``: the generator may be resumed from another task
+        span = tracer.start_span("agent.process", agent=self.name, stream=True)
+        started_at = time.monotonic()
+        try:
+            agent_context = self._resolve_context(agent_context)
+            message_history = agent_context.message_history
+            message_history.append({"role": "user", "content": message})
+            messages = self._build_messages(message, agent_context, previous_agent_response)
             
-            # Add response to history
-            self.add_to_history("assistant", response)
-            
-            if self.ws_manager and client_id:
-                await self.ws_manager.send_agent_trace(client_id, self.name, f"Processing complete. Response: {response}")
-            
-            return response
+            key = None
+            response = None
+            if use_cache and self.response_cache is not None:
+                key = ResponseCache.make_key(self.name, self.system_message, messages, self.llm_config)
+                response = await self.response_cache.get(key)
+            if response is not None:
+                yield response
+            else:
+                chunks = []
+                async for chunk in self._scheduled_stream(messages, client_id, priority):
+                    chunks.append(chunk)
+                    yield chunk
+                response = "".join(chunks)
+                if key is not None and response:
+                    await self.response_cache.set(key, response)
+            message_history.append({"role": "assistant", "content": response})
         except Exception as e:
-            logger.error(f"Error in {self.name} processing message: {str(e)}")
-            if self.ws_manager and client_id:
-                await self.ws_manager.send_agent_trace(client_id, self.name, f"Error occurred: {str(e)}")
-            raise e
-    
-    def get_agent(self) -> autogen.AssistantAgent:
-        """Get the underlying Autogen agent instance."""
-        return self.agent 
\ No newline at end of file
+            logger.error("Error in {} streaming message: {}", self.name, e)
+            if span is not None:
+                span.set_error(e)
+            raise
+        finally:
+            if span is not None:
+                span.end()
+            AGENT_PROCESS_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+    
+    async def _scheduled_stream(self, messages: List[Dict[str, str]], client_id: str = None, priority: int = PRIORITY_CHAT) -> AsyncIterator[str]:
+        """Yield the model's stream while it holds a scheduler slot.
+        
+        A task reads the stream inside ``scheduler.run`` and hands chunks
+        over through a queue; it is cancelled, freeing the slot, if the
+        consumer stops early.
+        """
+        chunks: asyncio.Queue = asyncio.Queue()
+        
+        async def read() -> str:
+            parts = []
+            started_at = time.monotonic()
+            async for chunk in self.backend.stream(messages):
+                if not parts:
+                    LLM_TIME_TO_FIRST_TOKEN_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+                parts.append(chunk)
+                chunks.put_nowait(chunk)
+            return "".join(parts)
+        
+        async def produce():
+            try:
+                await self.scheduler.run(lambda: self._timed_call(messages, True, read), client_id, priority)
+            finally:
+                chunks.put_nowait(None)
+        
+        task = asyncio.ensure_future(produce())
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+            # Raises the stream's error, if it failed
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    
+    async def _stream_to_client(self, messages: List[Dict[str, str]], client_id: str, agent_id: str = None) -> str:
+        """Stream a reply to the client in coalesced frames and return the full text.
+        
+        Buffered text is flushed when it is due even if the model pauses:
+        each read waits at most until then.
+        """
+        coalescer = DeltaCoalescer(Config.STREAM_FRAME_MAX_CHARS, Config.STREAM_FRAME_MAX_DELAY)
+        chunks = []
+        started_at = time.monotonic()
+        stream = self.backend.stream(messages)
+        next_chunk = None
+        try:
+            while True:
+                if next_chunk is None:
+                    next_chunk = asyncio.ensure_future(stream.__anext__())
+                done, _ = await asyncio.wait((next_chunk,), timeout=coalescer.time_until_due())
+                if not done:
+                    await self.ws_manager.send_agent_delta(client_id, self.name, coalescer.flush(), agent_id)
+                    continue
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    next_chunk = None
+                if not chunks:
+                    LLM_TIME_TO_FIRST_TOKEN_SECONDS.labels(self.name).observe(time.monotonic() - started_at)
+                chunks.append(chunk)
+                frame = coalescer.push(chunk)
+                if frame:
+                    await self.ws_manager.send_agent_delta(client_id, self.name, frame, agent_id)
+        finally:
+            if next_chunk is not None:
+                next_chunk.cancel()
+                await asyncio.gather(next_chunk, return_exceptions=True)
+            await stream.aclose()
+        await self.ws_manager.send_agent_delta(client_id, self.name, coalescer.flush(), agent_id, done=True)
+        return "".join(chunks)
+    
+    def get_agent(self):
+        """Get the underlying Autogen agent instance, None for other backends."""
+        return getattr(self.backend, "agent", None) 
\ No newline at end of file
@@ -0,0 +1,84 @@
+from typing import Dict, Any, List
+import re
+from .agent_context import AgentContext
+
+# Rough per-message overhead of the chat format, in tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: about four characters per token for English text."""
+    if not text:
+        return 0
+    return (len(text) + 3) // 4
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    content = message.get("content")
+    return MESSAGE_OVERHEAD_TOKENS + estimate_tokens(content if isinstance(content, str) else str(content))
+
+class ContextBudgetManager:
+    """Keeps an agent's prompt within a token budget.
+
+    Recent messages are kept verbatim. When the history no longer fits,
+    the oldest messages are folded into a running summary stored on the
+    AgentContext; only the newly evicted messages are added to it, and the
+    summary itself is capped at ``summary_max_tokens``.
+    """
+
+    def __init__(self, max_tokens: int = 6000, summary_max_tokens: int = 500,
+                 keep_recent_messages: int = 2, excerpt_chars: int = 240):
+        self.max_tokens = max_tokens
+        self.summary_max_tokens = summary_max_tokens
+        self.keep_recent_messages = keep_recent_messages
+        self.excerpt_chars = excerpt_chars
+
+    def fit(self, agent_context: AgentContext, reserved_tokens: int = 0):
+        """Fold old messages into the summary until the history fits.
+
+        ``reserved_tokens`` is budget already used by the current turn, such
+        as upstream agents' output.
+        """
+        history = agent_context.message_history
+        budget = self.max_tokens - reserved_tokens - estimate_tokens(agent_context.summary)
+        sizes = [estimate_message_tokens(message) for message in history]
+        total = sum(sizes)
+
+        evict = 0
+        while total > budget and len(history) - evict > self.keep_recent_messages:
+            total -= sizes[evict]
+            evict += 1
+        if evict:
+            self._fold(agent_context, history[:evict])
+            del history[:evict]
+
+    def _excerpt(self, content: str) -> str:
+        content = re.sub(r"\s+", " ", content).strip()
+        if len(content) <= self.excerpt_chars:
+            return content
+        return content[:self.excerpt_chars].rsplit(" ", 1)[0] + " ..."
+
+    def _fold(self, agent_context: AgentContext, messages: List[Dict[str, Any]]):
+        lines = agent_context.summary.split("\n") if agent_context.summary else []
+        for message in messages:
+            content = message.get("content")
+            if not isinstance(content, str) or not content:
+                continue
+            role = "User" if message.get("role") == "user" else "Assistant"
+            lines.append(f"- {role}: {self._excerpt(content)}")
+
+        # Drop the oldest summary lines once the summary is over its own budget
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > self.summary_max_tokens:
+            lines.pop(0)
+        agent_context.summary = "\n".join(lines)
+
+    def build_messages(self, agent_context: AgentContext, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Prefix ``messages`` with the running summary, if there is one."""
+        if not agent_context.summary:
+            return messages
+        return [{
+            "role": "system",
+            "content": f"Summary of the earlier conversation:\n{agent_context.summary}"
+        }] + messages
+
+    @classmethod
+    def from_config(cls, config) -> "ContextBudgetManager":
+        return cls(config.CONTEXT_MAX_TOKENS, config.CONTEXT_SUMMARY_MAX_TOKENS)
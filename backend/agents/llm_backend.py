@@ -0,0 +1,203 @@
+from typing import Dict, Any, List, AsyncIterator, Callable
+import asyncio
+import math
+import random
+import threading
+from .context_budget import estimate_tokens
+
+class LLMBackend:
+    """Where an agent's replies come from.
+
+    ``generate`` returns a whole reply, ``stream`` yields it in chunks.
+    Both get the chat messages without the system message, which the
+    backend holds itself. ``name`` identifies the model endpoint, e.g. for
+    circuit breakers.
+    """
+
+    name = ""
+
+    def warm_up(self):
+        """Do slow one-time setup ahead of the first call. Blocking; run it in a thread."""
+
+    async def generate(self, messages: List[Dict[str, str]], context: Dict[str, Any] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+class AutogenBackend(LLMBackend):
+    """An Autogen AssistantAgent, streaming through the OpenAI API directly.
+
+    Importing autogen takes seconds, so the agent is only built by
+    ``warm_up`` or on the first call, whichever comes first.
+    """
+
+    def __init__(self, agent_name: str, system_message: str, llm_config: Dict[str, Any], api_key: str = None):
+        self.agent_name = agent_name
+        self.system_message = system_message
+        self.llm_config = llm_config
+        self.api_key = api_key
+        endpoint = llm_config["config_list"][0]
+        self.name = endpoint["model"] + (f"@{endpoint['base_url']}" if endpoint.get("base_url") else "")
+        self._agent = None
+        self._build_lock = threading.Lock()
+        self._stream_client = None
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            self.warm_up()
+        return self._agent
+
+    def warm_up(self):
+        with self._build_lock:
+            if self._agent is None:
+                import autogen
+                self._agent = autogen.AssistantAgent(
+                    name=self.agent_name,
+                    system_message=self.system_message,
+                    llm_config=self.llm_config
+                )
+
+    async def generate(self, messages: List[Dict[str, str]], context: Dict[str, Any] = None) -> str:
+        if self._agent is None:
+            # Keep the import off the event loop
+            await asyncio.to_thread(self.warm_up)
+        return await self._agent.a_generate_reply(messages=messages, sender=self._agent, context=context)
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Yield response chunks from the OpenAI streaming API."""
+        if self._stream_client is None:
+            from openai import AsyncOpenAI
+            self._stream_client = AsyncOpenAI(api_key=self.api_key, timeout=self.llm_config["timeout"])
+
+        response = await self._stream_client.chat.completions.create(
+            model=self.llm_config["config_list"][0]["model"],
+            messages=[{"role": "system", "content": self.system_message}] + messages,
+            temperature=self.llm_config["temperature"],
+            stream=True
+        )
+        async for event in response:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+class RateLimitError(Exception):
+    """Injected by FakeLLMBackend. Named like the OpenAI error so the scheduler retries it."""
+
+class LatencyDistribution:
+    """Random delays in seconds, parsed from ``"kind:arg,..."``.
+
+    - ``const:<seconds>``
+    - ``uniform:<low>,<high>``
+    - ``normal:<mean>,<stddev>`` (clipped at zero)
+    - ``lognormal:<median>,<sigma>``: long-tailed, like real model latency
+    """
+
+    KINDS: Dict[str, Callable[..., float]] = {
+        "const": lambda rng, seconds: seconds,
+        "uniform": lambda rng, low, high: rng.uniform(low, high),
+        "normal": lambda rng, mean, stddev: max(0.0, rng.gauss(mean, stddev)),
+        "lognormal": lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma),
+    }
+
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args.split(",") if arg]
+
+    def sample(self, rng: random.Random) -> float:
+        return self.KINDS[self.kind](rng, *self.args)
+
+# Words for generated replies
+_VOCABULARY = (
+    "plan research agent task result data analysis step review idea draft model "
+    "context summary user goal option risk value source detail approach output"
+).split()
+
+class FakeLLMBackend(LLMBackend):
+    """Offline stand-in for a model, for benchmarks and load tests.
+
+    A reply takes ``latency`` (time to first token) plus its length at
+    ``tokens_per_second``; streamed replies arrive in chunks of
+    ``chunk_tokens`` at that rate. A share ``rate_limit_probability`` of
+    calls fails with RateLimitError before producing anything.
+
+    The reply text depends only on the seed, the backend name and the
+    last message, so identical requests get identical replies. Latencies
+    and injected errors come from one seeded generator per backend.
+    """
+
+    def __init__(self, name: str = "fake", latency: str = "lognormal:0.5,0.5", tokens_per_second: float = 50.0,
+                 reply_tokens: int = 150, rate_limit_probability: float = 0.0, chunk_tokens: int = 4, seed: int = 0):
+        self.name = name
+        self.latency = LatencyDistribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.rate_limit_probability = rate_limit_probability
+        self.chunk_tokens = chunk_tokens
+        self.seed = seed
+        self._rng = random.Random(f"{seed}:{name}")
+        self.calls = 0
+        self.rate_limited = 0
+
+    def _reply(self, messages: List[Dict[str, str]]) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        rng = random.Random(f"{self.seed}:{self.name}:{prompt}")
+        words = []
+        length = 0
+        while (length + 3) // 4 < self.reply_tokens:
+            word = rng.choice(_VOCABULARY)
+            words.append(word)
+            length += len(word) + 1
+        return " ".join(words)
+
+    def _start_call(self) -> float:
+        """Count the call, maybe fail it, and return its time to first token."""
+        self.calls += 1
+        if self._rng.random() < self.rate_limit_probability:
+            self.rate_limited += 1
+            raise RateLimitError("Rate limit reached (injected by the fake backend)")
+        return self.latency.sample(self._rng)
+
+    def _generation_time(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    async def generate(self, messages: List[Dict[str, str]], context: Dict[str, Any] = None) -> str:
+        delay = self._start_call()
+        reply = self._reply(messages)
+        await asyncio.sleep(delay + self._generation_time(estimate_tokens(reply)))
+        return reply
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        await asyncio.sleep(self._start_call())
+        reply = self._reply(messages)
+        chunk_chars = self.chunk_tokens * 4
+        for start in range(0, len(reply), chunk_chars):
+            chunk = reply[start:start + chunk_chars]
+            if start:
+                await asyncio.sleep(self._generation_time(estimate_tokens(chunk)))
+            yield chunk
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "rate_limited": self.rate_limited}
+
+def create_backend(config, agent_name: str, system_message: str, llm_config: Dict[str, Any], hedge: bool = False) -> LLMBackend:
+    """The backend selected by ``config.LLM_BACKEND``.
+
+    A fake ``hedge`` backend draws its own latencies and errors.
+    """
+    if config.LLM_BACKEND == "fake":
+        return FakeLLMBackend(
+            name=("fake-hedge:" if hedge else "fake:") + agent_name,
+            latency=config.FAKE_LLM_LATENCY,
+            tokens_per_second=config.FAKE_LLM_TOKENS_PER_SECOND,
+            reply_tokens=config.FAKE_LLM_REPLY_TOKENS,
+            rate_limit_probability=config.FAKE_LLM_RATE_LIMIT_PROBABILITY,
+            seed=config.FAKE_LLM_SEED
+        )
+    if config.LLM_BACKEND != "openai":
+        raise ValueError(f"Unknown LLM backend: {config.LLM_BACKEND}")
+    return AutogenBackend(agent_name, system_message, llm_config, api_key=config.OPENAI_API_KEY)
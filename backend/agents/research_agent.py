@@ -23,9 +23,9 @@ class ResearchAgent(BaseAgent):
         
         super().__init__("Research", system_message, ws_manager)
     
-    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None) -> str:
+    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None, **kwargs) -> str:
         """Process research requests and provide factual information."""
-        response = await super().process_message(message, context, client_id)
+        response = await super().process_message(message, context, client_id, **kwargs)
         return self._format_response(response)
     
     def _format_response(self, response: str) -> str:
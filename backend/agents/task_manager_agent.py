@@ -23,9 +23,9 @@ class TaskManagerAgent(BaseAgent):
         
         super().__init__("TaskManager", system_message, ws_manager)
     
-    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None) -> str:
+    async def process_message(self, message: str, context: Dict[str, Any] = None, client_id: str = None, **kwargs) -> str:
         """Process user message and coordinate with other agents."""
-        response = await super().process_message(message, context, client_id)
+        response = await super().process_message(message, context, client_id, **kwargs)
         return self._format_response(response)
     
     def _format_response(self, response: str) -> str:
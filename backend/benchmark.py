@@ -0,0 +1,332 @@
+"""Offline load test for the WebSocket and HTTP endpoints.
+
+Runs the app in-process on the fake LLM backend, drives concurrent
+simulated clients through ``/ws/{client_id}``,
+``/ws/{client_id}/agent/{agent_id}`` and ``/process``, and reports
+throughput, turn latency percentiles and memory per session.
+
+    python benchmark.py --clients 50 --turns 3
+    python benchmark.py --json results.json
+    python benchmark.py --baseline results.json --max-regression 0.2
+
+With ``--baseline`` the run fails (exit code 1) when a route's p95
+latency or throughput is more than ``--max-regression`` worse than in
+the baseline file.
+"""
+from typing import Dict, Any, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROUTES = ("chat", "direct", "process")
+DIRECT_AGENTS = ("task_manager", "research", "creative")
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent clients per route")
+    parser.add_argument("--turns", type=int, default=3, help="Messages sent by each client")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Comma separated subset of: " + ", ".join(ROUTES))
+    parser.add_argument("--stream", action="store_true", help="Ask for streamed replies on the WebSocket routes")
+    parser.add_argument("--cache", action="store_true", help="Allow response cache hits (off: every turn calls the model)")
+    parser.add_argument("--latency", default="lognormal:0.3,0.5", help="Fake model time to first token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Fake model generation rate")
+    parser.add_argument("--reply-tokens", type=int, default=150, help="Fake model reply length")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0, help="Share of model calls failing with 429")
+    parser.add_argument("--llm-rps", type=float, default=0.0, help="Scheduler rate limit, 0 for none")
+    parser.add_argument("--llm-concurrency", type=int, default=64, help="Scheduler concurrency limit")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="Seconds before a turn counts as failed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args(argv)
+    args.routes = [route for route in args.routes.split(",") if route]
+    unknown = set(args.routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"Unknown routes: {', '.join(sorted(unknown))}")
+    return args
+
+def configure(args: argparse.Namespace):
+    """Point the app at the fake backend. Must run before main is imported."""
+    from config import Config
+    Config.LLM_BACKEND = "fake"
+    Config.FAKE_LLM_LATENCY = args.latency
+    Config.FAKE_LLM_TOKENS_PER_SECOND = args.tokens_per_second
+    Config.FAKE_LLM_REPLY_TOKENS = args.reply_tokens
+    Config.FAKE_LLM_RATE_LIMIT_PROBABILITY = args.rate_limit_probability
+    Config.FAKE_LLM_SEED = args.seed
+    Config.LLM_RATE_LIMIT_RPS = args.llm_rps
+    Config.LLM_MAX_CONCURRENCY = args.llm_concurrency
+    # Keep the run in memory and quiet
+    Config.SESSION_STORE_PATH = None
+    Config.RESPONSE_CACHE_PATH = None
+    Config.TRACE_SAMPLE_RATE = 0
+    Config.HEDGING_ENABLED = False
+    Config.LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+
+def current_rss() -> Optional[int]:
+    """Resident memory of this process in bytes, where /proc is available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * percent // 100))
+    return ordered[int(rank) - 1]
+
+class RouteStats:
+    def __init__(self, route: str):
+        self.route = route
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def record(self, started_at: float, ok: bool):
+        finished_at = time.monotonic()
+        if self.started_at is None or started_at < self.started_at:
+            self.started_at = started_at
+        self.finished_at = max(self.finished_at or finished_at, finished_at)
+        if ok:
+            self.latencies.append(finished_at - started_at)
+        else:
+            self.errors += 1
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at - self.started_at) if self.started_at is not None else 0
+        return {
+            "turns": len(self.latencies),
+            "errors": self.errors,
+            "throughput": len(self.latencies) / elapsed if elapsed else 0.0,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+            "p99": percentile(self.latencies, 99),
+            "max": max(self.latencies, default=None),
+        }
+
+def prompt_for(rng: random.Random, client: str, turn: int) -> str:
+    topic = rng.choice(["a product launch", "a research survey", "a team offsite", "a data migration", "a blog series"])
+    return f"[{client} #{turn}] Help me plan {topic}, with risks and a timeline."
+
+async def receive_until_reply(websocket, deadline: float, pipeline: bool) -> bool:
+    """Read frames until the assistant's reply to the current message; True unless a step failed.
+
+    A chat turn ends with one "## "-sectioned reply; each failed step sends
+    its own error before it, and a turn where every step failed sends
+    nothing else, so after an error the rest gets a moment to arrive.
+    """
+    failed = False
+    while True:
+        timeout = deadline - time.monotonic()
+        if failed:
+            timeout = min(timeout, 1.0)
+        try:
+            frame = json.loads(await asyncio.wait_for(websocket.recv(), timeout=max(0.0, timeout)))
+        except asyncio.TimeoutError:
+            if failed:
+                return False
+            raise
+        if frame.get("type") != "user_message" or frame.get("role") != "assistant":
+            continue
+        content = frame.get("content", "")
+        if not pipeline:
+            return not content.startswith("Error processing message")
+        if content.startswith("## "):
+            return not failed
+        failed = True
+
+async def websocket_client(url: str, pipeline: bool, stats: RouteStats, args: argparse.Namespace,
+                           rng: random.Random, client: str, done: asyncio.Event, all_done: asyncio.Event):
+    import websockets
+    try:
+        async with websockets.connect(url, max_size=None) as websocket:
+            for turn in range(args.turns):
+                started_at = time.monotonic()
+                await websocket.send(json.dumps({
+                    "type": "user_message",
+                    "content": prompt_for(rng, client, turn),
+                    "stream": args.stream,
+                    "cache": args.cache,
+                }))
+                try:
+                    ok = await receive_until_reply(websocket, started_at + args.turn_timeout, pipeline)
+                except asyncio.TimeoutError:
+                    ok = False
+                stats.record(started_at, ok)
+            done.set()
+            # Stay connected so sessions are still held when memory is measured
+            await all_done.wait()
+    finally:
+        done.set()
+
+async def process_client(http, stats: RouteStats, args: argparse.Namespace, rng: random.Random,
+                         client: str, done: asyncio.Event):
+    try:
+        for turn in range(args.turns):
+            started_at = time.monotonic()
+            try:
+                response = await http.post("/process", json={
+                    "client_id": client,
+                    "prompt": prompt_for(rng, client, turn),
+                    "cache": args.cache,
+                }, timeout=args.turn_timeout)
+                ok = response.status_code == 200 and response.json().get("status") == "success"
+            except Exception:
+                ok = False
+            stats.record(started_at, ok)
+    finally:
+        done.set()
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    import httpx
+    import uvicorn
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"127.0.0.1:{port}"
+
+    rss_before = current_rss()
+    rng = random.Random(args.seed)
+    stats = {route: RouteStats(route) for route in args.routes}
+    all_done = asyncio.Event()
+    client_done: List[asyncio.Event] = []
+    tasks = []
+    started_at = time.monotonic()
+    async with httpx.AsyncClient(base_url=f"http://{base_url}") as http:
+        for index in range(args.clients):
+            for route in args.routes:
+                client = f"bench-{route}-{index}"
+                done = asyncio.Event()
+                client_done.append(done)
+                client_rng = random.Random(f"{args.seed}:{client}")
+                if route == "chat":
+                    coro = websocket_client(f"ws://{base_url}/ws/{client}", True, stats[route], args, client_rng, client, done, all_done)
+                elif route == "direct":
+                    agent_id = DIRECT_AGENTS[index % len(DIRECT_AGENTS)]
+                    coro = websocket_client(f"ws://{base_url}/ws/{client}/agent/{agent_id}", False, stats[route], args, client_rng, client, done, all_done)
+                else:
+                    coro = process_client(http, stats[route], args, client_rng, client, done)
+                tasks.append(asyncio.create_task(coro))
+
+        await asyncio.gather(*(done.wait() for done in client_done))
+        elapsed = time.monotonic() - started_at
+        # Measured while every WebSocket client is still connected
+        rss_after = current_rss()
+        sessions = list(main.session_manager.sessions.values())
+        session_bytes = [session.memory_usage()["own_bytes"] for session in sessions]
+        all_done.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    server.should_exit = True
+    await serve_task
+
+    client_errors = [result for result in results if isinstance(result, Exception)]
+    routes = {route: route_stats.summary() for route, route_stats in stats.items()}
+    turns = sum(summary["turns"] for summary in routes.values())
+    backends = [agent.backend for agent in (main.task_manager, main.research_agent, main.creative_agent)]
+    return {
+        "config": {
+            "clients": args.clients,
+            "turns": args.turns,
+            "routes": args.routes,
+            "stream": args.stream,
+            "cache": args.cache,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "reply_tokens": args.reply_tokens,
+            "rate_limit_probability": args.rate_limit_probability,
+            "llm_rps": args.llm_rps,
+            "llm_concurrency": args.llm_concurrency,
+            "seed": args.seed,
+        },
+        "elapsed": elapsed,
+        "turns": turns,
+        "throughput": turns / elapsed if elapsed else 0.0,
+        "client_errors": [repr(error) for error in client_errors],
+        "routes": routes,
+        "memory": {
+            "sessions": len(sessions),
+            "rss_growth_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            "rss_per_session_bytes": (rss_after - rss_before) / len(sessions)
+            if sessions and rss_before is not None and rss_after is not None else None,
+            "session_bytes_avg": sum(session_bytes) / len(session_bytes) if session_bytes else None,
+        },
+        "llm": {
+            "calls": sum(backend.calls for backend in backends),
+            "injected_rate_limits": sum(backend.rate_limited for backend in backends),
+            "scheduler": main.default_scheduler.get_stats(),
+        },
+    }
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+def format_bytes(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value / 1024:.1f} KiB"
+
+def print_report(results: Dict[str, Any]):
+    print(f"{results['turns']} turns in {results['elapsed']:.2f}s, {results['throughput']:.1f} turns/s")
+    print(f"{'route':<10}{'turns':>7}{'errors':>8}{'turns/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for route, summary in results["routes"].items():
+        print(f"{route:<10}{summary['turns']:>7}{summary['errors']:>8}{summary['throughput']:>9.1f}"
+              f"{format_seconds(summary['p50']):>9}{format_seconds(summary['p95']):>9}"
+              f"{format_seconds(summary['p99']):>9}{format_seconds(summary['max']):>9}")
+    memory = results["memory"]
+    print(f"memory: {memory['sessions']} sessions, {format_bytes(memory['rss_per_session_bytes'])} RSS per session, "
+          f"{format_bytes(memory['session_bytes_avg'])} session state per session")
+    llm = results["llm"]
+    print(f"llm: {llm['calls']} calls, {llm['injected_rate_limits']} rate limited, "
+          f"{llm['scheduler']['retries']} retries, average queue wait {format_seconds(llm['scheduler']['average_wait'])}")
+    if results["client_errors"]:
+        print(f"client errors: {len(results['client_errors'])}, e.g. {results['client_errors'][0]}")
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regressions of p95 latency and throughput beyond ``max_regression``, per route."""
+    regressions = []
+    for route, summary in results["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        if before["p95"] and summary["p95"] and summary["p95"] > before["p95"] * (1 + max_regression):
+            regressions.append(f"{route}: p95 {format_seconds(before['p95'])} -> {format_seconds(summary['p95'])}")
+        if before["throughput"] and summary["throughput"] < before["throughput"] * (1 - max_regression):
+            regressions.append(f"{route}: throughput {before['throughput']:.1f} -> {summary['throughput']:.1f} turns/s")
+        if summary["errors"] > before["errors"]:
+            regressions.append(f"{route}: errors {before['errors']} -> {summary['errors']}")
+    return regressions
+
+def main_entry(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+    configure(args)
+    results = asyncio.run(run_benchmark(args))
+    print_report(results)
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_entry())
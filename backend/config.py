@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,16 +12,178 @@ class Config:
     WS_HOST = "0.0.0.0"
     WS_PORT = 8000
     
+    # Scale-out settings. With WORKERS > 1, main.py starts the workers on
+    # the shared public port, each also listening on a private address.
+    # WORKER_NODES lists those addresses ("host:port,host:port") and
+    # WORKER_NODE is this worker's own; sessions are kept per worker, and
+    # each client id is owned by one worker on a consistent hash ring of
+    # the nodes. Requests and WebSockets for a client owned elsewhere are
+    # proxied to its owner. main.py also starts an event bus relay and
+    # passes its address in EVENT_BUS_ADDRESS and EVENT_BUS_AUTHKEY;
+    # messages for a client connected to another worker go through it.
+    # WORKER_ID (a prefix, the process id is appended) tells workers apart
+    # in logs and events.
+    WORKERS = int(os.getenv("WORKERS", "1"))
+    WORKER_NODES = os.getenv("WORKER_NODES")
+    WORKER_NODE = os.getenv("WORKER_NODE")
+    WORKER_ID = f"{os.getenv('WORKER_ID') or socket.gethostname()}-{os.getpid()}"
+    EVENT_BUS_ADDRESS = os.getenv("EVENT_BUS_ADDRESS")
+    EVENT_BUS_AUTHKEY = os.getenv("EVENT_BUS_AUTHKEY")
+    # The server pings every connection; clients answer with {"type": "pong"}.
+    # Connections that send nothing for WS_IDLE_TIMEOUT seconds are closed.
+    WS_HEARTBEAT_INTERVAL = 30  # seconds
+    WS_IDLE_TIMEOUT = 3600  # seconds
+    
+    # Each connection has a bounded outbound queue drained by its own writer.
+    # When a client falls behind, WS_OVERFLOW_POLICY decides what happens:
+    # "drop_oldest" drops trace frames, "coalesce" merges streamed frames,
+    # "disconnect" closes the slow connection.
+    WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+    WS_OVERFLOW_POLICY = os.getenv("WS_OVERFLOW_POLICY", "drop_oldest")
+    
+    # Opt-in compact protocol (?protocol=compact): frames queued within
+    # WS_BATCH_WINDOW are sent in one envelope, and content of at least
+    # WS_CONTENT_REF_MIN_LENGTH characters is sent once and then referenced.
+    WS_BATCH_WINDOW = 0.02  # seconds
+    WS_CONTENT_REF_MIN_LENGTH = 256
+    WS_CONTENT_REF_LIMIT = 128
+    
+    # Outbound frames carry a sequence number and the last WS_REPLAY_BUFFER_SIZE
+    # are kept per connection. A client reconnecting within WS_RESUME_GRACE
+    # seconds with ?resume=<last seq> gets the frames it missed, and its
+    # running turn is not cancelled.
+    WS_REPLAY_BUFFER_SIZE = 512
+    WS_RESUME_GRACE = 60  # seconds
+    
     # Agent settings
     AGENT_TIMEOUT = 300  # seconds
-    MAX_TOKENS = 2000
+    MAX_TOKENS = 2000  # per reply
+    
+    # Model backend: "openai" uses MODEL_NAME through Autogen, "fake" is an
+    # offline stand-in for benchmarks (see benchmark.py). The fake takes
+    # FAKE_LLM_LATENCY to the first token, a "kind:args" distribution such
+    # as "const:0.5", "uniform:0.2,1" or "lognormal:0.5,0.5", then generates
+    # at FAKE_LLM_TOKENS_PER_SECOND, and fails a share of calls with rate
+    # limit errors.
+    LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+    FAKE_LLM_LATENCY = os.getenv("FAKE_LLM_LATENCY", "lognormal:0.5,0.5")
+    FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+    FAKE_LLM_REPLY_TOKENS = int(os.getenv("FAKE_LLM_REPLY_TOKENS", "150"))
+    FAKE_LLM_RATE_LIMIT_PROBABILITY = float(os.getenv("FAKE_LLM_RATE_LIMIT_PROBABILITY", "0"))
+    FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+    
+    # Latency budget per agent, in seconds. With hedging enabled a call that
+    # has not answered within it is cancelled and counts as a failure for the
+    # circuit breaker.
+    AGENT_LATENCY_BUDGETS = {
+        "TaskManager": 20,
+        "Research": 45,
+        "Creative": 45,
+    }
+    
+    # Hedged requests: a call that has not answered by the HEDGE_PERCENTILE-th
+    # latency seen for its agent (after HEDGE_MIN_SAMPLES calls; until then
+    # only failed calls are retried there) is duplicated to HEDGE_CONFIG_LIST
+    # and the first reply wins.
+    # Streamed replies are not hedged.
+    HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_CONFIG_LIST = [{
+        key: value for key, value in {
+            "model": os.getenv("HEDGE_MODEL_NAME", MODEL_NAME),
+            "base_url": os.getenv("HEDGE_BASE_URL"),
+        }.items() if value
+    }]
+    HEDGE_PERCENTILE = 95
+    HEDGE_MIN_SAMPLES = 20
+    
+    # A backend with CIRCUIT_BREAKER_FAILURES failures in a row is skipped
+    # for CIRCUIT_BREAKER_RESET seconds while the other one is used.
+    CIRCUIT_BREAKER_ENABLED = True
+    CIRCUIT_BREAKER_FAILURES = 5
+    CIRCUIT_BREAKER_RESET = 30  # seconds
+    
+    # Prompt budget per agent call. Older turns beyond it are folded into a
+    # running summary of at most CONTEXT_SUMMARY_MAX_TOKENS.
+    CONTEXT_MAX_TOKENS = 6000
+    CONTEXT_SUMMARY_MAX_TOKENS = 500
+    
+    # Streaming settings: deltas are coalesced into frames of at most this
+    # many characters, or flushed after this many seconds
+    STREAM_FRAME_MAX_CHARS = 256
+    STREAM_FRAME_MAX_DELAY = 0.05  # seconds
+    
+    # Response cache settings. Set RESPONSE_CACHE_PATH to also keep cached
+    # replies in a sqlite file that survives restarts.
+    RESPONSE_CACHE_ENABLED = True
+    RESPONSE_CACHE_MAX_ENTRIES = 1024
+    RESPONSE_CACHE_TTL = 3600  # seconds
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")
+    
+    # Pipeline steps that start speculatively on the raw prompt while their
+    # upstream steps run, as "step:mode" pairs, e.g. "research:refine".
+    # "accept" uses the draft as is, "refine" lets the agent revise it with
+    # the upstream output. Off by default.
+    SPECULATIVE_STEPS = dict(
+        pair.split(":", 1) for pair in os.getenv("SPECULATIVE_STEPS", "").split(",") if ":" in pair
+    )
+    
+    # POST /process/batch: prompts per request and prompts run at once
+    BATCH_MAX_ITEMS = 1000
+    BATCH_MAX_CONCURRENCY = 8
+    
+    # Background jobs (POST /jobs): worker pool size, queue bound, and how
+    # long finished jobs can still be polled
+    JOB_MAX_WORKERS = 4
+    JOB_MAX_QUEUED = 1000
+    JOB_RESULT_TTL = 3600  # seconds
+    JOB_EXPIRY_INTERVAL = 60  # seconds
+    
+    # LLM scheduler settings. LLM_RATE_LIMIT_RPS should match the provider
+    # quota; 0 disables rate limiting.
+    LLM_MAX_CONCURRENCY = 8
+    LLM_RATE_LIMIT_RPS = 5.0
+    LLM_RATE_LIMIT_BURST = 10
+    LLM_MAX_RETRIES = 3
+    LLM_RETRY_BASE_DELAY = 1.0  # seconds
+    LLM_RETRY_MAX_DELAY = 30.0  # seconds
+    
+    # Logging goes through a background queue. Per-message logs are DEBUG;
+    # logged payloads are cut to LOG_PAYLOAD_MAX_CHARS. LOG_JSON=true writes
+    # one JSON object per line, LOG_FILE adds a rotated log file.
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_JSON = os.getenv("LOG_JSON", "false").lower() == "true"
+    LOG_PAYLOAD_MAX_CHARS = 200
+    LOG_FILE = os.getenv("LOG_FILE")
+    LOG_FILE_ROTATION = "100 MB"
+    LOG_FILE_RETENTION = "7 days"
+    
+    # Per-turn tracing. TRACE_SAMPLE_RATE of user messages (0 to 1) get a
+    # trace with spans for pipeline steps, agent and model calls, scheduler
+    # waits, cache lookups and outbound frames, written as OTLP/JSON lines
+    # to TRACE_EXPORT_PATH, or to stdout when it is "-".
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+    TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+    TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "multi-agent-backend")
     
     # Session settings
     SESSION_TIMEOUT = 3600  # 1 hour
+    SESSION_EXPIRY_INTERVAL = 60  # seconds between expiry runs
+    # Set SESSION_STORE_PATH to persist sessions in a sqlite file. Expired
+    # sessions then only leave memory and are purged after SESSION_RETENTION.
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH")
+    SESSION_STORE_BATCH_SIZE = 500
+    SESSION_STORE_FLUSH_INTERVAL = 0.05  # seconds
+    SESSION_RETENTION = 7 * 24 * 3600  # 1 week
+    # Per-session caps on stored records; the oldest records are dropped first
+    SESSION_MAX_CONVERSATION = 200
+    SESSION_MAX_TRACES = 200
+    SESSION_MAX_INTERNAL_COMMS = 200
+    # Bodies at least this long are stored once and shared between records
+    SESSION_INTERN_MIN_LENGTH = 64
     
     @classmethod
     def validate_config(cls):
-        if not cls.OPENAI_API_KEY:
+        if cls.LLM_BACKEND == "openai" and not cls.OPENAI_API_KEY:
             raise ValueError("OPENAI_API_KEY is not set in environment variables")
         
         return True 
\ No newline at end of file
@@ -1,21 +1,74 @@
+import time
+# Startup time is measured from here, see Readiness
+IMPORT_STARTED = time.perf_counter()
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from contextlib import asynccontextmanager
 import uuid
 import asyncio
 from typing import Dict, Any, List
+import importlib.util
 import os
 import json
-import time
 from loguru import logger
 
 from services.websocket_manager import WebSocketManager
+from services.event_bus import LocalEventBus, MultiprocessEventBus, EventBusRelay
+from services.worker_router import WorkerRouter
 from services.session_state import SessionManager
+from services.session_store import SQLiteSessionStore
+from services.pipeline import PipelineExecutor, PipelineGraph, PipelineStep, StepResult, default_speculation_stats
+from services.llm_scheduler import PRIORITY_DIRECT, PRIORITY_BATCH
+from services.job_manager import Job, JobManager
+from services.metrics import registry as metrics_registry, ACTIVE_SESSIONS, ACTIVE_CONNECTIONS
+from services.tracing import tracer, JsonLinesSpanExporter
+from services.log_setup import configure_logging, Truncated
+from services.readiness import Readiness
+from agents.base_agent import default_response_cache, default_single_flight, default_scheduler, default_hedger
 from agents.task_manager_agent import TaskManagerAgent
 from agents.research_agent import ResearchAgent
 from agents.creative_agent import CreativeAgent
 from config import Config
 
-app = FastAPI(title="Multi-Agent Collaboration System")
+# Sinks write from a background thread, never on the event loop
+configure_logging(Config)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background maintenance tasks and stop them on shutdown."""
+    await event_bus.start()
+    if Config.TRACE_SAMPLE_RATE > 0:
+        tracer.configure(Config.TRACE_SAMPLE_RATE, JsonLinesSpanExporter(
+            None if Config.TRACE_EXPORT_PATH == "-" else Config.TRACE_EXPORT_PATH,
+            service_name=Config.TRACE_SERVICE_NAME
+        ))
+    job_manager.start()
+    background_tasks = [
+        asyncio.create_task(job_manager.run_expiry(Config.JOB_EXPIRY_INTERVAL)),
+        asyncio.create_task(session_manager.run_expiry(
+            Config.SESSION_EXPIRY_INTERVAL,
+            is_active=ws_manager.is_active
+        )),
+        asyncio.create_task(ws_manager.run_heartbeat(Config.WS_HEARTBEAT_INTERVAL, Config.WS_IDLE_TIMEOUT)),
+    ]
+    # Serve right away; the agents' model clients are built in the background
+    readiness.mark_started()
+    readiness.start_warm_up([task_manager, research_agent, creative_agent])
+    yield
+    await readiness.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await job_manager.stop()
+    await asyncio.to_thread(session_manager.close)
+    await asyncio.to_thread(tracer.close)
+    await worker_router.close()
+    await event_bus.close()
+    # Flush log records still queued for the sinks
+    await logger.complete()
+
+app = FastAPI(title="Multi-Agent Collaboration System", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -26,12 +79,329 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize managers and agents
-ws_manager = WebSocketManager()
-session_manager = SessionManager()
+# Initialize managers and agents. The agents only hold the shared Autogen
+# configuration; per-session history lives in SessionState.agent_contexts.
+# Workers started with WORKERS > 1 reach each other through the relay
+# started below in __main__, and proxy clients they do not own to their owner
+worker_router = WorkerRouter.from_config(Config)
+event_bus = (
+    MultiprocessEventBus.from_address(Config.EVENT_BUS_ADDRESS, Config.EVENT_BUS_AUTHKEY)
+    if Config.EVENT_BUS_ADDRESS else LocalEventBus()
+)
+ws_manager = WebSocketManager(
+    bus=event_bus,
+    worker_id=Config.WORKER_ID,
+    send_queue_size=Config.WS_SEND_QUEUE_SIZE,
+    overflow_policy=Config.WS_OVERFLOW_POLICY,
+    protocol_options={
+        "batch_window": Config.WS_BATCH_WINDOW,
+        "ref_min_length": Config.WS_CONTENT_REF_MIN_LENGTH,
+        "ref_limit": Config.WS_CONTENT_REF_LIMIT,
+    },
+    replay_size=Config.WS_REPLAY_BUFFER_SIZE,
+    resume_grace=Config.WS_RESUME_GRACE
+)
+session_manager = SessionManager(
+    timeout=Config.SESSION_TIMEOUT,
+    max_conversation=Config.SESSION_MAX_CONVERSATION,
+    max_traces=Config.SESSION_MAX_TRACES,
+    max_internal_comms=Config.SESSION_MAX_INTERNAL_COMMS,
+    intern_min_length=Config.SESSION_INTERN_MIN_LENGTH,
+    store=SQLiteSessionStore(
+        Config.SESSION_STORE_PATH,
+        batch_size=Config.SESSION_STORE_BATCH_SIZE,
+        flush_interval=Config.SESSION_STORE_FLUSH_INTERVAL
+    ) if Config.SESSION_STORE_PATH else None,
+    retention=Config.SESSION_RETENTION
+)
+
+def release_session(client_id: str, agent_id: str = None):
+    """Free a session's memory once none of its connections can resume; the store keeps it."""
+    if not ws_manager.is_active(client_id):
+        session_manager.remove_session(client_id)
+
+ws_manager.on_release = release_session
+
+ACTIVE_SESSIONS.set_function(lambda: len(session_manager.sessions))
+ACTIVE_CONNECTIONS.set_function(lambda: len(ws_manager.outbound))
+
+# Cheap to create: model clients are built by the warm-up started in the
+# lifespan, or on first use
 task_manager = TaskManagerAgent(ws_manager=ws_manager)
 research_agent = ResearchAgent(ws_manager=ws_manager)
 creative_agent = CreativeAgent(ws_manager=ws_manager)
+readiness = Readiness(IMPORT_STARTED)
+# Looked up once; /status is polled
+AUTOGEN_INSTALLED = importlib.util.find_spec("autogen") is not None
+
+# Pipeline graphs. Each step declares the upstream outputs it needs; steps
+# without a dependency between them run concurrently. Clients may request a
+# subset of steps with an "agents" list, required upstream steps are added.
+# Downstream steps can start speculatively, see Config.SPECULATIVE_STEPS
+CHAT_PIPELINE = PipelineGraph([
+    PipelineStep("task_manager", task_manager, label="Task Manager"),
+    PipelineStep("research", research_agent, depends_on=["task_manager"], label="Research",
+                 speculative=Config.SPECULATIVE_STEPS.get("research")),
+    PipelineStep("creative", creative_agent, depends_on=["task_manager", "research"], label="Creative",
+                 speculative=Config.SPECULATIVE_STEPS.get("creative")),
+])
+PROCESS_PIPELINE = PipelineGraph([
+    PipelineStep("task_manager", task_manager, label="Task Manager"),
+    PipelineStep("research", research_agent, depends_on=["task_manager"], label="Research",
+                 speculative=Config.SPECULATIVE_STEPS.get("research")),
+    PipelineStep("creative", creative_agent, depends_on=["task_manager"], label="Creative",
+                 speculative=Config.SPECULATIVE_STEPS.get("creative")),
+])
+
+# Section titles for the combined chat response
+RESPONSE_SECTIONS = {
+    "task_manager": "Task Management Plan",
+    "research": "Research Findings",
+    "creative": "Creative Input",
+}
+
+# Internal communication sent from a finished step to its first downstream step
+HANDOFF_MESSAGES = {
+    "task_manager": "Task plan created",
+    "research": "Research completed",
+}
+
+def record_step_result(session, step: PipelineStep, result: StepResult):
+    """Store a successful step's output in the session."""
+    if not result.ok:
+        return
+    if step.name == "task_manager":
+        session.add_conversation_message("task_manager", result.output)
+    else:
+        session.add_agent_trace(step.agent.name, result.output)
+
+def describe_error(error: Exception) -> str:
+    """Turn an agent error into a message suitable for the user."""
+    error_message = str(error)
+    if "rate_limit_exceeded" in error_message:
+        error_message = "OpenAI rate limit exceeded. Please try again later."
+    return error_message
+
+async def run_chat_turn(client_id: str, session, message: str, agents: List[str] = None, stream: bool = False, use_cache: bool = True):
+    """Run one chat turn through the agent pipeline and stream results to the client.
+    
+    With ``stream`` each agent also sends its reply as ``agent_delta`` frames
+    while it is being generated. ``use_cache=False`` bypasses the response cache.
+    """
+    graph = CHAT_PIPELINE.select(agents)
+
+    async def on_step_complete(step: PipelineStep, result: StepResult):
+        record_step_result(session, step, result)
+        if result.ok:
+            await ws_manager.send_agent_trace(client_id, step.agent.name, result.output)
+        else:
+            error_message = describe_error(result.error)
+            await ws_manager.send_user_message(client_id, error_message, role="assistant")
+            await ws_manager.send_agent_trace(client_id, step.agent.name, f"Error: {error_message}")
+
+    results = await PipelineExecutor(graph).run(
+        message,
+        session.context,
+        client_id,
+        on_step_complete=on_step_complete,
+        agent_context_for=session.get_agent_context,
+        stream=stream,
+        use_cache=use_cache
+    )
+
+    # Record internal communication, one handoff per upstream step
+    handed_off = set()
+    for upstream, downstream in graph.edges():
+        if upstream in handed_off:
+            continue
+        if upstream in HANDOFF_MESSAGES and results[upstream].ok and results[downstream].ok:
+            handed_off.add(upstream)
+            from_agent = graph.steps[upstream].agent.name
+            to_agent = graph.steps[downstream].agent.name
+            session.add_internal_comm(from_agent, to_agent, f"{HANDOFF_MESSAGES[upstream]}: ", body=results[upstream].output)
+            await ws_manager.send_internal_comm(
+                client_id,
+                from_agent,
+                to_agent,
+                f"{HANDOFF_MESSAGES[upstream]}: {results[upstream].output}"
+            )
+
+    # Send final response
+    final_response = "\n\n".join(
+        f"## {RESPONSE_SECTIONS.get(name, graph.steps[name].label)}\n{result.output}"
+        for name, result in results.items()
+        if result.ok
+    )
+    if final_response:
+        await ws_manager.send_user_message(client_id, final_response, role="assistant")
+    return results
+
+async def handle_chat_message(client_id: str, session, data: Dict[str, Any]):
+    """Process one user message from the chat WebSocket."""
+    with tracer.start_trace("chat.turn", client_id=client_id), session_manager.hold(session):
+        # Each chat turn starts the agents on a fresh conversation. This is the
+        # only place they are cleared: an interrupted turn may still be
+        # unwinding while the next one runs and must not clear its histories.
+        session.clear_agent_histories()
+        message = data["content"]
+        session.add_conversation_message("user", message)
+        await ws_manager.send_user_message(client_id, message)
+        
+        try:
+            await run_chat_turn(
+                client_id,
+                session,
+                message,
+                agents=data.get("agents"),
+                stream=bool(data.get("stream", False)),
+                use_cache=bool(data.get("cache", True))
+            )
+        except ValueError as e:
+            await ws_manager.send_user_message(client_id, f"Error: {str(e)}", role="assistant")
+        except Exception as e:
+            logger.error("Error processing message for client {}: {}", client_id, e)
+            await ws_manager.send_user_message(client_id, f"Error processing message: {str(e)}", role="assistant")
+
+async def handle_direct_message(client_id: str, session, agent, agent_id: str, data: Dict[str, Any]):
+    """Process one user message from a direct agent WebSocket."""
+    with tracer.start_trace("direct.turn", client_id=client_id, agent=agent_id), session_manager.hold(session):
+        try:
+            message = data["content"]
+            session.add_conversation_message("user", message)
+            await ws_manager.send_user_message(client_id, message, agent_id=agent_id)
+
+            # Process message through the specific agent with chat history
+            agent_response = await agent.process_message(
+                message,
+                session.context,
+                client_id,
+                agent_context=session.get_agent_context(agent.name),
+                stream=bool(data.get("stream", False)),
+                agent_id=agent_id,
+                use_cache=bool(data.get("cache", True)),
+                priority=PRIORITY_DIRECT
+            )
+
+            # Add response to appropriate session storage
+            if agent_id == "task_manager":
+                session.add_conversation_message("task_manager", agent_response)
+            else:
+                session.add_agent_trace(agent.name, agent_response)
+
+            # Send the response back to the client
+            await ws_manager.send_user_message(client_id, agent_response, role="assistant", agent_id=agent_id)
+
+            # Record internal communication if needed
+            if agent_id == "task_manager":
+                session.add_internal_comm("TaskManager", "Research", "Task plan created: ", body=agent_response)
+                await ws_manager.send_internal_comm(
+                    client_id,
+                    "TaskManager",
+                    "Research",
+                    f"Task plan created: {agent_response}"
+                )
+            elif agent_id == "research":
+                session.add_internal_comm("Research", "Creative", "Research completed: ", body=agent_response)
+                await ws_manager.send_internal_comm(
+                    client_id,
+                    "Research",
+                    "Creative",
+                    f"Research completed: {agent_response}"
+                )
+        except Exception as e:
+            logger.error("Error processing message for agent {}: {}", agent_id, e)
+            await ws_manager.send_user_message(
+                client_id,
+                f"Error processing message: {str(e)}",
+                role="assistant",
+                agent_id=agent_id
+            )
+
+async def run_process_request(client_id: str, prompt: str, graph: PipelineGraph, use_cache: bool = True,
+                              on_step_complete=None) -> Dict[str, StepResult]:
+    """Run one prompt through the process pipeline for a session and record the results.
+    
+    ``on_step_complete`` is awaited after each step's result is recorded in the session.
+    """
+    with tracer.start_trace("process.request", client_id=client_id, steps=",".join(graph.order)):
+        # Create or get session, and keep it in memory until we are done
+        session = await session_manager.get_or_create_session(client_id)
+        with session_manager.hold(session):
+            # Add user message to session
+            session.add_conversation_message("user", prompt)
+
+            async def record_step(step: PipelineStep, result: StepResult):
+                record_step_result(session, step, result)
+                if on_step_complete:
+                    await on_step_complete(step, result)
+
+            results = await PipelineExecutor(graph).run(
+                prompt,
+                session.context,
+                client_id,
+                on_step_complete=record_step,
+                agent_context_for=session.get_agent_context,
+                use_cache=use_cache,
+                priority=PRIORITY_BATCH
+            )
+
+            # Record internal communications
+            internal_messages = []
+            if "research" in results:
+                internal_messages.append({
+                    "from": "TaskManager",
+                    "to": "Research",
+                    "content": f"Requesting research on: {prompt}"
+                })
+            if "creative" in results:
+                internal_messages.append({
+                    "from": "TaskManager",
+                    "to": "Creative",
+                    "content": f"Requesting creative input on: {prompt}"
+                })
+
+            for msg in internal_messages:
+                session.add_internal_comm(msg["from"], msg["to"], msg["content"])
+
+            # Send internal communications to the client's WebSocket, wherever it is connected
+            for msg in internal_messages:
+                await ws_manager.send_internal_comm(
+                    client_id,
+                    msg["from"],
+                    msg["to"],
+                    msg["content"]
+                )
+            return results
+
+def summarize_results(results: Dict[str, StepResult]) -> Dict[str, Any]:
+    """Outputs and errors of a pipeline run, keyed by step name."""
+    summary = {
+        "status": "success",
+        "outputs": {name: result.output for name, result in results.items() if result.ok},
+    }
+    errors = {name: str(result.error) for name, result in results.items() if not result.ok}
+    if errors:
+        summary["status"] = "error" if len(errors) == len(results) else "partial"
+        summary["errors"] = errors
+    return summary
+
+async def run_remote_process_request(node: str, client_id: str, prompt: str, agents: List[str] = None,
+                                     use_cache: bool = True) -> Dict[str, Any]:
+    """Run a prompt on the worker owning its session, summarized like ``summarize_results``."""
+    response = await worker_router.forward(node, "POST", "/process", {
+        "client_id": client_id,
+        "prompt": prompt,
+        "agents": agents,
+        "cache": use_cache,
+    })
+    body = response.json()
+    if response.status_code == 200:
+        summary = {"status": body["status"], "outputs": body["outputs"]}
+        if "errors" in body:
+            summary["errors"] = body["errors"]
+        return summary
+    detail = body.get("detail")
+    return {"status": "error", "errors": detail if isinstance(detail, dict) else {"request": str(detail)}}
 
 @app.post("/process")
 async def process_request(request: Dict[str, Any]):
@@ -44,188 +414,342 @@ async def process_request(request: Dict[str, Any]):
         if not client_id or not prompt:
             raise HTTPException(status_code=400, detail="Missing required fields")
 
-        # Create or get session
-        session = session_manager.get_session(client_id)
-        if not session:
-            session = session_manager.create_session(client_id)
-
-        # Add user message to session
-        session.add_conversation_message("user", prompt)
-
-        # Process through task manager
-        task_response = await task_manager.process_message(prompt, session.context, client_id)
-        session.add_conversation_message("task_manager", task_response)
-
-        # Process through research agent
-        research_response = await research_agent.process_message(prompt, session.context, client_id)
-        session.add_agent_trace("Research", research_response)
-
-        # Process through creative agent
-        creative_response = await creative_agent.process_message(prompt, session.context, client_id)
-        session.add_agent_trace("Creative", creative_response)
-
-        # Record internal communications
-        internal_messages = [
-            {
-                "from": "TaskManager",
-                "to": "Research",
-                "content": f"Requesting research on: {prompt}"
-            },
-            {
-                "from": "TaskManager",
-                "to": "Creative",
-                "content": f"Requesting creative input on: {prompt}"
-            }
-        ]
-
-        # Send internal communications through WebSocket if client is connected
-        if ws_manager.is_client_connected(client_id):
-            for msg in internal_messages:
-                await ws_manager.send_internal_comm(
-                    client_id,
-                    msg["from"],
-                    msg["to"],
-                    msg["content"]
-                )
+        owner = worker_router.owner(client_id)
+        if owner:
+            return await worker_router.proxy(owner, "POST", "/process", request)
 
-        return {
+        try:
+            graph = PROCESS_PIPELINE.select(request.get("agents"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        results = await run_process_request(client_id, prompt, graph, use_cache=bool(request.get("cache", True)))
+        summary = summarize_results(results)
+        if summary["status"] == "error":
+            raise HTTPException(status_code=500, detail=summary["errors"])
+
+        response = {
             "status": "success",
             "message": "Request processed successfully",
-            "session_id": client_id
+            "session_id": client_id,
+            "outputs": summary["outputs"]
         }
+        if summary["status"] == "partial":
+            response["status"] = "partial"
+            response["message"] = "Request processed with errors"
+            response["errors"] = summary["errors"]
+        return response
 
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
+        logger.error("Error processing request: {}", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/process/batch")
+async def process_batch(request: Dict[str, Any]):
+    """Process many prompts, streaming one NDJSON line per prompt as it completes.
+    
+    ``prompts`` is a list of strings or of objects with ``prompt`` and
+    optional ``id`` and ``client_id``. Each prompt runs in its own session
+    (``<client_id>:<index>`` unless given) with at most ``concurrency``
+    prompts in flight. Prompts given the same ``client_id`` share a session
+    and run one after another, in order. The last line is a summary.
+    """
+    prompts = request.get("prompts")
+    if not isinstance(prompts, list) or not prompts:
+        raise HTTPException(status_code=400, detail="prompts must be a non-empty list")
+    if len(prompts) > Config.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {Config.BATCH_MAX_ITEMS} prompts per batch")
+
+    batch_id = request.get("client_id") or f"batch-{uuid.uuid4()}"
+    items = []
+    for index, item in enumerate(prompts):
+        if isinstance(item, str):
+            item = {"prompt": item}
+        if not isinstance(item, dict) or not isinstance(item.get("prompt"), str) or not item["prompt"]:
+            raise HTTPException(status_code=400, detail=f"Item {index} has no prompt")
+        items.append({
+            "index": index,
+            "id": item.get("id", index),
+            "client_id": item.get("client_id") or f"{batch_id}:{index}",
+            "prompt": item["prompt"],
+        })
+
+    try:
+        graph = PROCESS_PIPELINE.select(request.get("agents"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    use_cache = bool(request.get("cache", True))
+    concurrency = request.get("concurrency")
+    if concurrency is None:
+        concurrency = Config.BATCH_MAX_CONCURRENCY
+    if isinstance(concurrency, bool) or not isinstance(concurrency, int) or concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be a positive integer")
+    concurrency = min(concurrency, Config.BATCH_MAX_CONCURRENCY)
+
+    # Turns of one session must not interleave
+    sessions: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        sessions.setdefault(item["client_id"], []).append(item)
+
+    async def run_item(item: Dict[str, Any]) -> Dict[str, Any]:
+        started_at = time.monotonic()
+        line = {"type": "result", "index": item["index"], "id": item["id"], "client_id": item["client_id"]}
+        try:
+            owner = worker_router.owner(item["client_id"])
+            if owner:
+                line.update(await run_remote_process_request(owner, item["client_id"], item["prompt"], request.get("agents"), use_cache))
+            else:
+                results = await run_process_request(item["client_id"], item["prompt"], graph, use_cache)
+                line.update(summarize_results(results))
+        except Exception as e:
+            logger.error("Error processing batch item {}: {}", item["index"], e)
+            line.update({"status": "error", "errors": {"request": str(e)}})
+        line["duration"] = round(time.monotonic() - started_at, 3)
+        return line
+
+    async def stream_results():
+        pending = iter(sessions.values())
+        completed: asyncio.Queue = asyncio.Queue()
+        counts = {"success": 0, "partial": 0, "error": 0}
+        started_at = time.monotonic()
+
+        async def worker():
+            # Workers pull the next session's prompts as they finish, so at
+            # most ``concurrency`` prompts are in flight
+            for session_items in pending:
+                for item in session_items:
+                    await completed.put(await run_item(item))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(sessions)))]
+        try:
+            for _ in items:
+                line = await completed.get()
+                counts[line["status"]] += 1
+                yield json.dumps(line) + "\n"
+            elapsed = time.monotonic() - started_at
+            yield json.dumps({
+                "type": "summary",
+                "batch_id": batch_id,
+                "total": len(items),
+                **counts,
+                "duration": round(elapsed, 3),
+                "throughput": round(len(items) / elapsed, 3) if elapsed else None,
+            }) + "\n"
+        finally:
+            # The client went away or the batch finished; stop remaining work
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def run_job(job: Job):
+    """Run a submitted job through the process pipeline, recording each step on the job."""
+    graph = PROCESS_PIPELINE.select(job.options.get("agents"))
+
+    async def on_step_complete(step: PipelineStep, result: StepResult):
+        job.record_step(step.name, result.output, result.error, result.duration)
+        await job_manager.notify(job)
+
+    await run_process_request(
+        job.client_id,
+        job.prompt,
+        graph,
+        use_cache=job.options.get("cache", True),
+        on_step_complete=on_step_complete
+    )
+
+async def send_job_update(job: Job):
+    """Push job progress to the client's WebSocket if it asked for updates."""
+    if job.options.get("notify"):
+        await ws_manager.send_message(job.client_id, {"type": "job_update", **job.to_dict(), "timestamp": time.time()})
+
+job_manager = JobManager(
+    run_job,
+    max_workers=Config.JOB_MAX_WORKERS,
+    max_queued=Config.JOB_MAX_QUEUED,
+    ttl=Config.JOB_RESULT_TTL,
+    on_update=send_job_update,
+    id_prefix=worker_router.id_prefix
+)
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: Dict[str, Any]):
+    """Queue a prompt for background processing and return its job id at once"""
+    client_id = request.get("client_id")
+    prompt = request.get("prompt")
+    if not client_id or not prompt:
+        raise HTTPException(status_code=400, detail="Missing required fields")
+    # Jobs run on the worker holding the client's session
+    owner = worker_router.owner(client_id)
+    if owner:
+        return await worker_router.proxy(owner, "POST", "/jobs", request)
+    agents = request.get("agents")
+    try:
+        PROCESS_PIPELINE.select(agents)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        job = job_manager.submit(
+            client_id,
+            prompt,
+            agents=agents,
+            cache=bool(request.get("cache", True)),
+            notify=bool(request.get("notify", False))
+        )
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Too many queued jobs, try again later")
+    return {"job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status and per-agent results of a job, including partial results while it runs"""
+    owner = worker_router.owner_of_id(job_id)
+    if owner:
+        return await worker_router.proxy(owner, "GET", f"/jobs/{job_id}")
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    owner = worker_router.owner_of_id(job_id)
+    if owner:
+        return await worker_router.proxy(owner, "DELETE", f"/jobs/{job_id}")
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not await job_manager.cancel(job_id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return {"job_id": job_id, "status": "cancelling"}
+
 @app.get("/status")
 async def get_status():
     """Check the status of the backend and AutoGen configuration"""
-    try:
-        # Check if AutoGen is installed
-        autogen_installed = False
-        try:
-            import autogen
-            autogen_installed = True
-        except ImportError:
-            pass
-
-        # Check if OpenAI API key is configured
-        openai_api_key_configured = bool(os.getenv("OPENAI_API_KEY"))
-
-        return {
-            "status": "running",
-            "autogen_installed": autogen_installed,
-            "openai_api_key_configured": openai_api_key_configured
-        }
-    except Exception as e:
-        return {
-            "status": "error",
-            "error": str(e)
-        }
+    return {
+        "status": "running",
+        "llm_backend": Config.LLM_BACKEND,
+        "autogen_installed": AUTOGEN_INSTALLED,
+        "openai_api_key_configured": bool(Config.OPENAI_API_KEY),
+        **readiness.get_status()
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness: 503 until the agent warm-up has finished"""
+    return JSONResponse(readiness.get_status(), status_code=200 if readiness.ready else 503)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Latency histograms, counters and gauges in the Prometheus text format"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/cache")
+async def get_cache_stats():
+    """Hit/miss counters of the LLM response cache"""
+    if default_response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **default_response_cache.get_stats()}
+
+@app.get("/stats/single_flight")
+async def get_single_flight_stats():
+    """Counts of LLM calls started and of identical requests that joined them"""
+    return default_single_flight.get_stats()
+
+@app.get("/stats/scheduler")
+async def get_scheduler_stats():
+    """Queue depth per priority lane, wait times and retry counts of the LLM scheduler"""
+    return default_scheduler.get_stats()
+
+@app.get("/stats/hedging")
+async def get_hedging_stats():
+    """Hedged call counts, hedge thresholds per agent and circuit breaker states"""
+    return default_hedger.get_stats()
+
+@app.get("/stats/speculation")
+async def get_speculation_stats():
+    """Per-step hit rate and time saved by speculative execution"""
+    return default_speculation_stats.get_stats()
+
+@app.get("/stats/jobs")
+async def get_job_stats():
+    """Job counts by status and worker pool usage"""
+    return job_manager.get_stats()
+
+@app.get("/stats/websockets")
+async def get_websocket_stats():
+    """Outbound queue depths and drop counters for open WebSockets"""
+    return ws_manager.get_stats()
+
+@app.get("/stats/tracing")
+async def get_tracing_stats():
+    """Sampled and unsampled turns and exported span count"""
+    return tracer.get_stats()
+
+@app.get("/stats/sessions")
+async def get_session_stats():
+    """Session count and memory usage, with details for the largest sessions"""
+    return session_manager.get_stats()
+
+@app.get("/stats/sessions/{session_id}")
+async def get_session_memory(session_id: str):
+    """Memory usage of a single session"""
+    owner = worker_router.owner(session_id)
+    if owner:
+        return await worker_router.proxy(owner, "GET", f"/stats/sessions/{session_id}")
+    session = await session_manager.load_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session.memory_usage()
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
+    owner = worker_router.owner(client_id)
+    if owner:
+        await worker_router.proxy_websocket(websocket, owner)
+        return
+    log = logger.bind(client_id=client_id)
     try:
-        print(f"New WebSocket connection attempt from client {client_id}")
         await ws_manager.connect(websocket, client_id)
-        print(f"WebSocket connection established for client {client_id}")
-        session = session_manager.create_session(client_id)
+        session = await session_manager.get_or_create_session(client_id)
         
         while True:
             try:
                 # Check if the connection is still active
                 if not ws_manager.is_client_connected(client_id):
-                    print(f"Client {client_id} is no longer connected")
+                    log.debug("Client {} is no longer connected", client_id)
                     break
                     
                 data = await websocket.receive_json()
-                print(f"Received message from client {client_id}: {data}")
+                ws_manager.mark_alive(client_id)
+                log.debug("Received message from client {}: {}", client_id, Truncated(data))
                 
                 if data["type"] == "user_message":
-                    message = data["content"]
-                    session.add_conversation_message("user", message)
-                    await ws_manager.send_user_message(client_id, message)
-                    
-                    # Process message sequentially through agents
-                    # 1. First through Task Manager
-                    print(f"Processing message through Task Manager for client {client_id}")
-                    task_response = await task_manager.process_message(message, session.context, client_id)
-                    session.add_conversation_message("task_manager", task_response)
-                    await ws_manager.send_agent_trace(client_id, "TaskManager", task_response)
-                    
-                    # 2. Then through Research Agent with Task Manager's response
-                    print(f"Processing message through Research Agent for client {client_id}")
-                    research_response = await research_agent.process_message(
-                        message, 
-                        session.context, 
-                        client_id,
-                        previous_agent_response=task_response
-                    )
-                    session.add_agent_trace("Research", research_response)
-                    await ws_manager.send_agent_trace(client_id, "Research", research_response)
-                    
-                    # 3. Finally through Creative Agent with both previous responses
-                    try:
-                        print(f"Processing message through Creative Agent for client {client_id}")
-                        creative_response = await creative_agent.process_message(
-                            message,
-                            session.context,
-                            client_id,
-                            previous_agent_response=f"Task Manager: {task_response}\n\nResearch: {research_response}"
-                        )
-                        session.add_agent_trace("Creative", creative_response)
-                        await ws_manager.send_agent_trace(client_id, "Creative", creative_response)
-                    except Exception as e:
-                        error_message = str(e)
-                        if "rate_limit_exceeded" in error_message:
-                            error_message = "OpenAI rate limit exceeded. Please try again later."
-                        await ws_manager.send_user_message(client_id, error_message, role="assistant")
-                        await ws_manager.send_agent_trace(client_id, "Creative", f"Error: {error_message}")
-                    
-                    # Record internal communication
-                    await ws_manager.send_internal_comm(
-                        client_id,
-                        "TaskManager",
-                        "Research",
-                        f"Task plan created: {task_response}"
-                    )
-                    await ws_manager.send_internal_comm(
-                        client_id,
-                        "Research",
-                        "Creative",
-                        f"Research completed: {research_response}"
-                    )
-                    
-                    # Send final response
-                    final_response = f"""## Task Management Plan
-{task_response}
-
-## Research Findings
-{research_response}
-
-## Creative Input
-{creative_response}"""
-                    await ws_manager.send_user_message(client_id, final_response, role="assistant")
-                    
-                    # Clear agent histories for next conversation
-                    task_manager.clear_history()
-                    research_agent.clear_history()
-                    creative_agent.clear_history()
+                    # The turn runs in the background so we keep reading: a new
+                    # message interrupts it and a disconnect cancels it.
+                    ws_manager.start_turn(client_id, handle_chat_message(client_id, session, data))
+                
+                elif data["type"] == "interrupt":
+                    if ws_manager.cancel_turn(client_id):
+                        await ws_manager.send_user_message(client_id, "Request interrupted", role="system")
 
             except json.JSONDecodeError:
-                print(f"Invalid JSON received from client {client_id}")
+                log.warning("Invalid JSON received from client {}", client_id)
                 await ws_manager.send_user_message(
                     client_id,
                     "Error: Invalid message format",
                     role="assistant"
                 )
             except WebSocketDisconnect:
-                print(f"Client {client_id} disconnected")
                 break
             except Exception as e:
-                print(f"Error processing message for client {client_id}: {str(e)}")
-                logger.error(f"Error processing message: {str(e)}")
+                log.error("Error processing message for client {}: {}", client_id, e)
                 if ws_manager.is_client_connected(client_id):
                     await ws_manager.send_user_message(
                         client_id,
@@ -234,22 +758,25 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                     )
                 
     except WebSocketDisconnect:
-        print(f"Client {client_id} disconnected")
+        pass
     except Exception as e:
-        print(f"Error in WebSocket communication for client {client_id}: {str(e)}")
-        logger.error(f"Error in WebSocket communication: {str(e)}")
+        log.error("Error in WebSocket communication for client {}: {}", client_id, e)
     finally:
-        await ws_manager.disconnect(client_id)
-        session_manager.remove_session(client_id)
+        # The session and any running turn survive a short disconnect so the
+        # client can resume; release_session frees it if it does not come back
+        await ws_manager.disconnect(client_id, websocket=websocket)
 
 @app.websocket("/ws/{client_id}/agent/{agent_id}")
 async def direct_agent_websocket(websocket: WebSocket, client_id: str, agent_id: str):
     """Direct communication with a specific agent"""
+    owner = worker_router.owner(client_id)
+    if owner:
+        await worker_router.proxy_websocket(websocket, owner)
+        return
+    log = logger.bind(client_id=client_id, agent_id=agent_id)
     try:
-        print(f"New direct agent WebSocket connection attempt from client {client_id} for agent {agent_id}")
         await ws_manager.connect(websocket, client_id, agent_id)
-        print(f"Direct agent WebSocket connection established for client {client_id} and agent {agent_id}")
-        session = session_manager.create_session(client_id)
+        session = await session_manager.get_or_create_session(client_id)
         
         # Initialize agent based on agent_id
         agent = None
@@ -261,7 +788,7 @@ async def direct_agent_websocket(websocket: WebSocket, client_id: str, agent_id:
             agent = creative_agent
         
         if not agent:
-            print(f"Unknown agent ID: {agent_id}")
+            log.warning("Unknown agent ID: {}", agent_id)
             await ws_manager.send_user_message(
                 client_id,
                 f"Error: Unknown agent {agent_id}",
@@ -270,52 +797,31 @@ async def direct_agent_websocket(websocket: WebSocket, client_id: str, agent_id:
             )
             return
         
-        print(f"Agent {agent_id} initialized for client {client_id}")
-        
         while True:
             try:
                 data = await websocket.receive_json()
+                ws_manager.mark_alive(client_id, agent_id)
+                log.debug("Received message from client {} for agent {}: {}", client_id, agent_id, Truncated(data))
                 
                 if data["type"] == "user_message":
-                    message = data["content"]
-                    session.add_conversation_message("user", message)
-                    await ws_manager.send_user_message(client_id, message, agent_id=agent_id)
-                    
-                    # Process message through the specific agent with chat history
-                    agent_response = await agent.process_message(
-                        message,
-                        session.context,
-                        client_id
+                    ws_manager.start_turn(
+                        client_id,
+                        handle_direct_message(client_id, session, agent, agent_id, data),
+                        agent_id
                     )
-                    
-                    # Add response to appropriate session storage
-                    if agent_id == "task_manager":
-                        session.add_conversation_message("task_manager", agent_response)
-                    else:
-                        session.add_agent_trace(agent.name, agent_response)
-                    
-                    # Send the response back to the client
-                    await ws_manager.send_user_message(client_id, agent_response, role="assistant", agent_id=agent_id)
-                    
-                    # Record internal communication if needed
-                    if agent_id == "task_manager":
-                        await ws_manager.send_internal_comm(
-                            client_id,
-                            "TaskManager",
-                            "Research",
-                            f"Task plan created: {agent_response}"
-                        )
-                    elif agent_id == "research":
-                        await ws_manager.send_internal_comm(
+                
+                elif data["type"] == "interrupt":
+                    if ws_manager.cancel_turn(client_id, agent_id):
+                        await ws_manager.send_user_message(
                             client_id,
-                            "Research",
-                            "Creative",
-                            f"Research completed: {agent_response}"
+                            "Request interrupted",
+                            role="system",
+                            agent_id=agent_id
                         )
                 
                 elif data["type"] == "clear_history":
-                    # Clear the agent's message history
-                    agent.clear_history()
+                    # Clear the agent's message history for this session
+                    agent.clear_history(session.get_agent_context(agent.name))
                     await ws_manager.send_user_message(
                         client_id,
                         "Chat history cleared",
@@ -324,21 +830,18 @@ async def direct_agent_websocket(websocket: WebSocket, client_id: str, agent_id:
                     )
                 
             except json.JSONDecodeError:
-                print(f"Invalid JSON received from client {client_id}")
+                log.warning("Invalid JSON received from client {}", client_id)
                 await ws_manager.send_user_message(
                     client_id,
                     "Error: Invalid message format",
                     role="assistant",
                     agent_id=agent_id
                 )
-            except WebSocketDisconnect as e:
-                print(f"Client {client_id} disconnected from agent {agent_id}: {str(e)}")
-                await ws_manager.disconnect(client_id, agent_id)
-                session_manager.remove_session(client_id)
+            except WebSocketDisconnect:
+                await ws_manager.disconnect(client_id, agent_id, websocket)
                 return
             except Exception as e:
-                print(f"Error processing message for agent {agent_id}: {str(e)}")
-                logger.error(f"Error processing message for agent {agent_id}: {str(e)}")
+                log.error("Error processing message for agent {}: {}", agent_id, e)
                 await ws_manager.send_user_message(
                     client_id,
                     f"Error processing message: {str(e)}",
@@ -346,15 +849,11 @@ async def direct_agent_websocket(websocket: WebSocket, client_id: str, agent_id:
                     agent_id=agent_id
                 )
                 
-    except WebSocketDisconnect as e:
-        print(f"Client {client_id} disconnected from agent {agent_id}: {str(e)}")
-        await ws_manager.disconnect(client_id, agent_id)
-        session_manager.remove_session(client_id)
+    except WebSocketDisconnect:
+        await ws_manager.disconnect(client_id, agent_id, websocket)
     except Exception as e:
-        print(f"Error in direct agent communication for {agent_id}: {str(e)}")
-        logger.error(f"Error in direct agent communication for {agent_id}: {str(e)}")
-        await ws_manager.disconnect(client_id, agent_id)
-        session_manager.remove_session(client_id)
+        log.error("Error in direct agent communication for {}: {}", agent_id, e)
+        await ws_manager.disconnect(client_id, agent_id, websocket)
 
 @app.get("/")
 async def root():
@@ -362,14 +861,63 @@ async def root():
 
 @app.get("/health")
 async def health_check():
+    """Liveness: answers as soon as the app serves, without waiting for the warm-up"""
     return {"status": "healthy", "python_version": "3.13.3"}
 
+def serve_worker(sockets: List["socket.socket"]):
+    """Run one worker started by ``serve_workers`` on its inherited sockets."""
+    import uvicorn
+    uvicorn.Server(uvicorn.Config(
+        app,
+        # Compress frames when the client supports permessage-deflate
+        ws_per_message_deflate=True,
+        log_level=Config.LOG_LEVEL.lower()
+    )).run(sockets=sockets)
+
+def serve_workers(count: int, host: str, port: int):
+    """Start ``count`` workers sharing the public port, each with a private address.
+    
+    The private addresses become WORKER_NODES, the ring workers proxy
+    requests for clients they do not own over.
+    """
+    import multiprocessing
+    import socket
+    public = socket.create_server((host, port), backlog=2048)
+    private = [socket.create_server(("127.0.0.1", 0)) for _ in range(count)]
+    nodes = ["127.0.0.1:{}".format(sock.getsockname()[1]) for sock in private]
+    os.environ["WORKER_NODES"] = ",".join(nodes)
+    context = multiprocessing.get_context("spawn")
+    workers = []
+    for node, sock in zip(nodes, private):
+        # Read by Config when the worker imports this module
+        os.environ["WORKER_NODE"] = node
+        worker = context.Process(target=serve_worker, args=([public, sock],), name=f"worker-{node}")
+        worker.start()
+        workers.append(worker)
+    logger.info("Started {} workers on {}:{}, nodes {}", count, host, port, ",".join(nodes))
+    for worker in workers:
+        try:
+            worker.join()
+        except KeyboardInterrupt:
+            # The workers got the signal too and shut down on their own
+            worker.join()
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        workers=1
-    ) 
\ No newline at end of file
+    if Config.WORKERS > 1:
+        # Workers inherit the environment, and connect to the relay on startup
+        relay = EventBusRelay().start()
+        os.environ["EVENT_BUS_ADDRESS"] = "{}:{}".format(*relay.address)
+        os.environ["EVENT_BUS_AUTHKEY"] = relay.authkey.hex()
+        serve_workers(Config.WORKERS, "0.0.0.0", 8000)
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            # Reloading only works with a single worker
+            reload=True,
+            # Compress frames when the client supports permessage-deflate
+            ws_per_message_deflate=True,
+            log_level=Config.LOG_LEVEL.lower()
+        )
@@ -0,0 +1,199 @@
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+from multiprocessing.connection import Listener, Client, Connection
+import asyncio
+import json
+import os
+import queue
+import threading
+from loguru import logger
+
+EventHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+class EventBus:
+    """Publish/subscribe transport between workers.
+
+    Implementations deliver each event published on a channel to every
+    handler subscribed to that channel, in any worker.
+    """
+
+    async def start(self):
+        """Connect the transport; called from the app lifespan."""
+
+    async def close(self):
+        """Disconnect the transport."""
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, handler: EventHandler):
+        raise NotImplementedError
+
+    def unsubscribe(self, channel: str, handler: EventHandler):
+        raise NotImplementedError
+
+class LocalEventBus(EventBus):
+    """In-process bus for a single worker and for tests."""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self.published = 0
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        self.published += 1
+        await self._dispatch(channel, event)
+
+    async def _dispatch(self, channel: str, event: Dict[str, Any]):
+        for handler in list(self._handlers.get(channel, [])):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error("Error handling event on {}: {}", channel, e)
+
+    def subscribe(self, channel: str, handler: EventHandler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def unsubscribe(self, channel: str, handler: EventHandler):
+        handlers = self._handlers.get(channel, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+class EventBusRelay:
+    """Passes every event from one connected worker on to all the others.
+
+    The multiprocessing stand-in for a Redis-style broker: one relay runs
+    in the process that starts the workers (``main.py`` with WORKERS > 1,
+    or a test), and each worker connects a MultiprocessEventBus to its
+    ``address``. Connections are authenticated with ``authkey``.
+    """
+
+    def __init__(self, address: Tuple[str, int] = ("127.0.0.1", 0), authkey: bytes = None):
+        self.authkey = authkey or os.urandom(16)
+        self._listener = Listener(address, authkey=self.authkey)
+        self.address = self._listener.address
+        # Each worker's connection has its own outbox drained by a writer
+        # thread, so a slow worker never holds up delivery to the others
+        self._outboxes: Dict[Connection, "queue.SimpleQueue[Optional[bytes]]"] = {}
+        # Guards _outboxes only; nothing is sent while it is held
+        self._lock = threading.Lock()
+        self._closed = False
+        self.relayed = 0
+
+    def start(self) -> "EventBusRelay":
+        threading.Thread(target=self._accept_loop, name="event-bus-relay", daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                connection = self._listener.accept()
+            except Exception as e:
+                if not self._closed:
+                    logger.warning("Event bus relay rejected a connection: {}", e)
+                continue
+            outbox: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+            with self._lock:
+                self._outboxes[connection] = outbox
+            threading.Thread(target=self._relay_loop, args=(connection,), name="event-bus-relay-reader", daemon=True).start()
+            threading.Thread(target=self._write_loop, args=(connection, outbox), name="event-bus-relay-writer", daemon=True).start()
+
+    def _relay_loop(self, connection: Connection):
+        while True:
+            try:
+                payload = connection.recv_bytes()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                self.relayed += 1
+                targets = [outbox for target, outbox in self._outboxes.items() if target is not connection]
+            for outbox in targets:
+                outbox.put(payload)
+        with self._lock:
+            outbox = self._outboxes.pop(connection, None)
+        if outbox is not None:
+            outbox.put(None)
+        connection.close()
+
+    def _write_loop(self, connection: Connection, outbox: "queue.SimpleQueue[Optional[bytes]]"):
+        while True:
+            payload = outbox.get()
+            if payload is None:
+                return
+            try:
+                connection.send_bytes(payload)
+            except OSError as e:
+                logger.warning("Event bus relay could not reach a worker: {}", e)
+                return
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        with self._lock:
+            outboxes = dict(self._outboxes)
+            self._outboxes.clear()
+        for connection, outbox in outboxes.items():
+            outbox.put(None)
+            connection.close()
+
+class MultiprocessEventBus(LocalEventBus):
+    """A worker's connection to an EventBusRelay.
+
+    Events are delivered to this worker's own handlers and, through the
+    relay, to those of every other worker. Sending and receiving run on
+    background threads, so ``publish`` never waits for the relay.
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        super().__init__()
+        self.address = tuple(address)
+        self.authkey = authkey
+        self.received = 0
+        self._connection: Optional[Connection] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+
+    @classmethod
+    def from_address(cls, address: str, authkey: str) -> "MultiprocessEventBus":
+        """Build from ``"host:port"`` and a hex authkey, as passed to workers in the environment."""
+        host, _, port = address.rpartition(":")
+        return cls((host, int(port)), bytes.fromhex(authkey))
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._connection = await asyncio.to_thread(Client, self.address, authkey=self.authkey)
+        threading.Thread(target=self._write_loop, name="event-bus-writer", daemon=True).start()
+        threading.Thread(target=self._read_loop, name="event-bus-reader", daemon=True).start()
+        logger.info("Connected to event bus relay at {}:{}", *self.address)
+
+    async def close(self):
+        self._outbox.put(None)
+        if self._connection is not None:
+            self._connection.close()
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        await super().publish(channel, event)
+        if self._connection is not None:
+            self._outbox.put(json.dumps({"channel": channel, "event": event}).encode("utf-8"))
+
+    def _write_loop(self):
+        while True:
+            payload = self._outbox.get()
+            if payload is None:
+                return
+            try:
+                self._connection.send_bytes(payload)
+            except OSError as e:
+                logger.error("Lost the event bus relay: {}", e)
+                return
+
+    def _read_loop(self):
+        while True:
+            try:
+                message = json.loads(self._connection.recv_bytes())
+            except (EOFError, OSError):
+                return
+            self.received += 1
+            try:
+                asyncio.run_coroutine_threadsafe(self._dispatch(message["channel"], message["event"]), self._loop)
+            except RuntimeError:
+                # The event loop has shut down
+                return
@@ -0,0 +1,240 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from collections import deque
+import asyncio
+import time
+from loguru import logger
+
+class LatencyTracker:
+    """Recent call latencies, for percentile-based hedge thresholds."""
+
+    def __init__(self, window: int = 200):
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * percentile / 100))
+        return ordered[index]
+
+class CircuitBreaker:
+    """Stops sending calls to a backend after repeated failures.
+
+    After ``failure_threshold`` consecutive failures (errors, or calls
+    slower than the latency budget) the circuit opens for
+    ``reset_timeout`` seconds. Then one trial call is let through and
+    the rest are rejected until its outcome closes the circuit or opens
+    it again. A trial that ends without an outcome is ``release``d, so
+    the next call becomes the trial.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self.trial_in_flight:
+                return False
+            self.trial_in_flight = True
+            return True
+        return self.state == self.CLOSED
+
+    def release(self):
+        """An allowed call ended without an outcome: it was cancelled or never sent."""
+        self.trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+Attempt = Tuple[str, Callable[[], Awaitable[Any]]]
+
+class Hedger:
+    """Sends a duplicate request when the first one is slow.
+
+    The primary attempt gets until the hedge threshold: the
+    ``percentile``-th observed latency for the key once ``min_samples``
+    calls have been seen. After that (or as soon as it fails) the next
+    attempt is started; the first successful reply wins and the other call
+    is cancelled. Backends whose circuit breaker is open are skipped while
+    another one is available. Calls with no reply once the latency budget
+    has run out are cancelled and ``asyncio.TimeoutError`` is raised.
+    """
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20, window: int = 200,
+                 breaker_failures: int = 5, breaker_reset: float = 30, breaker_enabled: bool = True):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.breaker_failures = breaker_failures
+        self.breaker_reset = breaker_reset
+        self.breaker_enabled = breaker_enabled
+        self._latencies: Dict[str, LatencyTracker] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_backends = 0
+
+    def _tracker(self, key: str) -> LatencyTracker:
+        tracker = self._latencies.get(key)
+        if tracker is None:
+            tracker = self._latencies[key] = LatencyTracker(self.window)
+        return tracker
+
+    def _breaker(self, backend: str) -> CircuitBreaker:
+        breaker = self.breakers.get(backend)
+        if breaker is None:
+            breaker = self.breakers[backend] = CircuitBreaker(self.breaker_failures, self.breaker_reset)
+        return breaker
+
+    def threshold(self, key: str, budget: float) -> float:
+        tracker = self._tracker(key)
+        if len(tracker) < self.min_samples:
+            return budget
+        return min(budget, tracker.percentile(self.percentile))
+
+    async def run(self, key: str, budget: float, attempts: List[Attempt]) -> Any:
+        """Run ``attempts`` (backend name, factory) in order, hedging slow ones."""
+        self.calls += 1
+        # Backends whose breakers let this call through; only their
+        # outcomes are recorded, so a call never settles another call's trial
+        admitted = {backend for backend, _ in attempts}
+        if self.breaker_enabled:
+            available = [attempt for attempt in attempts if self._breaker(attempt[0]).allow()]
+            self.skipped_backends += len(attempts) - len(available)
+            admitted = {backend for backend, _ in available}
+            # Rather a degraded backend than none at all
+            attempts = available or attempts[:1]
+
+        primary = attempts[0][0]
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        remaining = list(attempts)
+        last_error: Optional[BaseException] = None
+        hedged = False
+        answered = False
+
+        def start_next():
+            backend, factory = remaining.pop(0)
+            pending[asyncio.create_task(factory())] = (backend, time.monotonic())
+
+        start_next()
+        deadline = next(iter(pending.values()))[1] + budget
+        try:
+            while pending:
+                left = max(deadline - time.monotonic(), 0)
+                threshold = self.threshold(key, budget)
+                hedge_next = bool(remaining) and threshold < left
+                timeout = threshold if hedge_next else left
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if not hedge_next:
+                        raise asyncio.TimeoutError(f"No reply for {key} within its {budget}s latency budget")
+                    # The call is slower than usual: send a duplicate
+                    hedged = True
+                    self.hedged += 1
+                    logger.info("Hedging slow call for {} to {}", key, remaining[0][0])
+                    start_next()
+                    continue
+                for task in done:
+                    backend, started_at = pending.pop(task)
+                    latency = time.monotonic() - started_at
+                    if task.exception() is None:
+                        answered = True
+                        if backend in admitted:
+                            self._record(backend, latency <= budget)
+                        if backend == primary:
+                            self._tracker(key).record(latency)
+                        elif hedged:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    if backend in admitted:
+                        self._record(backend, False)
+                if remaining and not pending:
+                    # Fail over at once instead of waiting for the threshold
+                    start_next()
+            raise last_error
+        finally:
+            for task, (backend, started_at) in pending.items():
+                task.cancel()
+                latency = time.monotonic() - started_at
+                # A call that never answered only counts against its
+                # backend if it already ran past the budget
+                if backend in admitted:
+                    if latency >= budget:
+                        self._record(backend, False)
+                    else:
+                        self._release(backend)
+                if answered and backend == primary:
+                    # Lost to a hedge: it ran at least this long
+                    self._tracker(key).record(latency)
+            for backend, _ in remaining:
+                self._release(backend)
+
+    def _record(self, backend: str, ok: bool):
+        if not self.breaker_enabled:
+            return
+        breaker = self._breaker(backend)
+        if ok:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+
+    def _release(self, backend: str):
+        if self.breaker_enabled:
+            self._breaker(backend).release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "skipped_backends": self.skipped_backends,
+            "thresholds": {
+                key: tracker.percentile(self.percentile)
+                for key, tracker in self._latencies.items()
+            },
+            "breakers": {
+                backend: {"state": breaker.state, "failures": breaker.failures, "times_opened": breaker.times_opened}
+                for backend, breaker in self.breakers.items()
+            },
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "Hedger":
+        return cls(
+            percentile=config.HEDGE_PERCENTILE,
+            min_samples=config.HEDGE_MIN_SAMPLES,
+            breaker_failures=config.CIRCUIT_BREAKER_FAILURES,
+            breaker_reset=config.CIRCUIT_BREAKER_RESET,
+            breaker_enabled=config.CIRCUIT_BREAKER_ENABLED
+        )
@@ -0,0 +1,220 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from collections import OrderedDict
+import asyncio
+import time
+import uuid
+from loguru import logger
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_PARTIAL = "partial"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_PARTIAL, JOB_FAILED, JOB_CANCELLED)
+
+class Job:
+    """A prompt submitted for background processing and its per-agent results."""
+
+    def __init__(self, client_id: str, prompt: str, options: Dict[str, Any] = None, id_prefix: str = ""):
+        self.id = id_prefix + uuid.uuid4().hex
+        self.client_id = client_id
+        self.prompt = prompt
+        self.options = options or {}
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Step name -> {"status", "output" or "error", "duration"}, filled in as agents finish
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def record_step(self, name: str, output: Any = None, error: Exception = None, duration: float = None):
+        step = {"status": "error" if error is not None else "success", "duration": duration}
+        if error is not None:
+            step["error"] = str(error)
+        else:
+            step["output"] = output
+        self.steps[name] = step
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "client_id": self.client_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": self.steps,
+            "error": self.error,
+        }
+
+class JobManager:
+    """Runs jobs on a bounded pool of worker tasks.
+
+    ``submit`` returns at once; at most ``max_workers`` jobs run at a time
+    and at most ``max_queued`` wait. ``runner`` does the work for a job and
+    records per-step results on it; ``on_update`` is awaited whenever a
+    job's status changes. Finished jobs are kept for ``ttl`` seconds.
+    Job ids start with ``id_prefix``, which tells workers whose jobs they are.
+    """
+
+    def __init__(self, runner: Callable[[Job], Awaitable[None]], max_workers: int = 4,
+                 max_queued: int = 1000, ttl: float = 3600,
+                 on_update: Callable[[Job], Awaitable[None]] = None, id_prefix: str = ""):
+        self.runner = runner
+        self.id_prefix = id_prefix
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.on_update = on_update
+        self.jobs: Dict[str, Job] = {}
+        # Finished job ids in the order they finished, for expiry
+        self._finished: "OrderedDict[str, float]" = OrderedDict()
+        # Jobs submitted before start() wait here for the workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._workers: List[asyncio.Task] = []
+        self.submitted = 0
+        self.rejected = 0
+        self.expired_total = 0
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.max_workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, client_id: str, prompt: str, **options) -> Job:
+        """Queue a job. Raises asyncio.QueueFull when too many are waiting."""
+        job = Job(client_id, prompt, options, self.id_prefix)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise
+        self.jobs[job.id] = job
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued; the worker skips it
+            self._finish(job, JOB_CANCELLED)
+            await self._notify(job)
+        return True
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if not job.finished:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                if job.task is not None:
+                    job.task.cancel()
+                raise
+            except Exception as e:
+                logger.error("Error running job {}: {}", job.id, e)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        # Set before notifying, so a cancel() meanwhile cancels the task
+        job.task = asyncio.create_task(self.runner(job))
+        await self._notify(job)
+
+        # wait() does not cancel the job if this worker is cancelled, and a
+        # cancelled job does not cancel the worker
+        await asyncio.wait([job.task])
+        if job.task.cancelled():
+            status = JOB_CANCELLED
+        elif job.task.exception() is not None:
+            job.error = str(job.task.exception())
+            status = JOB_FAILED
+        else:
+            errors = sum(1 for step in job.steps.values() if step["status"] == "error")
+            if not errors:
+                status = JOB_COMPLETED
+            elif errors < len(job.steps):
+                status = JOB_PARTIAL
+            else:
+                status = JOB_FAILED
+        job.task = None
+        self._finish(job, status)
+        await self._notify(job)
+
+    def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = time.time()
+        self._finished[job.id] = job.finished_at
+
+    async def notify(self, job: Job):
+        """Report progress of a running job, e.g. after each agent step."""
+        await self._notify(job)
+
+    async def _notify(self, job: Job):
+        if self.on_update is None:
+            return
+        try:
+            await self.on_update(job)
+        except Exception as e:
+            logger.error("Error reporting job {}: {}", job.id, e)
+
+    def cleanup_expired_jobs(self) -> int:
+        """Forget finished jobs older than the TTL. Visits only the expired ones."""
+        expires_before = time.time() - self.ttl
+        expired = 0
+        while self._finished:
+            job_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= expires_before:
+                break
+            del self._finished[job_id]
+            self.jobs.pop(job_id, None)
+            expired += 1
+        self.expired_total += expired
+        return expired
+
+    async def run_expiry(self, interval: float):
+        """Background task that expires finished jobs every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = self.cleanup_expired_jobs()
+                if expired:
+                    logger.info("Expired {} finished jobs, {} remaining", expired, len(self.jobs))
+            except Exception as e:
+                logger.error("Error expiring jobs: {}", e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "jobs": len(self.jobs),
+            "statuses": statuses,
+            "queued": self._queue.qsize(),
+            "max_queued": self.max_queued,
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "expired": self.expired_total,
+        }
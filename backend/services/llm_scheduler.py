@@ -0,0 +1,178 @@
+from typing import Dict, Any, Callable, Awaitable
+from collections import OrderedDict, deque
+import asyncio
+import random
+import time
+from loguru import logger
+from services.metrics import LLM_QUEUE_WAIT_SECONDS
+from services.tracing import tracer
+
+# Priority lanes, lower runs first
+PRIORITY_DIRECT = 0  # one-on-one agent chats
+PRIORITY_CHAT = 1    # the multi-agent chat WebSocket
+PRIORITY_BATCH = 2   # /process and other bulk work
+
+class TokenBucket:
+    """Token-bucket rate limiter: ``rate`` tokens per second, up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Best-effort check for provider rate-limit errors."""
+    if type(error).__name__ == "RateLimitError":
+        return True
+    message = str(error)
+    return "rate_limit_exceeded" in message or "Rate limit" in message or "429" in message
+
+class LLMScheduler:
+    """Admission control in front of every LLM call.
+
+    - a global cap on concurrent calls,
+    - a token bucket sized to the provider quota,
+    - priority lanes, served strictly in order,
+    - round-robin between client ids inside a lane, so one busy client
+      cannot starve the others,
+    - retries with jittered exponential backoff on rate-limit errors.
+    """
+
+    def __init__(self, max_concurrency: int = 8, rate_per_second: float = 0, burst: int = 1,
+                 max_retries: int = 3, retry_base_delay: float = 1.0, retry_max_delay: float = 30.0):
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(rate_per_second, max(burst, 1))
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.active = 0
+        # lane -> client_id -> waiting futures
+        self._lanes: Dict[int, "OrderedDict[str, deque]"] = {}
+        self.dispatched = 0
+        self.completed = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, factory: Callable[[], Awaitable[Any]], client_id: str = None, priority: int = PRIORITY_CHAT) -> Any:
+        """Run ``factory()`` once a slot and a rate-limit token are available."""
+        attempt = 0
+        while True:
+            queued_at = time.monotonic()
+            with tracer.span("llm.schedule", priority=priority, attempt=attempt):
+                await self._acquire_slot(client_id or "", priority)
+            try:
+                with tracer.span("llm.rate_limit"):
+                    await self.bucket.acquire()
+                LLM_QUEUE_WAIT_SECONDS.labels(str(priority)).observe(time.monotonic() - queued_at)
+                return await factory()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+                error = e
+            finally:
+                self._release_slot()
+
+            # Back off outside the slot so other calls can proceed meanwhile
+            delay = min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt))
+            delay = random.uniform(0, delay)
+            attempt += 1
+            self.retries += 1
+            logger.warning("LLM rate limited ({}), retry {} in {:.2f}s", error, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def _acquire_slot(self, client_id: str, priority: int):
+        waiter = asyncio.get_running_loop().create_future()
+        lane = self._lanes.setdefault(priority, OrderedDict())
+        lane.setdefault(client_id, deque()).append(waiter)
+        enqueued_at = time.monotonic()
+        self._dispatch()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was granted just before we were cancelled
+                self._release_slot()
+            raise
+        waited = time.monotonic() - enqueued_at
+        self.dispatched += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def _release_slot(self):
+        self.active -= 1
+        self.completed += 1
+        self._dispatch()
+
+    def _next_waiter(self):
+        for priority in sorted(self._lanes):
+            lane = self._lanes[priority]
+            while lane:
+                client_id, waiters = lane.popitem(last=False)
+                while waiters and waiters[0].cancelled():
+                    waiters.popleft()
+                if not waiters:
+                    continue
+                waiter = waiters.popleft()
+                if waiters:
+                    # Round-robin: the client goes to the back of its lane
+                    lane[client_id] = waiters
+                return waiter
+        return None
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            self.active += 1
+            waiter.set_result(None)
+
+    def queue_depth(self) -> Dict[int, int]:
+        return {
+            priority: sum(1 for waiters in lane.values() for waiter in waiters if not waiter.cancelled())
+            for priority, lane in self._lanes.items()
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth(),
+            "dispatched": self.dispatched,
+            "completed": self.completed,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "average_wait": self.total_wait / self.dispatched if self.dispatched else 0.0,
+            "max_wait": self.max_wait,
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "LLMScheduler":
+        return cls(
+            max_concurrency=config.LLM_MAX_CONCURRENCY,
+            rate_per_second=config.LLM_RATE_LIMIT_RPS,
+            burst=config.LLM_RATE_LIMIT_BURST,
+            max_retries=config.LLM_MAX_RETRIES,
+            retry_base_delay=config.LLM_RETRY_BASE_DELAY,
+            retry_max_delay=config.LLM_RETRY_MAX_DELAY,
+        )
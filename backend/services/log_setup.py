@@ -0,0 +1,59 @@
+from typing import Any
+import sys
+from loguru import logger
+
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+
+# Set by configure_logging; used by payloads that do not give their own limit
+_payload_max_chars = 200
+
+class Truncated:
+    """A log argument rendered as at most ``limit`` characters.
+
+    Rendering happens in ``__str__``, so with loguru's ``{}`` formatting a
+    payload is only converted to text if a sink accepts the record.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = None):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        limit = self.limit if self.limit is not None else _payload_max_chars
+        if len(text) <= limit:
+            return text
+        return f"{text[:limit]}... ({len(text)} chars)"
+
+def configure_logging(config):
+    """Route loguru through a background queue, so logging never writes on the event loop.
+
+    ``LOG_JSON`` switches to one JSON object per line, including the fields
+    bound with ``logger.bind``.
+    """
+    global _payload_max_chars
+    _payload_max_chars = config.LOG_PAYLOAD_MAX_CHARS
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        level=config.LOG_LEVEL,
+        format=TEXT_FORMAT,
+        serialize=config.LOG_JSON,
+        enqueue=True,
+        backtrace=False,
+        diagnose=False,
+    )
+    if config.LOG_FILE:
+        logger.add(
+            config.LOG_FILE,
+            level=config.LOG_LEVEL,
+            format=TEXT_FORMAT,
+            serialize=config.LOG_JSON,
+            enqueue=True,
+            rotation=config.LOG_FILE_ROTATION,
+            retention=config.LOG_FILE_RETENTION,
+            backtrace=False,
+            diagnose=False,
+        )
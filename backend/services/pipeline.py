@@ -0,0 +1,290 @@
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable
+import asyncio
+import time
+from loguru import logger
+from services.metrics import PIPELINE_STEP_SECONDS
+from services.tracing import tracer
+
+SPECULATE_ACCEPT = "accept"
+SPECULATE_REFINE = "refine"
+
+class PipelineStep:
+    """A single agent invocation inside a pipeline.
+
+    ``depends_on`` lists the upstream steps whose outputs this step needs.
+    The step starts as soon as all of them have finished and receives their
+    outputs as ``previous_agent_response``.
+    """
+
+    def __init__(self, name: str, agent: Any, depends_on: Optional[List[str]] = None, label: str = None,
+                 speculative: str = None):
+        if speculative not in (None, SPECULATE_ACCEPT, SPECULATE_REFINE):
+            raise ValueError(f"Unknown speculation mode for {name}: {speculative}")
+        self.name = name
+        self.agent = agent
+        self.depends_on = depends_on or []
+        self.label = label or name
+        # With a speculation mode the step drafts a reply from the prompt alone
+        # while its upstream steps run. "accept" uses the draft as is once
+        # they succeed; "refine" has the agent check it against their output.
+        self.speculative = speculative
+
+class StepResult:
+    """Outcome of a pipeline step. Exactly one of output/error is set."""
+
+    def __init__(self, name: str, output: str = None, error: Exception = None,
+                 started_at: float = None, finished_at: float = None):
+        self.name = name
+        self.output = output
+        self.error = error
+        self.started_at = started_at
+        self.finished_at = finished_at
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def duration(self) -> float:
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+class PipelineGraph:
+    """A declarative DAG of agent steps."""
+
+    def __init__(self, steps: List[PipelineStep]):
+        self.steps: Dict[str, PipelineStep] = {}
+        for step in steps:
+            if step.name in self.steps:
+                raise ValueError(f"Duplicate pipeline step: {step.name}")
+            self.steps[step.name] = step
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str, path: List[str]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Pipeline cycle detected: {' -> '.join(path + [name])}")
+            if name not in self.steps:
+                raise ValueError(f"Step {path[-1]} depends on unknown step {name}")
+            state[name] = 1
+            for dep in self.steps[name].depends_on:
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in self.steps:
+            visit(name, [])
+        return order
+
+    def select(self, names: Optional[Iterable[str]]) -> "PipelineGraph":
+        """Return the sub-graph needed to produce ``names``.
+
+        Upstream steps required by a selected step are pulled in
+        automatically. ``None`` selects the whole graph.
+        """
+        if names is None:
+            return self
+        names = list(names)
+        unknown = [name for name in names if name not in self.steps]
+        if unknown:
+            raise ValueError(f"Unknown pipeline steps: {', '.join(unknown)}")
+
+        selected = set()
+        stack = names
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(self.steps[name].depends_on)
+        return PipelineGraph([self.steps[name] for name in self.order if name in selected])
+
+    def edges(self) -> List[tuple]:
+        """Return ``(upstream, downstream)`` pairs in execution order."""
+        return [(dep, name) for name in self.order for dep in self.steps[name].depends_on]
+
+class SpeculationStats:
+    """Whether speculative drafts pay off, per step.
+
+    Time saved compares the actual finish time with an estimate of a
+    non-speculative run: starting when the upstream steps finished and
+    taking as long as the draft did. It is negative when refining the draft
+    cost more than it saved.
+    """
+
+    def __init__(self):
+        self._steps: Dict[str, Dict[str, float]] = {}
+
+    def _counters(self, name: str) -> Dict[str, float]:
+        counters = self._steps.get(name)
+        if counters is None:
+            counters = self._steps[name] = {
+                "attempts": 0, "accepted": 0, "refined": 0,
+                "discarded": 0, "draft_errors": 0, "time_saved": 0.0,
+            }
+        return counters
+
+    def record(self, name: str, accepted: bool, time_saved: float):
+        counters = self._counters(name)
+        counters["attempts"] += 1
+        counters["accepted" if accepted else "refined"] += 1
+        counters["time_saved"] += time_saved
+
+    def record_discarded(self, name: str):
+        """The draft was thrown away because an upstream step failed."""
+        self._counters(name)["discarded"] += 1
+
+    def record_draft_error(self, name: str):
+        """The draft failed and the step ran normally."""
+        self._counters(name)["draft_errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = {}
+        for name, counters in self._steps.items():
+            attempts = counters["attempts"]
+            stats[name] = {
+                **counters,
+                "time_saved": round(counters["time_saved"], 3),
+                "hit_rate": counters["accepted"] / attempts if attempts else 0.0,
+                "average_time_saved": round(counters["time_saved"] / attempts, 3) if attempts else 0.0,
+            }
+        return stats
+
+# Shared by all executors unless one is given its own
+default_speculation_stats = SpeculationStats()
+
+StepCallback = Callable[[PipelineStep, StepResult], Awaitable[None]]
+
+class PipelineExecutor:
+    """Runs a pipeline graph, starting each step as soon as its inputs are ready.
+
+    Independent branches run concurrently, so the critical path sets the
+    latency. A failing step does not cancel its siblings; steps that depend
+    on a failed step are skipped and reported with an error instead.
+    """
+
+    def __init__(self, graph: PipelineGraph, speculation_stats: SpeculationStats = None):
+        self.graph = graph
+        self.speculation_stats = speculation_stats or default_speculation_stats
+
+    @staticmethod
+    def format_inputs(upstream: List[tuple]) -> Optional[str]:
+        """Combine upstream outputs into a single ``previous_agent_response``."""
+        if not upstream:
+            return None
+        if len(upstream) == 1:
+            return upstream[0][1].output
+        return "\n\n".join(f"{step.label}: {result.output}" for step, result in upstream)
+
+    async def run(self, message: str, context: Dict[str, Any] = None, client_id: str = None,
+                  on_step_complete: StepCallback = None, agent_context_for: Callable[[str], Any] = None,
+                  **agent_kwargs) -> Dict[str, StepResult]:
+        """Run every step and return the results keyed by step name, in graph order.
+
+        ``agent_context_for`` maps an agent name to the per-session
+        AgentContext that should be used for that agent.
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+
+        def kwargs_for(step: PipelineStep) -> Dict[str, Any]:
+            if agent_context_for:
+                return dict(agent_kwargs, agent_context=agent_context_for(step.agent.name))
+            return agent_kwargs
+
+        async def draft(step: PipelineStep) -> tuple:
+            started_at = time.time()
+            with tracer.span("pipeline.draft", step=step.name):
+                output = await step.agent.draft_reply(message, context, client_id, **kwargs_for(step))
+            return output, started_at, time.time()
+
+        async def run_step(step: PipelineStep) -> StepResult:
+            with tracer.span("pipeline.step", step=step.name, agent=step.agent.name) as span:
+                draft_task = None
+                if step.speculative and step.depends_on:
+                    draft_task = asyncio.create_task(draft(step))
+                    # A discarded draft's error is not interesting
+                    draft_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                try:
+                    result = await finish_step(step, draft_task)
+                finally:
+                    if draft_task and not draft_task.done():
+                        draft_task.cancel()
+                if span is not None and not result.ok:
+                    span.set_error(result.error)
+                return result
+
+        async def finish_step(step: PipelineStep, draft_task: Optional[asyncio.Task]) -> StepResult:
+            upstream = [(self.graph.steps[dep], await tasks[dep]) for dep in step.depends_on]
+            failed = [result.name for _, result in upstream if not result.ok]
+            if failed:
+                if draft_task:
+                    draft_task.cancel()
+                    self.speculation_stats.record_discarded(step.name)
+                result = StepResult(step.name, error=RuntimeError(f"Skipped because {', '.join(failed)} failed"))
+            else:
+                started_at = upstream_ready_at = time.time()
+                speculation = {}
+                draft_kwargs = {}
+                if draft_task:
+                    try:
+                        output, started_at, draft_finished_at = await draft_task
+                        draft_kwargs = {
+                            "draft": output,
+                            "refine_draft": step.speculative == SPECULATE_REFINE,
+                            "speculation": speculation,
+                        }
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.warning("Speculative draft for {} failed, running normally: {}", step.name, e)
+                        self.speculation_stats.record_draft_error(step.name)
+                        started_at = upstream_ready_at
+                try:
+                    output = await step.agent.process_message(
+                        message,
+                        context,
+                        client_id,
+                        previous_agent_response=self.format_inputs(upstream),
+                        **kwargs_for(step),
+                        **draft_kwargs
+                    )
+                    result = StepResult(step.name, output=output, started_at=started_at, finished_at=time.time())
+                    if draft_kwargs:
+                        # Without speculation the step would have started when
+                        # its inputs were ready and taken about as long as the draft
+                        expected_finish = upstream_ready_at + (draft_finished_at - started_at)
+                        self.speculation_stats.record(
+                            step.name,
+                            speculation.get("accepted", False),
+                            expected_finish - result.finished_at
+                        )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error("Pipeline step {} failed: {}", step.name, e)
+                    result = StepResult(step.name, error=e, started_at=started_at, finished_at=time.time())
+
+            if result.started_at is not None:
+                PIPELINE_STEP_SECONDS.labels(step.name).observe(result.duration)
+            if on_step_complete:
+                try:
+                    await on_step_complete(step, result)
+                except Exception as e:
+                    logger.error("Pipeline callback for {} failed: {}", step.name, e)
+            return result
+
+        for name in self.graph.order:
+            tasks[name] = asyncio.create_task(run_step(self.graph.steps[name]))
+
+        try:
+            results = await asyncio.gather(*tasks.values())
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return {result.name: result for result in results}
@@ -0,0 +1,78 @@
+from typing import Dict, Any, List, Optional
+import asyncio
+import time
+from loguru import logger
+from .metrics import STARTUP_SECONDS, WARM_UP_SECONDS, READY
+
+WARM_UP_PENDING = "pending"
+WARM_UP_RUNNING = "running"
+WARM_UP_READY = "ready"
+WARM_UP_FAILED = "failed"
+
+class Readiness:
+    """Startup timing and the state of the background agent warm-up.
+
+    The app serves requests as soon as it starts; the agents' model clients
+    are built by ``warm_up`` afterwards, or on first use if a message
+    arrives before that. Liveness (/health) does not wait for the warm-up,
+    readiness (/ready) does. A failed warm-up is reported but not retried:
+    the agents try again on first use.
+    """
+
+    def __init__(self, import_started: float):
+        # time.perf_counter() when the app module started importing
+        self.import_started = import_started
+        self.state = WARM_UP_PENDING
+        self.startup_seconds: Optional[float] = None
+        self.warm_up_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.agents: Dict[str, str] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == WARM_UP_READY
+
+    def mark_started(self):
+        """Record the time to start serving."""
+        self.startup_seconds = time.perf_counter() - self.import_started
+        STARTUP_SECONDS.set(self.startup_seconds)
+        logger.info("Started in {:.2f}s", self.startup_seconds)
+
+    def start_warm_up(self, agents: List[Any]) -> asyncio.Task:
+        self.task = asyncio.create_task(self.warm_up(agents))
+        return self.task
+
+    async def warm_up(self, agents: List[Any]):
+        """Build each agent's model clients in a thread, off the event loop."""
+        self.state = WARM_UP_RUNNING
+        self.agents = {agent.name: WARM_UP_PENDING for agent in agents}
+        started = time.perf_counter()
+        for agent in agents:
+            try:
+                await asyncio.to_thread(agent.warm_up)
+                self.agents[agent.name] = WARM_UP_READY
+            except Exception as e:
+                self.agents[agent.name] = WARM_UP_FAILED
+                self.error = f"{agent.name}: {e}"
+                logger.error("Warm-up of agent {} failed: {}", agent.name, e)
+        self.warm_up_seconds = time.perf_counter() - started
+        WARM_UP_SECONDS.set(self.warm_up_seconds)
+        self.state = WARM_UP_FAILED if self.error else WARM_UP_READY
+        READY.set(1 if self.ready else 0)
+        logger.info("Agent warm-up {} in {:.2f}s", self.state, self.warm_up_seconds)
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warm_up": self.state,
+            "agents": dict(self.agents),
+            "error": self.error,
+            "startup_seconds": self.startup_seconds,
+            "warm_up_seconds": self.warm_up_seconds,
+        }
@@ -0,0 +1,186 @@
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from loguru import logger
+
+class CacheBackend:
+    """Storage interface for cached responses."""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: float):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """In-memory LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: float):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend(CacheBackend):
+    """On-disk cache backed by a sqlite file.
+
+    Calls are blocking; ResponseCache runs them in a worker thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, time.time() + ttl)
+            )
+            self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+class ResponseCache:
+    """Caches LLM replies keyed on the agent, its prompt and model config.
+
+    Lookups go to the in-memory LRU first and then to the optional disk
+    backend; disk hits are promoted into memory.
+    """
+
+    def __init__(self, memory: MemoryCacheBackend = None, disk: CacheBackend = None, ttl: float = 3600):
+        self.memory = memory or MemoryCacheBackend()
+        self.disk = disk
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(content: Any) -> Any:
+        if isinstance(content, str):
+            return re.sub(r"\s+", " ", content).strip()
+        return content
+
+    @classmethod
+    def make_key(cls, agent_name: str, system_message: str, messages: List[Dict[str, Any]], llm_config: Dict[str, Any]) -> str:
+        payload = {
+            "agent": agent_name,
+            "system": cls._normalize(system_message),
+            "messages": [
+                {"role": message.get("role"), "content": cls._normalize(message.get("content"))}
+                for message in messages
+            ],
+            "llm_config": llm_config,
+        }
+        encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                logger.error("Response cache disk lookup failed: {}", e)
+            if value is not None:
+                self.memory.set(key, value, self.ttl)
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        self.memory.set(key, value, self.ttl)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, self.ttl)
+            except Exception as e:
+                logger.error("Response cache disk write failed: {}", e)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+            "ttl": self.ttl,
+        }
+
+    @classmethod
+    def from_config(cls, config) -> Optional["ResponseCache"]:
+        """Build the cache described by ``config``, or None if it is disabled."""
+        if not config.RESPONSE_CACHE_ENABLED:
+            return None
+        disk = SQLiteCacheBackend(config.RESPONSE_CACHE_PATH) if config.RESPONSE_CACHE_PATH else None
+        return cls(MemoryCacheBackend(config.RESPONSE_CACHE_MAX_ENTRIES), disk, config.RESPONSE_CACHE_TTL)
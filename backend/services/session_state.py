@@ -1,80 +1,508 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Iterator, Callable
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+import asyncio
+import sys
 import time
 from loguru import logger
+from agents.agent_context import AgentContext, AgentContextPool
+from services.session_store import SQLiteSessionStore
+from services.metrics import SESSIONS_EXPIRED, SESSION_CLEANUP_SECONDS
+
+class ContentStore:
+    """Interns long message bodies so identical responses are stored once.
+    
+    ``intern`` returns the canonical string for a body and counts a
+    reference to it; ``release`` drops the reference again. Short strings
+    are returned as they are.
+    """
+    
+    def __init__(self, min_length: int = 64):
+        self.min_length = min_length
+        self._bodies: Dict[str, List] = {}  # body -> [canonical body, refcount]
+        self.dedup_hits = 0
+    
+    def intern(self, content: Optional[str]) -> Optional[str]:
+        if not isinstance(content, str) or len(content) < self.min_length:
+            return content
+        entry = self._bodies.get(content)
+        if entry is None:
+            self._bodies[content] = [content, 1]
+            return content
+        entry[1] += 1
+        self.dedup_hits += 1
+        return entry[0]
+    
+    def release(self, content: Optional[str]):
+        if not isinstance(content, str) or len(content) < self.min_length:
+            return
+        entry = self._bodies.get(content)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._bodies[content]
+    
+    def is_interned(self, content: Optional[str]) -> bool:
+        return isinstance(content, str) and len(content) >= self.min_length and content in self._bodies
+    
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "bodies": len(self._bodies),
+            "bytes": sum(sys.getsizeof(entry[0]) for entry in self._bodies.values()),
+            "dedup_hits": self.dedup_hits,
+        }
+
+class ConversationRecord:
+    __slots__ = ("role", "content", "timestamp")
+    
+    def __init__(self, role: str, content: str, timestamp: float):
+        self.role = role
+        self.content = content
+        self.timestamp = timestamp
+    
+    def bodies(self):
+        return (self.content,)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+    
+    def to_payload(self) -> Dict[str, Any]:
+        return self.to_dict()
+    
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], content_store: ContentStore) -> "ConversationRecord":
+        return cls(payload["role"], content_store.intern(payload["content"]), payload["timestamp"])
+
+class TraceRecord:
+    __slots__ = ("agent", "content", "timestamp")
+    
+    def __init__(self, agent: str, content: str, timestamp: float):
+        self.agent = agent
+        self.content = content
+        self.timestamp = timestamp
+    
+    def bodies(self):
+        return (self.content,)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {"agent": self.agent, "content": self.content, "timestamp": self.timestamp}
+    
+    def to_payload(self) -> Dict[str, Any]:
+        return self.to_dict()
+    
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], content_store: ContentStore) -> "TraceRecord":
+        return cls(payload["agent"], content_store.intern(payload["content"]), payload["timestamp"])
+
+class CommRecord:
+    """Internal communication. ``body`` refers to a stored agent response
+    instead of copying it into ``content``."""
+    
+    __slots__ = ("from_agent", "to_agent", "content", "body", "timestamp")
+    
+    def __init__(self, from_agent: str, to_agent: str, content: str, body: Optional[str], timestamp: float):
+        self.from_agent = from_agent
+        self.to_agent = to_agent
+        self.content = content
+        self.body = body
+        self.timestamp = timestamp
+    
+    def bodies(self):
+        return (self.content, self.body)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        content = self.content if self.body is None else f"{self.content}{self.body}"
+        return {"from": self.from_agent, "to": self.to_agent, "content": content, "timestamp": self.timestamp}
+    
+    def to_payload(self) -> Dict[str, Any]:
+        return {"from": self.from_agent, "to": self.to_agent, "content": self.content,
+                "body": self.body, "timestamp": self.timestamp}
+    
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any], content_store: ContentStore) -> "CommRecord":
+        return cls(payload["from"], payload["to"], content_store.intern(payload["content"]),
+                   content_store.intern(payload.get("body")), payload["timestamp"])
+
+class RecordBuffer:
+    """Ring buffer of session records that releases interned bodies on eviction."""
+    
+    def __init__(self, maxlen: int, content_store: ContentStore):
+        self._records = deque(maxlen=maxlen)
+        self._content_store = content_store
+    
+    def append(self, record):
+        if self._records.maxlen is not None and len(self._records) == self._records.maxlen:
+            self._release(self._records[0])
+        self._records.append(record)
+    
+    def clear(self):
+        for record in self._records:
+            self._release(record)
+        self._records.clear()
+    
+    def _release(self, record):
+        for body in record.bodies():
+            self._content_store.release(body)
+    
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [record.to_dict() for record in self._records]
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Bytes held by this buffer alone and bytes shared through the content store."""
+        own = sys.getsizeof(self._records)
+        shared = 0
+        for record in self._records:
+            own += sys.getsizeof(record)
+            for body in record.bodies():
+                if body is None:
+                    continue
+                if self._content_store.is_interned(body):
+                    shared += sys.getsizeof(body)
+                else:
+                    own += sys.getsizeof(body)
+        return {"own": own, "shared": shared}
+    
+    def __len__(self) -> int:
+        return len(self._records)
+    
+    def __iter__(self) -> Iterator:
+        return iter(self._records)
 
 class SessionState:
-    def __init__(self, session_id: str):
+    def __init__(self, session_id: str, context_pool: AgentContextPool = None, content_store: ContentStore = None,
+                 max_conversation: int = 200, max_traces: int = 200, max_internal_comms: int = 200):
         self.session_id = session_id
         self.created_at = time.time()
         self.last_accessed = time.time()
-        self.conversation_history: List[Dict[str, Any]] = []
-        self.agent_traces: List[Dict[str, Any]] = []
-        self.internal_comms: List[Dict[str, Any]] = []
+        self._content_store = content_store or ContentStore()
+        self.conversation_history = RecordBuffer(max_conversation, self._content_store)
+        self.agent_traces = RecordBuffer(max_traces, self._content_store)
+        self.internal_comms = RecordBuffer(max_internal_comms, self._content_store)
         self.context: Dict[str, Any] = {}
+        self.agent_contexts: Dict[str, AgentContext] = {}
+        self._context_pool = context_pool
+        # Turns, requests and jobs using the session (see SessionManager.hold);
+        # removing it is deferred until the last one is done
+        self.holders = 0
+        self.unload_when_idle = False
+        # Set by SessionManager to keep its expiry index in order and to
+        # persist new records
+        self._on_access: Optional[Callable[["SessionState"], None]] = None
+        self._on_record: Optional[Callable[["SessionState", str, Dict[str, Any]], None]] = None
     
     def update_last_accessed(self):
         self.last_accessed = time.time()
+        if self._on_access:
+            self._on_access(self)
     
-    def add_conversation_message(self, role: str, content: str):
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": time.time()
-        })
+    def _record(self, stream: str, buffer: RecordBuffer, record):
+        buffer.append(record)
+        if self._on_record:
+            self._on_record(self, stream, record.to_payload())
         self.update_last_accessed()
     
+    def add_conversation_message(self, role: str, content: str):
+        self._record("conversation", self.conversation_history,
+                     ConversationRecord(role, self._content_store.intern(content), time.time()))
+    
     def add_agent_trace(self, agent_name: str, content: str):
-        self.agent_traces.append({
-            "agent": agent_name,
-            "content": content,
-            "timestamp": time.time()
-        })
-        self.update_last_accessed()
+        self._record("trace", self.agent_traces,
+                     TraceRecord(agent_name, self._content_store.intern(content), time.time()))
     
-    def add_internal_comm(self, from_agent: str, to_agent: str, content: str):
-        self.internal_comms.append({
-            "from": from_agent,
-            "to": to_agent,
-            "content": content,
-            "timestamp": time.time()
-        })
-        self.update_last_accessed()
+    def add_internal_comm(self, from_agent: str, to_agent: str, content: str, body: str = None):
+        """Record an internal communication.
+        
+        Pass an agent response that the message quotes as ``body`` (with
+        ``content`` as the text before it) so it is stored only once.
+        """
+        self._record("comm", self.internal_comms, CommRecord(
+            from_agent,
+            to_agent,
+            self._content_store.intern(content),
+            self._content_store.intern(body),
+            time.time()
+        ))
     
     def update_context(self, key: str, value: Any):
         self.context[key] = value
+        if self._on_record:
+            self._on_record(self, "context", {"key": key, "value": value})
         self.update_last_accessed()
     
+    def restore(self, created_at: float, last_accessed: float, events: Dict[str, List[Dict[str, Any]]]):
+        """Rebuild the session from persisted events without persisting them again."""
+        self.created_at = created_at
+        self.last_accessed = last_accessed
+        for payload in events.get("conversation", []):
+            self.conversation_history.append(ConversationRecord.from_payload(payload, self._content_store))
+        for payload in events.get("trace", []):
+            self.agent_traces.append(TraceRecord.from_payload(payload, self._content_store))
+        for payload in events.get("comm", []):
+            self.internal_comms.append(CommRecord.from_payload(payload, self._content_store))
+        for payload in events.get("context", []):
+            self.context[payload["key"]] = payload["value"]
+        for payload in events.get("agent_contexts", []):
+            for agent_name, saved in payload.items():
+                self.get_agent_context(agent_name).restore(saved)
+    
+    def agent_contexts_payload(self) -> Dict[str, Any]:
+        """Snapshot of the agents' conversations, for ``restore``."""
+        return {agent_name: agent_context.to_payload() for agent_name, agent_context in self.agent_contexts.items()}
+    
     def get_context(self, key: str, default: Any = None) -> Any:
         return self.context.get(key, default)
+    
+    def get_agent_context(self, agent_name: str) -> AgentContext:
+        """Get this session's conversation state for an agent."""
+        agent_context = self.agent_contexts.get(agent_name)
+        if agent_context is None:
+            if self._context_pool:
+                agent_context = self._context_pool.acquire(agent_name)
+            else:
+                agent_context = AgentContext(agent_name)
+            self.agent_contexts[agent_name] = agent_context
+        return agent_context
+    
+    def clear_agent_histories(self):
+        for agent_context in self.agent_contexts.values():
+            agent_context.clear()
+    
+    def release_agent_contexts(self):
+        """Hand the agent contexts back to the pool once the session is gone."""
+        if self._context_pool:
+            for agent_context in self.agent_contexts.values():
+                self._context_pool.release(agent_context)
+        self.agent_contexts = {}
+    
+    def release(self):
+        """Free everything the session holds in shared stores and pools."""
+        self.conversation_history.clear()
+        self.agent_traces.clear()
+        self.internal_comms.clear()
+        self.release_agent_contexts()
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Approximate memory held by the session, in bytes."""
+        streams = {
+            "conversation_history": self.conversation_history.memory_usage(),
+            "agent_traces": self.agent_traces.memory_usage(),
+            "internal_comms": self.internal_comms.memory_usage(),
+        }
+        agent_history = sum(
+            sys.getsizeof(msg.get("content") or "")
+            for agent_context in self.agent_contexts.values()
+            for msg in agent_context.message_history
+        )
+        return {
+            "session_id": self.session_id,
+            "records": {
+                "conversation_history": len(self.conversation_history),
+                "agent_traces": len(self.agent_traces),
+                "internal_comms": len(self.internal_comms),
+            },
+            "own_bytes": sum(usage["own"] for usage in streams.values()) + agent_history,
+            "shared_bytes": sum(usage["shared"] for usage in streams.values()),
+            "agent_history_bytes": agent_history,
+        }
 
 class SessionManager:
-    def __init__(self, timeout: int = 3600):
-        self.sessions: Dict[str, SessionState] = {}
+    def __init__(self, timeout: int = 3600, max_conversation: int = 200, max_traces: int = 200,
+                 max_internal_comms: int = 200, intern_min_length: int = 64,
+                 store: SQLiteSessionStore = None, retention: float = 7 * 24 * 3600):
+        # Ordered by last access, least recently used first, so expiry only
+        # has to look at the front
+        self.sessions: "OrderedDict[str, SessionState]" = OrderedDict()
         self.timeout = timeout
+        self.expired_total = 0
+        self.last_cleanup_duration = 0.0
+        # With a store, sessions survive eviction from memory and restarts;
+        # they are loaded again on first access and purged after ``retention``
+        self.store = store
+        self.retention = retention
+        self.sessions_loaded = 0
+        self.context_pool = AgentContextPool()
+        # Shared by all sessions, so the same response is stored once process-wide
+        self.content_store = ContentStore(intern_min_length)
+        self.buffer_sizes = {
+            "max_conversation": max_conversation,
+            "max_traces": max_traces,
+            "max_internal_comms": max_internal_comms,
+        }
     
     def create_session(self, session_id: str) -> SessionState:
         if session_id in self.sessions:
             return self.sessions[session_id]
         
-        session = SessionState(session_id)
+        session = self._new_session(session_id)
         self.sessions[session_id] = session
         return session
     
+    def _new_session(self, session_id: str) -> SessionState:
+        session = SessionState(session_id, self.context_pool, self.content_store, **self.buffer_sizes)
+        session._on_access = self._touch
+        if self.store:
+            session._on_record = self._persist
+        return session
+    
     def get_session(self, session_id: str) -> SessionState:
+        """Get a session that is in memory. Use ``load_session`` to also check the store."""
         return self.sessions.get(session_id)
     
-    def cleanup_expired_sessions(self):
-        current_time = time.time()
-        expired_sessions = [
-            session_id for session_id, session in self.sessions.items()
-            if current_time - session.last_accessed > self.timeout
-        ]
+    async def load_session(self, session_id: str) -> Optional[SessionState]:
+        """Get a session from memory, or load it from the store without blocking the loop."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            # Wanted again: keep it in memory after its current holders are done
+            session.unload_when_idle = False
+            return session
+        if not self.store:
+            return None
         
-        for session_id in expired_sessions:
-            del self.sessions[session_id]
-            logger.info(f"Cleaned up expired session: {session_id}")
+        limits = {
+            "conversation": self.buffer_sizes["max_conversation"],
+            "trace": self.buffer_sizes["max_traces"],
+            "comm": self.buffer_sizes["max_internal_comms"],
+            "context": 10000,
+            "agent_contexts": 1,
+        }
+        data = await asyncio.to_thread(self.store.load, session_id, limits)
+        if session_id in self.sessions:
+            # Created by someone else while we were reading
+            return self.sessions[session_id]
+        if data is None:
+            return None
+        
+        session = self._new_session(session_id)
+        session.restore(data["created_at"], data["last_accessed"], data["events"])
+        self.sessions[session_id] = session
+        session.update_last_accessed()
+        self.sessions_loaded += 1
+        logger.info("Loaded session {} from store", session_id)
+        return session
+    
+    async def get_or_create_session(self, session_id: str) -> SessionState:
+        session = await self.load_session(session_id)
+        if session is None:
+            session = self.create_session(session_id)
+        return session
+    
+    @contextmanager
+    def hold(self, session: SessionState) -> Iterator[SessionState]:
+        """Keep ``session`` in memory while a turn, request or job uses it.
+        
+        Removing or expiring a held session waits until its last holder is
+        done, so its agent contexts are not recycled while a model call is
+        still writing to them.
+        """
+        session.holders += 1
+        try:
+            yield session
+        finally:
+            session.holders -= 1
+            if (not session.holders and session.unload_when_idle
+                    and self.sessions.get(session.session_id) is session):
+                self._unload(session.session_id)
+                logger.info("Removed session: {}", session.session_id)
+    
+    def _touch(self, session: SessionState):
+        if self.sessions.get(session.session_id) is session:
+            self.sessions.move_to_end(session.session_id)
+        if self.store:
+            self.store.touch(session.session_id, session.created_at, session.last_accessed)
+    
+    def _persist(self, session: SessionState, stream: str, payload: Dict[str, Any]):
+        self.store.append(session.session_id, stream, payload)
+    
+    def _unload(self, session_id: str):
+        """Drop a session from memory, saving its agents' conversations to the store first.
+        
+        Agent histories change in place on every model call, so they are
+        saved as one snapshot when the session leaves memory rather than
+        record by record.
+        """
+        session = self.sessions.pop(session_id)
+        session.unload_when_idle = False
+        if self.store and session.agent_contexts:
+            self.store.replace(session_id, "agent_contexts", session.agent_contexts_payload())
+            self.store.touch(session_id, session.created_at, session.last_accessed)
+        session.release()
+    
+    def cleanup_expired_sessions(self, is_active: Callable[[str], bool] = None) -> int:
+        """Remove sessions idle for longer than the timeout from memory.
+        
+        With a store they remain on disk until the retention period ends.
+        Only the expired prefix of the access-ordered index is visited.
+        Held sessions and those for which ``is_active`` returns True (e.g.
+        with an open WebSocket) are refreshed instead of removed.
+        """
+        started_at = time.monotonic()
+        expires_before = time.time() - self.timeout
+        expired = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_accessed >= expires_before:
+                break
+            if session.holders or (is_active and is_active(session_id)):
+                session.update_last_accessed()
+                continue
+            self._unload(session_id)
+            expired += 1
+            logger.info("Cleaned up expired session: {}", session_id)
+        
+        if self.store:
+            self.store.purge(time.time() - self.retention)
+        self.expired_total += expired
+        self.last_cleanup_duration = time.monotonic() - started_at
+        SESSIONS_EXPIRED.inc(expired)
+        SESSION_CLEANUP_SECONDS.observe(self.last_cleanup_duration)
+        return expired
+    
+    async def run_expiry(self, interval: float, is_active: Callable[[str], bool] = None):
+        """Background task that expires idle sessions every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                expired = self.cleanup_expired_sessions(is_active)
+                if expired:
+                    logger.info("Expired {} idle sessions, {} remaining", expired, len(self.sessions))
+            except Exception as e:
+                logger.error("Error expiring sessions: {}", e)
     
     def remove_session(self, session_id: str):
-        if session_id in self.sessions:
-            del self.sessions[session_id]
-            logger.info(f"Removed session: {session_id}") 
\ No newline at end of file
+        """Drop a session from memory; a persisted copy stays in the store.
+        
+        A held session is dropped once its last holder is done.
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            return
+        if session.holders:
+            session.unload_when_idle = True
+            return
+        self._unload(session_id)
+        logger.info("Removed session: {}", session_id)
+    
+    def get_stats(self, top: int = 50) -> Dict[str, Any]:
+        """Memory statistics; per-session details for the ``top`` largest sessions."""
+        usages = [session.memory_usage() for session in self.sessions.values()]
+        usages.sort(key=lambda usage: usage["own_bytes"], reverse=True)
+        return {
+            "sessions": len(self.sessions),
+            "expired_total": self.expired_total,
+            "sessions_loaded": self.sessions_loaded,
+            "store": self.store.get_stats() if self.store else None,
+            "last_cleanup_duration": self.last_cleanup_duration,
+            "own_bytes": sum(usage["own_bytes"] for usage in usages),
+            "content_store": self.content_store.get_stats(),
+            "context_pool": self.context_pool.get_stats(),
+            "buffer_sizes": self.buffer_sizes,
+            "largest_sessions": usages[:top],
+        }
+    
+    def close(self):
+        """Save the sessions still in memory, then flush and close the store."""
+        if self.store:
+            for session_id in list(self.sessions):
+                self._unload(session_id)
+            self.store.close()
@@ -0,0 +1,214 @@
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import queue
+import sqlite3
+import threading
+import time
+from loguru import logger
+
+class SQLiteSessionStore:
+    """Append-only session log in a sqlite database in WAL mode.
+
+    Writes are queued and committed by a background thread in batches
+    (group commit), so recording a message never waits for the disk. They
+    are applied in the order they were queued. Reads are blocking and
+    meant to be run in a worker thread; a read of a session with writes
+    still queued waits for them to be committed.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        # Queued, not yet committed writes per session
+        self._pending: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self.batches_written = 0
+        self.events_written = 0
+        self.write_errors = 0
+
+        conn = self._connect()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS session_events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " session_id TEXT NOT NULL,"
+            " stream TEXT NOT NULL,"
+            " payload TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS session_events_by_session ON session_events (session_id, stream, id);"
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " last_accessed REAL NOT NULL);"
+        )
+        conn.commit()
+        self._read_conn = conn
+        self._writer = threading.Thread(target=self._write_loop, name="session-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Writes, queued for the writer thread
+
+    def append(self, session_id: str, stream: str, payload: Dict[str, Any]):
+        self._put_for(session_id, ("append", session_id, stream, json.dumps(payload, default=str)))
+
+    def replace(self, session_id: str, stream: str, payload: Dict[str, Any]):
+        """Store ``payload`` as the only event of the session's ``stream``, for snapshots."""
+        self._put_for(session_id, ("replace", session_id, stream, json.dumps(payload, default=str)))
+
+    def touch(self, session_id: str, created_at: float, last_accessed: float):
+        self._put_for(session_id, ("touch", session_id, created_at, last_accessed))
+
+    def purge(self, older_than: float):
+        """Delete sessions last accessed before ``older_than``."""
+        self._queue.put(("purge", older_than))
+
+    def flush(self):
+        """Wait until every write queued so far is committed."""
+        if not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait()
+
+    def _put_for(self, session_id: str, op: Tuple):
+        with self._pending_lock:
+            self._pending[session_id] = self._pending.get(session_id, 0) + 1
+        self._queue.put(op)
+
+    def _committed(self, batch: List[Tuple]):
+        with self._pending_lock:
+            for op in batch:
+                if op[0] in ("append", "replace", "touch"):
+                    remaining = self._pending[op[1]] - 1
+                    if remaining:
+                        self._pending[op[1]] = remaining
+                    else:
+                        del self._pending[op[1]]
+
+    def has_pending_writes(self, session_id: str) -> bool:
+        with self._pending_lock:
+            return session_id in self._pending
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # Flushing or closing ends the batch, so the caller is not kept waiting
+            while len(batch) < self.batch_size and not self._ends_batch(batch[-1]):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            stop = any(op is self._STOP for op in batch)
+            batch = [op for op in batch if op is not self._STOP]
+            try:
+                self._write_batch(conn, batch)
+            except Exception as e:
+                self.write_errors += 1
+                logger.error("Error writing session batch: {}", e)
+            finally:
+                self._committed(batch)
+                for op in batch:
+                    if op[0] == "flush":
+                        op[1].set()
+            if stop:
+                conn.close()
+                return
+
+    def _ends_batch(self, op) -> bool:
+        return op is self._STOP or op[0] == "flush"
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Tuple]):
+        if not any(op[0] != "flush" for op in batch):
+            return
+        # Only the latest access time per session is written, but always
+        # before a later purge so that it sees them
+        touches: Dict[str, Tuple[float, float]] = {}
+
+        def write_touches():
+            conn.executemany(
+                "INSERT INTO sessions (session_id, created_at, last_accessed) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_accessed = excluded.last_accessed",
+                [(session_id, created_at, last_accessed) for session_id, (created_at, last_accessed) in touches.items()]
+            )
+            touches.clear()
+
+        with conn:
+            for op in batch:
+                if op[0] == "append":
+                    conn.execute(
+                        "INSERT INTO session_events (session_id, stream, payload) VALUES (?, ?, ?)",
+                        op[1:]
+                    )
+                    self.events_written += 1
+                elif op[0] == "replace":
+                    conn.execute("DELETE FROM session_events WHERE session_id = ? AND stream = ?", op[1:3])
+                    conn.execute(
+                        "INSERT INTO session_events (session_id, stream, payload) VALUES (?, ?, ?)",
+                        op[1:]
+                    )
+                    self.events_written += 1
+                elif op[0] == "touch":
+                    touches[op[1]] = op[2:]
+                elif op[0] == "purge":
+                    write_touches()
+                    conn.execute(
+                        "DELETE FROM session_events WHERE session_id IN "
+                        "(SELECT session_id FROM sessions WHERE last_accessed < ?)",
+                        (op[1],)
+                    )
+                    conn.execute("DELETE FROM sessions WHERE last_accessed < ?", (op[1],))
+            write_touches()
+        self.batches_written += 1
+
+    # Reads, blocking
+
+    def load(self, session_id: str, limits: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        """Return the session's metadata and its latest events per stream, oldest first."""
+        if self.has_pending_writes(session_id):
+            self.flush()
+        with self._read_lock:
+            row = self._read_conn.execute(
+                "SELECT created_at, last_accessed FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            events = {}
+            for stream, limit in limits.items():
+                rows = self._read_conn.execute(
+                    "SELECT payload FROM session_events WHERE session_id = ? AND stream = ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (session_id, stream, limit)
+                ).fetchall()
+                events[stream] = [json.loads(payload) for (payload,) in reversed(rows)]
+        return {"created_at": row[0], "last_accessed": row[1], "events": events}
+
+    def close(self):
+        """Flush pending writes and stop the writer thread."""
+        self._queue.put(self._STOP)
+        self._writer.join()
+        with self._read_lock:
+            self._read_conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending_writes": self._queue.qsize(),
+            "batches_written": self.batches_written,
+            "events_written": self.events_written,
+            "write_errors": self.write_errors,
+        }
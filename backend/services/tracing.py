@@ -0,0 +1,257 @@
+from typing import Dict, Any, List, Optional, Iterator, TextIO
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from loguru import logger
+
+# The active span of the current task. asyncio copies the context into new
+# tasks, so spans opened in pipeline steps nest under the turn's span.
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "_tracer")
+
+    def __init__(self, tracer: "Tracer", name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self._tracer = tracer
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        self._tracer._export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,  # internal
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+class JsonLinesSpanExporter:
+    """Writes finished spans as OTLP/JSON ``ExportTraceServiceRequest`` lines.
+
+    Spans are handed to a background thread and written in batches, to a
+    file or to stdout when no path is given. The output can be replayed
+    into an OpenTelemetry collector.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str = None, service_name: str = "multi-agent-backend",
+                 batch_size: int = 512, flush_interval: float = 1.0):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue()
+        self.exported = 0
+        self._writer = threading.Thread(target=self._write_loop, name="span-exporter", daemon=True)
+        self._writer.start()
+
+    def export(self, span: Span):
+        self._queue.put(span)
+
+    def _write_loop(self):
+        stream: TextIO = open(self.path, "a", encoding="utf-8") if self.path else sys.stdout
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                stop = any(span is self._STOP for span in batch)
+                spans = [span for span in batch if span is not self._STOP]
+                if spans:
+                    try:
+                        stream.write(json.dumps(self._request(spans)) + "\n")
+                        stream.flush()
+                        self.exported += len(spans)
+                    except Exception as e:
+                        logger.error("Error exporting spans: {}", e)
+                if stop:
+                    return
+        finally:
+            if self.path:
+                stream.close()
+
+    def _request(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "backend"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }]
+        }
+
+    def close(self):
+        """Write pending spans and stop the writer thread."""
+        self._queue.put(self._STOP)
+        self._writer.join()
+
+class Tracer:
+    """Creates spans for sampled turns.
+
+    ``start_trace`` decides once per turn whether it is sampled; spans
+    opened inside an unsampled turn, or outside any turn, are not
+    created at all, so tracing costs next to nothing when it is off.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporter: JsonLinesSpanExporter = None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.sampled = 0
+        self.unsampled = 0
+
+    def configure(self, sample_rate: float, exporter: Optional[JsonLinesSpanExporter]):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    def current_span(self) -> Optional[Span]:
+        return _current_span.get()
+
+    @contextmanager
+    def start_trace(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Open the root span of a new trace, if this turn is sampled."""
+        if self.exporter is None or random.random() >= self.sample_rate:
+            self.unsampled += 1
+            # Keep spans of an unrelated outer trace from absorbing this turn
+            token = _current_span.set(None)
+            try:
+                yield None
+            finally:
+                _current_span.reset(token)
+            return
+        self.sampled += 1
+        with self._activate(Span(self, name, os.urandom(16).hex(), None, attributes)) as span:
+            yield span
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Optional[Span]]:
+        """Open a child of the current span; does nothing outside a sampled trace."""
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self._activate(Span(self, name, parent.trace_id, parent.span_id, attributes)) as span:
+            yield span
+
+    def start_span(self, name: str, **attributes) -> Optional[Span]:
+        """Create a child of the current span without making it current.
+
+        For work that finishes elsewhere, such as a frame sent later by a
+        connection's writer task. The caller must ``end`` it.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+    def inject(self) -> Optional[Dict[str, str]]:
+        """The current trace context, to send along with work handed to another worker."""
+        span = _current_span.get()
+        if span is None:
+            return None
+        return {"trace_id": span.trace_id, "span_id": span.span_id}
+
+    @contextmanager
+    def continue_trace(self, trace_context: Optional[Dict[str, str]]) -> Iterator[None]:
+        """Parent spans opened inside on a context from ``inject``, if there is one."""
+        if not trace_context or _current_span.get() is not None:
+            yield
+            return
+        # Stands in for the remote parent; it is never ended, so never exported
+        parent = Span(self, "remote", trace_context["trace_id"], None, {})
+        parent.span_id = trace_context["span_id"]
+        token = _current_span.set(parent)
+        try:
+            yield
+        finally:
+            _current_span.reset(token)
+
+    @contextmanager
+    def _activate(self, span: Span) -> Iterator[Span]:
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _export(self, span: Span):
+        if self.exporter is not None:
+            self.exporter.export(span)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+            self.exporter = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "sampled_traces": self.sampled,
+            "unsampled_traces": self.unsampled,
+            "exported_spans": self.exporter.exported if self.exporter else 0,
+        }
+
+# Shared by all modules; configured at startup from Config
+tracer = Tracer()
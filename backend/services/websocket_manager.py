@@ -1,49 +1,560 @@
 from fastapi import WebSocket
-from typing import Dict, List, Set
+from typing import Dict, List, Set, Optional, Tuple, Coroutine, Any, Callable, Awaitable, Deque
+from collections import deque
+import asyncio
 import json
 from loguru import logger
 import time
+from services.event_bus import EventBus
+from services.ws_protocol import FrameEncoder
+from services.metrics import WS_SEND_SECONDS, WS_QUEUE_DEPTH, WS_MESSAGES, WS_IDLE_DISCONNECTS
+from services.tracing import tracer, Span
+
+class DeltaCoalescer:
+    """Groups streamed text chunks into frames by size or time.
+    
+    The first chunk is released immediately so the client sees output as
+    early as possible; later chunks are held until the frame reaches
+    ``max_chars`` or ``max_delay`` seconds have passed since the last frame.
+    ``time_until_due`` tells the reader how long it may wait for the next
+    chunk before flushing what is buffered, so a pause in the stream does
+    not hold text back.
+    """
+    
+    def __init__(self, max_chars: int = 256, max_delay: float = 0.05):
+        self.max_chars = max_chars
+        self.max_delay = max_delay
+        self._buffer: List[str] = []
+        self._buffered_chars = 0
+        self._last_flush: Optional[float] = None
+    
+    def push(self, chunk: str) -> Optional[str]:
+        """Add a chunk and return a frame if one is due."""
+        self._buffer.append(chunk)
+        self._buffered_chars += len(chunk)
+        if (self._last_flush is None
+                or self._buffered_chars >= self.max_chars
+                or time.monotonic() - self._last_flush >= self.max_delay):
+            return self.flush()
+        return None
+    
+    def time_until_due(self) -> Optional[float]:
+        """Seconds until the buffered text is due, None if nothing is buffered."""
+        if not self._buffer:
+            return None
+        return max(0.0, self._last_flush + self.max_delay - time.monotonic())
+    
+    def flush(self) -> str:
+        """Return everything buffered so far."""
+        frame = "".join(self._buffer)
+        self._buffer = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        return frame
+
+OVERFLOW_DROP_OLDEST = "drop_oldest"
+OVERFLOW_COALESCE = "coalesce"
+OVERFLOW_DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE, OVERFLOW_DISCONNECT)
+
+# Frames that can be lost without corrupting what the client shows
+DROPPABLE_TYPES = ("agent_trace", "ping")
+
+class OutboundQueue:
+    """Bounded send queue for one WebSocket, drained by its own writer task.
+    
+    ``put`` never waits for the network. When the queue is full the
+    overflow policy decides what gives: the oldest trace frame is dropped,
+    the new frame is merged into a queued one of the same kind, or the
+    connection is treated as a slow consumer and closed. Policies fall back
+    to disconnecting when nothing can be dropped or merged.
+    
+    Frames queued during a sampled trace get a ``websocket.frame`` span
+    that ends when the frame is sent, dropped or merged.
+    """
+    
+    def __init__(self, websocket: WebSocket, maxsize: int = 256, policy: str = OVERFLOW_DROP_OLDEST,
+                 on_error: Callable[[], Awaitable[None]] = None,
+                 on_overflow: Callable[[], Awaitable[None]] = None, name: str = "websocket",
+                 encoder: FrameEncoder = None):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {policy}")
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.policy = policy
+        self.name = name
+        # Compact protocol encoder, None for one plain JSON frame per message
+        self.encoder = encoder
+        self._on_error = on_error
+        self._on_overflow = on_overflow
+        self._messages: Deque[Dict] = deque()
+        # Open frame spans, by id() of the queued message
+        self._spans: Dict[int, Span] = {}
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self._writer = asyncio.create_task(self._write_loop())
+    
+    def __len__(self) -> int:
+        return len(self._messages)
+    
+    def put(self, message: Dict) -> bool:
+        """Queue a message. Returns False if it was dropped or merged into another."""
+        if self.closed:
+            return False
+        span = tracer.start_span("websocket.frame", type=message.get("type", ""), connection=self.name)
+        if len(self._messages) >= self.maxsize:
+            if self.policy == OVERFLOW_COALESCE and self._coalesce(message):
+                self._end_span(span, "coalesced")
+                return False
+            if not self._make_room(message):
+                self._end_span(span, "dropped")
+                return False
+        WS_QUEUE_DEPTH.observe(len(self._messages))
+        self._messages.append(message)
+        if span is not None:
+            span.set_attribute("queue_depth", len(self._messages))
+            self._spans[id(message)] = span
+        self._ready.set()
+        return True
+    
+    @staticmethod
+    def _end_span(span: Optional[Span], outcome: str):
+        if span is not None:
+            span.set_attribute("outcome", outcome)
+            span.end()
+    
+    def _end_frame_span(self, message: Dict, outcome: str):
+        if self._spans:
+            self._end_span(self._spans.pop(id(message), None), outcome)
+    
+    def _make_room(self, message: Dict) -> bool:
+        """Apply the overflow policy. Returns True if ``message`` can now be queued."""
+        if self.policy != OVERFLOW_DISCONNECT:
+            for index, queued in enumerate(self._messages):
+                if queued.get("type") in DROPPABLE_TYPES:
+                    del self._messages[index]
+                    self._end_frame_span(queued, "dropped")
+                    self.dropped += 1
+                    return True
+            if message.get("type") in DROPPABLE_TYPES:
+                self.dropped += 1
+                return False
+            if self.policy == OVERFLOW_DROP_OLDEST and self._coalesce(message):
+                return False
+            if self._compact():
+                return True
+        logger.warning("Closing slow WebSocket {}: {} messages queued", self.name, len(self._messages))
+        self.close()
+        if self._on_overflow:
+            asyncio.create_task(self._on_overflow())
+        return False
+    
+    def _coalesce(self, message: Dict) -> bool:
+        """Merge ``message`` into the newest queued frame if it is of the same kind.
+        
+        Only the last queued frame is merged into: with no frame between
+        them, the merged frame can take the newest ``seq``, so a client
+        resuming after it is neither replayed what it already got nor
+        skips anything.
+        """
+        kind = message.get("type")
+        if kind not in ("agent_delta", "agent_trace") or not self._messages:
+            return False
+        queued = self._messages[-1]
+        if queued.get("type") != kind or queued.get("agent") != message.get("agent"):
+            return False
+        if kind == "agent_delta":
+            if queued.get("done"):
+                return False
+            merged = dict(message, content=queued["content"] + message["content"])
+            self._messages[-1] = merged
+            span = self._spans.pop(id(queued), None)
+            if span is not None:
+                self._spans[id(merged)] = span
+        else:
+            # A newer trace supersedes the queued one
+            self._messages[-1] = message
+            self._end_frame_span(queued, "coalesced")
+        self.coalesced += 1
+        return True
+    
+    def _compact(self) -> bool:
+        """Merge one queued delta into the delta queued right after it from the same agent.
+        
+        The later frame keeps its place and ``seq``; as nothing was queued
+        between the two, no frame overtakes content it followed.
+        """
+        for index in range(len(self._messages) - 1):
+            earlier, later = self._messages[index], self._messages[index + 1]
+            if (earlier.get("type") != "agent_delta" or later.get("type") != "agent_delta"
+                    or earlier.get("agent") != later.get("agent") or earlier.get("done")):
+                continue
+            merged = dict(later, content=earlier["content"] + later["content"])
+            self._messages[index + 1] = merged
+            span = self._spans.pop(id(later), None)
+            if span is not None:
+                self._spans[id(merged)] = span
+            del self._messages[index]
+            self._end_frame_span(earlier, "coalesced")
+            self.coalesced += 1
+            return True
+        return False
+    
+    async def _write_loop(self):
+        while True:
+            await self._ready.wait()
+            if self.encoder and self.encoder.batch_window:
+                # Let frames produced in the same burst share one envelope
+                await asyncio.sleep(self.encoder.batch_window)
+            while self._messages:
+                frames = []
+                try:
+                    started_at = time.monotonic()
+                    if self.encoder:
+                        frames = list(self._messages)
+                        self._messages.clear()
+                        payload = self.encoder.encode(frames)
+                        if self.encoder.binary:
+                            await self.websocket.send_bytes(payload)
+                        else:
+                            await self.websocket.send_text(payload)
+                    else:
+                        frames = [self._messages.popleft()]
+                        await self.websocket.send_json(frames[0])
+                    WS_SEND_SECONDS.observe(time.monotonic() - started_at)
+                    WS_MESSAGES.inc(len(frames))
+                    self.sent += len(frames)
+                    for frame in frames:
+                        self._end_frame_span(frame, "sent")
+                except Exception as e:
+                    logger.error("Error sending message to {}: {}", self.name, e)
+                    for frame in frames:
+                        self._end_frame_span(frame, "error")
+                    self.close()
+                    if self._on_error:
+                        await self._on_error()
+                    return
+            self._ready.clear()
+    
+    def close(self):
+        """Stop the writer; queued messages are discarded."""
+        self.closed = True
+        for span in self._spans.values():
+            self._end_span(span, "discarded")
+        self._spans.clear()
+        self._messages.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+class ReplayBuffer:
+    """Recent sequenced frames of one connection, for resuming after a reconnect."""
+    
+    __slots__ = ("frames", "last_seq")
+    
+    def __init__(self, maxlen: int = 512):
+        self.frames: Deque[Dict] = deque(maxlen=maxlen)
+        self.last_seq = 0
+    
+    def record(self, message: Dict) -> Dict:
+        """Return ``message`` stamped with the next sequence number and keep it."""
+        self.last_seq += 1
+        frame = dict(message)
+        frame["seq"] = self.last_seq
+        self.frames.append(frame)
+        return frame
+    
+    def since(self, seq: int) -> Tuple[List[Dict], bool]:
+        """Frames after ``seq``, and whether none were already evicted."""
+        missed = [frame for frame in self.frames if frame["seq"] > seq]
+        first_seq = self.frames[0]["seq"] if self.frames else self.last_seq + 1
+        return missed, seq >= first_seq - 1
 
 class WebSocketManager:
-    def __init__(self):
+    # Bus channel shared by all workers for messages to clients connected elsewhere
+    BUS_CHANNEL = "ws:deliver"
+    
+    def __init__(self, bus: EventBus = None, worker_id: str = "local",
+                 send_queue_size: int = 256, overflow_policy: str = OVERFLOW_DROP_OLDEST,
+                 protocol_options: Dict[str, Any] = None, replay_size: int = 512, resume_grace: float = 60):
         self.active_connections: Dict[str, WebSocket] = {}
         self.direct_agent_connections: Dict[str, Dict[str, WebSocket]] = {}
-        self.message_queue: List[Dict] = []
-        print("WebSocketManager initialized")
+        # Outbound queue and writer task for each (client_id, agent_id)
+        self.outbound: Dict[Tuple[str, Optional[str]], OutboundQueue] = {}
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = overflow_policy
+        # Settings for connections that opt into the compact protocol
+        self.protocol_options = protocol_options or {}
+        # Sequenced frames per client and agent connection. Entries outlive a
+        # dropped socket for ``resume_grace`` seconds so that a reconnecting
+        # client can resume, and its running turn is kept alive meanwhile.
+        self.replay: Dict[str, Dict[Optional[str], ReplayBuffer]] = {}
+        self.replay_size = replay_size
+        self.resume_grace = resume_grace
+        self.grace_timers: Dict[Tuple[str, Optional[str]], asyncio.TimerHandle] = {}
+        # Called with (client_id, agent_id) once a connection is gone for good
+        self.on_release: Optional[Callable[[str, Optional[str]], None]] = None
+        self.resumed = 0
+        self.replayed_frames = 0
+        self.slow_disconnects = 0
+        # The turn currently being processed for each (client_id, agent_id)
+        self.turn_tasks: Dict[Tuple[str, Optional[str]], asyncio.Task] = {}
+        # Monotonic time of the last message received on each connection
+        self.last_seen: Dict[Tuple[str, Optional[str]], float] = {}
+        self.idle_disconnects = 0
+        # Messages for clients not connected to this worker are published on
+        # the bus; every worker delivers those for its own connections
+        self.bus = bus
+        self.worker_id = worker_id
+        self.forwarded = 0
+        self.received = 0
+        if self.bus:
+            self.bus.subscribe(self.BUS_CHANNEL, self._on_bus_event)
+        logger.debug("WebSocketManager initialized for worker {}", worker_id)
     
     async def connect(self, websocket: WebSocket, client_id: str, agent_id: str = None):
-        print(f"Attempting to connect WebSocket for client {client_id}" + (f" and agent {agent_id}" if agent_id else ""))
         try:
             await websocket.accept()
-            print(f"WebSocket accepted for client {client_id}" + (f" and agent {agent_id}" if agent_id else ""))
+            self.mark_alive(client_id, agent_id)
+            # Clients opt into the compact protocol with ?protocol=compact
+            encoder = FrameEncoder.negotiate(websocket.query_params, **self.protocol_options)
+            if encoder:
+                await websocket.send_json(encoder.describe())
+            previous = self.outbound.pop((client_id, agent_id), None)
+            if previous is not None:
+                previous.close()
             
             if agent_id:
                 if client_id not in self.direct_agent_connections:
                     self.direct_agent_connections[client_id] = {}
                 self.direct_agent_connections[client_id][agent_id] = websocket
-                print(f"Client {client_id} connected to agent {agent_id}")
-                logger.info(f"Client {client_id} connected to agent {agent_id}")
+                logger.info("Client {} connected to agent {}", client_id, agent_id)
             else:
                 self.active_connections[client_id] = websocket
-                print(f"Client {client_id} connected")
-                logger.info(f"Client {client_id} connected")
+                logger.info("Client {} connected", client_id)
+            
+            await self._resume(websocket, client_id, agent_id, websocket.query_params.get("resume"), encoder)
+            if self._socket(client_id, agent_id) is websocket:
+                self._open_queue(websocket, client_id, agent_id, encoder)
         except Exception as e:
-            print(f"Error in WebSocket connect: {str(e)}")
-            logger.error(f"Error in WebSocket connect: {str(e)}")
+            logger.error("Error in WebSocket connect for client {}: {}", client_id, e)
             raise e
     
-    async def disconnect(self, client_id: str, agent_id: str = None):
-        print(f"Attempting to disconnect WebSocket for client {client_id}" + (f" and agent {agent_id}" if agent_id else ""))
+    async def disconnect(self, client_id: str, agent_id: str = None, websocket: WebSocket = None, grace: float = None):
+        """Drop a connection.
+        
+        The connection's running turn and replay buffer are kept for
+        ``grace`` seconds (default ``resume_grace``) so the client can
+        reconnect and resume; after that the turn is cancelled. Passing the
+        ``websocket`` makes the call a no-op if the client has already
+        reconnected on a new socket.
+        """
+        if websocket is not None and self._socket(client_id, agent_id) is not websocket:
+            return
+        self.last_seen.pop((client_id, agent_id), None)
+        queue = self.outbound.pop((client_id, agent_id), None)
+        if queue is not None:
+            queue.close()
         if agent_id:
             if client_id in self.direct_agent_connections and agent_id in self.direct_agent_connections[client_id]:
                 del self.direct_agent_connections[client_id][agent_id]
-                print(f"Client {client_id} disconnected from agent {agent_id}")
-                logger.info(f"Client {client_id} disconnected from agent {agent_id}")
+                if not self.direct_agent_connections[client_id]:
+                    del self.direct_agent_connections[client_id]
+                logger.info("Client {} disconnected from agent {}", client_id, agent_id)
         else:
             if client_id in self.active_connections:
                 del self.active_connections[client_id]
-                print(f"Client {client_id} disconnected")
-                logger.info(f"Client {client_id} disconnected")
+                logger.info("Client {} disconnected", client_id)
+        
+        grace = self.resume_grace if grace is None else grace
+        key = (client_id, agent_id)
+        if grace > 0 and agent_id in self.replay.get(client_id, {}):
+            previous = self.grace_timers.pop(key, None)
+            if previous:
+                previous.cancel()
+            self.grace_timers[key] = asyncio.get_running_loop().call_later(grace, self._release, client_id, agent_id)
+        else:
+            self._release(client_id, agent_id)
+    
+    def _release(self, client_id: str, agent_id: str = None):
+        """Forget a connection that did not come back in time."""
+        timer = self.grace_timers.pop((client_id, agent_id), None)
+        if timer:
+            timer.cancel()
+        # Nobody is left to receive the results, stop paying for them
+        self.cancel_turn(client_id, agent_id)
+        buffers = self.replay.get(client_id)
+        if buffers is not None:
+            buffers.pop(agent_id, None)
+            if not buffers:
+                del self.replay[client_id]
+        if self.on_release:
+            try:
+                self.on_release(client_id, agent_id)
+            except Exception as e:
+                logger.error("Error releasing client {}: {}", client_id, e)
+    
+    def _socket(self, client_id: str, agent_id: str = None) -> Optional[WebSocket]:
+        if agent_id:
+            return self.direct_agent_connections.get(client_id, {}).get(agent_id)
+        return self.active_connections.get(client_id)
+    
+    async def _resume(self, websocket: WebSocket, client_id: str, agent_id: str = None,
+                      last_seq: Optional[str] = None, encoder: FrameEncoder = None):
+        """Attach a new socket to the connection's replay buffer and resend missed frames.
+        
+        Missed frames are written straight to the socket before its
+        outbound queue opens, so a long replay cannot overflow the queue.
+        Frames recorded while the replay is written are sent the same way.
+        """
+        timer = self.grace_timers.pop((client_id, agent_id), None)
+        if timer:
+            timer.cancel()
+        buffers = self.replay.setdefault(client_id, {})
+        buffer = buffers.get(agent_id)
+        if buffer is None:
+            buffer = buffers[agent_id] = ReplayBuffer(self.replay_size)
+        if last_seq is None:
+            return
+        try:
+            last_seq = int(last_seq)
+        except ValueError:
+            return
+        
+        missed, complete = buffer.since(last_seq)
+        await self._send_now(websocket, encoder, [{
+            "type": "resume",
+            "last_seq": buffer.last_seq,
+            "replayed": len(missed),
+            # False when frames older than the buffer were missed too
+            "complete": complete,
+            "timestamp": time.time()
+        }])
+        replayed = 0
+        while missed:
+            await self._send_now(websocket, encoder, [dict(frame) for frame in missed])
+            replayed += len(missed)
+            missed, _ = buffer.since(missed[-1]["seq"])
+        self.resumed += 1
+        self.replayed_frames += replayed
+        logger.info("Client {} resumed after seq {}, replayed {} frames", client_id, last_seq, replayed)
+    
+    @staticmethod
+    async def _send_now(websocket: WebSocket, encoder: Optional[FrameEncoder], frames: List[Dict]):
+        """Write frames to the socket directly, bypassing its outbound queue."""
+        if encoder:
+            payload = encoder.encode(frames)
+            if encoder.binary:
+                await websocket.send_bytes(payload)
+            else:
+                await websocket.send_text(payload)
+        else:
+            for frame in frames:
+                await websocket.send_json(frame)
+        WS_MESSAGES.inc(len(frames))
+    
+    def is_active(self, client_id: str) -> bool:
+        """True while the client is connected or may still resume."""
+        return client_id in self.replay
+    
+    def _open_queue(self, websocket: WebSocket, client_id: str, agent_id: str = None, encoder: FrameEncoder = None):
+        key = (client_id, agent_id)
+        previous = self.outbound.pop(key, None)
+        if previous is not None:
+            previous.close()
+        
+        async def on_error():
+            if self.outbound.get(key) is queue:
+                await self.disconnect(client_id, agent_id, websocket)
+        
+        async def on_overflow():
+            if self.outbound.get(key) is not queue:
+                return
+            self.slow_disconnects += 1
+            await self.disconnect(client_id, agent_id, websocket)
+            try:
+                # 1013: try again later
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+        
+        queue = OutboundQueue(
+            websocket,
+            maxsize=self.send_queue_size,
+            policy=self.overflow_policy,
+            on_error=on_error,
+            on_overflow=on_overflow,
+            name=f"{client_id}" + (f"/{agent_id}" if agent_id else ""),
+            encoder=encoder
+        )
+        self.outbound[key] = queue
+    
+    def start_turn(self, client_id: str, coro: Coroutine[Any, Any, Any], agent_id: str = None) -> asyncio.Task:
+        """Run a turn as a task tied to the connection.
+        
+        A turn that is still running for the same connection is cancelled
+        first, so a new user message interrupts the previous one.
+        """
+        key = (client_id, agent_id)
+        if self.cancel_turn(client_id, agent_id):
+            logger.info("Interrupted running turn for client {} (agent {})", client_id, agent_id)
+        
+        task = asyncio.create_task(coro)
+        self.turn_tasks[key] = task
+        
+        def forget(finished: asyncio.Task):
+            if self.turn_tasks.get(key) is finished:
+                del self.turn_tasks[key]
+            if not finished.cancelled() and finished.exception():
+                logger.error("Turn for client {} failed: {}", client_id, finished.exception())
+        
+        task.add_done_callback(forget)
+        return task
+    
+    def cancel_turn(self, client_id: str, agent_id: str = None) -> bool:
+        """Cancel the running turn for a connection. Returns True if one was running."""
+        task = self.turn_tasks.pop((client_id, agent_id), None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+    
+    def mark_alive(self, client_id: str, agent_id: str = None):
+        """Record that a message (including a heartbeat pong) arrived on a connection."""
+        self.last_seen[(client_id, agent_id)] = time.monotonic()
+    
+    def _connections(self) -> List[Tuple[str, Optional[str], WebSocket]]:
+        connections = [(client_id, None, websocket) for client_id, websocket in self.active_connections.items()]
+        for client_id, agents in self.direct_agent_connections.items():
+            connections.extend((client_id, agent_id, websocket) for agent_id, websocket in agents.items())
+        return connections
+    
+    async def check_heartbeats(self, idle_timeout: float):
+        """Close connections that have been silent for ``idle_timeout`` seconds and ping the rest."""
+        now = time.monotonic()
+        for client_id, agent_id, websocket in self._connections():
+            if now - self.last_seen.get((client_id, agent_id), now) > idle_timeout:
+                logger.info("Closing idle WebSocket for client {} (agent {})", client_id, agent_id)
+                self.idle_disconnects += 1
+                WS_IDLE_DISCONNECTS.inc()
+                await self.disconnect(client_id, agent_id, websocket, grace=0)
+                try:
+                    await websocket.close(code=1001)
+                except Exception:
+                    pass
+            else:
+                await self.send_message(client_id, {"type": "ping", "timestamp": time.time()}, agent_id)
+    
+    async def run_heartbeat(self, interval: float, idle_timeout: float):
+        """Background task sending heartbeats every ``interval`` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.check_heartbeats(idle_timeout)
+            except Exception as e:
+                logger.error("Error in WebSocket heartbeat: {}", e)
     
     def is_client_connected(self, client_id: str, agent_id: str = None) -> bool:
         """Check if a client is currently connected via WebSocket"""
@@ -52,30 +563,53 @@ class WebSocketManager:
                    agent_id in self.direct_agent_connections[client_id])
         return client_id in self.active_connections
     
+    async def _forward(self, client_id: str, event: Dict):
+        """Publish a message for a client that is not connected to this worker."""
+        if self.bus is None:
+            return
+        self.forwarded += 1
+        event = dict(event, worker=self.worker_id)
+        trace_context = tracer.inject()
+        if trace_context:
+            event["trace"] = trace_context
+        await self.bus.publish(self.BUS_CHANNEL, event)
+    
+    async def _on_bus_event(self, event: Dict):
+        client_id = event["client_id"]
+        if event.get("worker") == self.worker_id or not self.is_active(client_id):
+            return
+        self.received += 1
+        # Frames forwarded from another worker stay in the sender's trace
+        with tracer.continue_trace(event.get("trace")):
+            if event.get("fanout"):
+                await self._fan_out_local(client_id, event["message"])
+            elif event.get("agent_id") in self.replay.get(client_id, {}):
+                await self._deliver_local(client_id, event["message"], event.get("agent_id"))
+    
     async def send_message(self, client_id: str, message: Dict, agent_id: str = None):
-        try:
-            print(f"Attempting to send message to client {client_id}" + (f" for agent {agent_id}" if agent_id else ""))
-            if agent_id:
-                if client_id in self.direct_agent_connections and agent_id in self.direct_agent_connections[client_id]:
-                    try:
-                        await self.direct_agent_connections[client_id][agent_id].send_json(message)
-                        print(f"Message sent successfully to client {client_id} for agent {agent_id}")
-                    except Exception as e:
-                        print(f"Error sending message to {client_id} for agent {agent_id}: {str(e)}")
-                        logger.error(f"Error sending message to {client_id} for agent {agent_id}: {str(e)}")
-                        await self.disconnect(client_id, agent_id)
-            else:
-                if client_id in self.active_connections:
-                    try:
-                        await self.active_connections[client_id].send_json(message)
-                        print(f"Message sent successfully to client {client_id}")
-                    except Exception as e:
-                        print(f"Error sending message to {client_id}: {str(e)}")
-                        logger.error(f"Error sending message to {client_id}: {str(e)}")
-                        await self.disconnect(client_id)
-        except Exception as e:
-            print(f"Unexpected error in send_message for {client_id}: {str(e)}")
-            logger.error(f"Unexpected error in send_message for {client_id}: {str(e)}")
+        if agent_id in self.replay.get(client_id, {}):
+            await self._deliver_local(client_id, message, agent_id)
+        else:
+            await self._forward(client_id, {"client_id": client_id, "agent_id": agent_id, "message": message})
+    
+    async def _deliver_local(self, client_id: str, message: Dict, agent_id: str = None):
+        """Queue a message on the connection's outbound queue; never waits for the network.
+        
+        Messages are sequenced and kept for replay even while the client is
+        between sockets. Pings are neither. Messages sent during a sampled
+        trace carry its ``trace_id``.
+        """
+        span = tracer.current_span()
+        if span is not None and "trace_id" not in message:
+            message = dict(message, trace_id=span.trace_id)
+        buffer = self.replay.get(client_id, {}).get(agent_id)
+        if buffer is not None and message.get("type") != "ping":
+            message = buffer.record(message)
+        queue = self.outbound.get((client_id, agent_id))
+        if queue is None:
+            return
+        # A copy: the queue may merge frames, the replay buffer must keep them as sent
+        queue.put(dict(message))
     
     async def broadcast(self, message: Dict):
         for client_id in list(self.active_connections.keys()):
@@ -90,6 +624,17 @@ class WebSocketManager:
         }
         await self.send_message(client_id, message, agent_id)
     
+    async def send_agent_delta(self, client_id: str, agent_name: str, content: str, agent_id: str = None, done: bool = False):
+        """Send a piece of a streamed agent response; ``done`` marks the last frame."""
+        message = {
+            "type": "agent_delta",
+            "agent": agent_name,
+            "content": content,
+            "done": done,
+            "timestamp": time.time()
+        }
+        await self.send_message(client_id, message, agent_id)
+    
     async def send_internal_comm(self, client_id: str, from_agent: str, to_agent: str, content: str):
         message = {
             "type": "internal_comm",
@@ -98,11 +643,36 @@ class WebSocketManager:
             "content": content,
             "timestamp": time.time()
         }
+        if self.is_active(client_id):
+            await self._fan_out_local(client_id, message)
+        else:
+            await self._forward(client_id, {"client_id": client_id, "message": message, "fanout": True})
+    
+    async def _fan_out_local(self, client_id: str, message: Dict):
         # Send to both main connection and relevant agent connections
-        await self.send_message(client_id, message)
-        if client_id in self.direct_agent_connections:
-            for agent_id in self.direct_agent_connections[client_id]:
-                await self.send_message(client_id, message, agent_id)
+        for agent_id in list(self.replay.get(client_id, {})):
+            await self._deliver_local(client_id, message, agent_id)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        queues = list(self.outbound.values())
+        return {
+            "connections": len(queues),
+            "queued": sum(len(queue) for queue in queues),
+            "max_queued": max((len(queue) for queue in queues), default=0),
+            "send_queue_size": self.send_queue_size,
+            "overflow_policy": self.overflow_policy,
+            "dropped": sum(queue.dropped for queue in queues),
+            "coalesced": sum(queue.coalesced for queue in queues),
+            "compact_connections": sum(1 for queue in queues if queue.encoder),
+            "content_refs": sum(queue.encoder.refs for queue in queues if queue.encoder),
+            "awaiting_resume": len(self.grace_timers),
+            "resumed": self.resumed,
+            "replayed_frames": self.replayed_frames,
+            "slow_disconnects": self.slow_disconnects,
+            "idle_disconnects": self.idle_disconnects,
+            "forwarded": self.forwarded,
+            "received": self.received,
+        }
     
     async def send_user_message(self, client_id: str, content: str, role: str = "user", agent_id: str = None):
         message = {
@@ -0,0 +1,168 @@
+from typing import Dict, Any, List, Optional
+import asyncio
+import bisect
+import hashlib
+import httpx
+from websockets.asyncio.client import connect as websocket_connect
+from fastapi import WebSocket
+from fastapi.responses import Response
+from loguru import logger
+from services.metrics import WORKER_PROXIED
+
+class HashRing:
+    """Consistent hashing of keys (client ids) onto worker nodes.
+
+    Each node is placed on the ring ``replicas`` times, so adding or
+    removing a worker only moves about 1/N of the clients.
+    """
+
+    def __init__(self, nodes: List[str] = None, replicas: int = 100):
+        self.replicas = replicas
+        self._ring: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes or []:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node: str):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            if point not in self._owners:
+                bisect.insort(self._ring, point)
+                self._owners[point] = node
+
+    def remove_node(self, node: str):
+        for replica in range(self.replicas):
+            point = self._hash(f"{node}#{replica}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._ring.remove(point)
+
+    def get_node(self, key: str) -> Optional[str]:
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring, self._hash(key)) % len(self._ring)
+        return self._owners[self._ring[index]]
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners.values()))
+
+class WorkerRouter:
+    """Sends each client's requests to the worker that owns its session.
+
+    Sessions, replay buffers and agent contexts live in one worker's
+    memory. Client ids are placed on a HashRing of the workers' private
+    ``host:port`` addresses (``nodes``); a worker that receives a request
+    or WebSocket for a client owned by another worker proxies it there.
+    ``node`` is this worker's own address. Without nodes everything is
+    served locally.
+    
+    Ids of resources a worker creates, such as jobs, start with its
+    ``id_prefix`` so that ``owner_of_id`` can find it again.
+    """
+
+    def __init__(self, nodes: List[str] = None, node: str = None, connect_timeout: float = 5.0):
+        self.nodes = list(nodes or [])
+        self.node = node
+        self.ring = HashRing(self.nodes)
+        self.connect_timeout = connect_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def owner(self, client_id: str) -> Optional[str]:
+        """The address of the worker owning ``client_id``, or None if it is this one."""
+        node = self.ring.get_node(client_id)
+        if node is None or node == self.node:
+            return None
+        return node
+
+    @property
+    def id_prefix(self) -> str:
+        """Prefix for ids minted on this worker: its position in ``nodes``."""
+        if self.node not in self.nodes:
+            return ""
+        return f"{self.nodes.index(self.node)}-"
+
+    def owner_of_id(self, resource_id: str) -> Optional[str]:
+        """The address of the worker that minted ``resource_id``, or None if it is this one."""
+        index, separator, _ = resource_id.partition("-")
+        if not separator or not index.isdigit() or int(index) >= len(self.nodes):
+            return None
+        node = self.nodes[int(index)]
+        return None if node == self.node else node
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # Pipeline runs take as long as the agents do: only connecting is bounded
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(None, connect=self.connect_timeout))
+        return self._client
+
+    async def forward(self, node: str, method: str, path: str, json: Dict[str, Any] = None) -> httpx.Response:
+        """Send a request to the worker at ``node`` and return its response."""
+        WORKER_PROXIED.labels("http").inc()
+        return await self.client.request(method, f"http://{node}{path}", json=json)
+
+    async def proxy(self, node: str, method: str, path: str, json: Dict[str, Any] = None) -> Response:
+        """``forward`` a request and pass the owner's response on unchanged."""
+        response = await self.forward(node, method, path, json)
+        return Response(response.content, response.status_code, media_type=response.headers.get("content-type"))
+
+    async def proxy_websocket(self, websocket: WebSocket, node: str):
+        """Pipe ``websocket`` to the same URL on the worker at ``node`` until either side closes.
+
+        The owner's close code is passed on to the client.
+        """
+        WORKER_PROXIED.labels("websocket").inc()
+        path = websocket.url.path
+        query = websocket.url.query
+        url = f"ws://{node}{path}" + (f"?{query}" if query else "")
+        try:
+            upstream = await websocket_connect(url, max_size=None)
+        except Exception as e:
+            logger.error("Could not reach worker {} for {}: {}", node, path, e)
+            await websocket.close(code=1011)
+            return
+        await websocket.accept()
+
+        async def client_to_upstream():
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+
+        async def upstream_to_client():
+            async for message in upstream:
+                if isinstance(message, str):
+                    await websocket.send_text(message)
+                else:
+                    await websocket.send_bytes(message)
+
+        tasks = [asyncio.ensure_future(client_to_upstream()), asyncio.ensure_future(upstream_to_client())]
+        done = set()
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+        if tasks[1] in done:
+            # The owner closed first: tell the client why
+            try:
+                await websocket.close(code=upstream.close_code or 1000)
+            except RuntimeError:
+                pass
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    @classmethod
+    def from_config(cls, config) -> "WorkerRouter":
+        nodes = [node.strip() for node in (config.WORKER_NODES or "").split(",") if node.strip()]
+        return cls(nodes, config.WORKER_NODE)
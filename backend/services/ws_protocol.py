@@ -0,0 +1,118 @@
+from typing import Dict, Any, List, Optional, Mapping
+from collections import OrderedDict
+import hashlib
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_ORJSON = "orjson"
+ENCODING_MSGPACK = "msgpack"
+
+def available_encodings() -> List[str]:
+    encodings = [ENCODING_JSON]
+    if orjson is not None:
+        encodings.append(ENCODING_ORJSON)
+    if msgpack is not None:
+        encodings.append(ENCODING_MSGPACK)
+    return encodings
+
+class FrameEncoder:
+    """Encodes a connection's frames in the compact protocol.
+
+    Frames queued within ``batch_window`` seconds are sent together as one
+    ``{"type": "batch", "frames": [...]}`` envelope. A ``content`` string of
+    at least ``ref_min_length`` characters is sent in full once, tagged with
+    ``content_id``; when the same text is sent again the frame carries
+    ``content_ref`` instead of ``content``. Clients must remember the
+    bodies of the last ``ref_limit`` ``content_id`` values, first in first
+    out; referencing a body does not make the client keep it longer.
+
+    The default protocol (no encoder) keeps sending one plain JSON frame
+    per message.
+    """
+
+    def __init__(self, encoding: str = ENCODING_JSON, batch_window: float = 0.02,
+                 ref_min_length: int = 256, ref_limit: int = 128):
+        if encoding not in available_encodings():
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        self.encoding = encoding
+        self.batch_window = batch_window
+        self.ref_min_length = ref_min_length
+        self.ref_limit = ref_limit
+        # Content digest -> id of the bodies the client still remembers, oldest id first
+        self._sent: "OrderedDict[bytes, int]" = OrderedDict()
+        self._next_id = 0
+        self.frames = 0
+        self.batches = 0
+        self.refs = 0
+
+    @property
+    def binary(self) -> bool:
+        return self.encoding == ENCODING_MSGPACK
+
+    def _with_refs(self, frame: Dict[str, Any]) -> Dict[str, Any]:
+        content = frame.get("content")
+        if not isinstance(content, str) or len(content) < self.ref_min_length:
+            return frame
+        digest = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+        content_id = self._sent.get(digest)
+        frame = dict(frame)
+        if content_id is not None:
+            del frame["content"]
+            frame["content_ref"] = content_id
+            self.refs += 1
+            return frame
+        content_id = self._next_id
+        self._next_id += 1
+        self._sent[digest] = content_id
+        if len(self._sent) > self.ref_limit:
+            self._sent.popitem(last=False)
+        frame["content_id"] = content_id
+        return frame
+
+    def encode(self, frames: List[Dict[str, Any]]):
+        """Return the payload for ``frames``: bytes for msgpack, text otherwise."""
+        frames = [self._with_refs(frame) for frame in frames]
+        self.frames += len(frames)
+        self.batches += 1
+        envelope = frames[0] if len(frames) == 1 else {"type": "batch", "frames": frames}
+        if self.encoding == ENCODING_MSGPACK:
+            return msgpack.packb(envelope, use_bin_type=True)
+        if self.encoding == ENCODING_ORJSON:
+            return orjson.dumps(envelope).decode("utf-8")
+        return json.dumps(envelope, separators=(",", ":"))
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "type": "protocol",
+            "protocol": "compact",
+            "encoding": self.encoding,
+            "batch_window": self.batch_window,
+            "ref_min_length": self.ref_min_length,
+            "ref_limit": self.ref_limit,
+        }
+
+    @classmethod
+    def negotiate(cls, params: Mapping[str, str], **options) -> Optional["FrameEncoder"]:
+        """Build an encoder from connect-time query parameters.
+
+        ``?protocol=compact`` opts in; ``encoding`` picks the serializer and
+        falls back to the fastest available one. Returns None for the
+        default plain JSON protocol.
+        """
+        if params.get("protocol") != "compact":
+            return None
+        encodings = available_encodings()
+        encoding = params.get("encoding")
+        if encoding not in encodings:
+            encoding = ENCODING_ORJSON if ENCODING_ORJSON in encodings else ENCODING_JSON
+        return cls(encoding=encoding, **options)
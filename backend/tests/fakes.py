@@ -0,0 +1,22 @@
+from typing import Dict, List
+
+class FakeWebSocket:
+    """Records what the server sends; enough of starlette's WebSocket for WebSocketManager."""
+
+    def __init__(self, query_params: Dict[str, str] = None, fail_after: int = None):
+        self.query_params = query_params or {}
+        self.sent: List[Dict] = []
+        self.closed_with = None
+        # Sends fail once this many frames went out, like a dropped connection
+        self.fail_after = fail_after
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, message: Dict):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise ConnectionResetError("connection dropped")
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.closed_with = code
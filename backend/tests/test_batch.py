@@ -0,0 +1,33 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+
+def test_zero_concurrency_is_rejected():
+    response = TestClient(main.app).post("/process/batch", json={"prompts": ["a"], "concurrency": 0})
+    assert response.status_code == 400
+
+def test_prompts_for_one_session_run_in_order(monkeypatch):
+    running = set()
+    overlaps = []
+    order = []
+
+    async def run_process_request(client_id, prompt, graph, use_cache=True, on_step_complete=None):
+        if client_id in running:
+            overlaps.append(client_id)
+        running.add(client_id)
+        await asyncio.sleep(0.01)
+        running.discard(client_id)
+        order.append(prompt)
+        return {}
+
+    monkeypatch.setattr(main, "run_process_request", run_process_request)
+    prompts = [{"prompt": f"shared {index}", "client_id": "shared"} for index in range(3)] + ["other"]
+    response = TestClient(main.app).post("/process/batch", json={"prompts": prompts, "concurrency": 4})
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["success"] == 4
+    assert overlaps == []
+    assert [prompt for prompt in order if prompt.startswith("shared")] == ["shared 0", "shared 1", "shared 2"]
@@ -0,0 +1,38 @@
+import asyncio
+
+import main
+from services.session_state import SessionState
+
+def test_interrupted_turn_does_not_clear_the_next_turns_histories(monkeypatch):
+    session = SessionState("client")
+
+    async def run_chat_turn(client_id, session, message, **kwargs):
+        history = session.get_agent_context("Research").message_history
+        # The previous turn's conversation is gone when a turn starts
+        assert history == []
+        history.append({"role": "user", "content": message})
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # Still unwinding while the next turn runs
+            await asyncio.sleep(0.05)
+            raise
+
+    async def send_user_message(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(main, "run_chat_turn", run_chat_turn)
+    monkeypatch.setattr(main.ws_manager, "send_user_message", send_user_message)
+
+    async def run():
+        first = asyncio.create_task(main.handle_chat_message("client", session, {"content": "first"}))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        second = asyncio.create_task(main.handle_chat_message("client", session, {"content": "second"}))
+        await asyncio.gather(first, return_exceptions=True)
+        history = list(session.get_agent_context("Research").message_history)
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        return history
+
+    assert asyncio.run(run()) == [{"role": "user", "content": "second"}]
@@ -0,0 +1,73 @@
+import asyncio
+import multiprocessing
+
+from fakes import FakeWebSocket
+from services.event_bus import EventBusRelay, LocalEventBus, MultiprocessEventBus
+from services.websocket_manager import WebSocketManager
+
+async def _hold_connection(address, authkey, ready, received):
+    """Worker that holds the client's socket and reports what reaches it."""
+    bus = MultiprocessEventBus(address, authkey)
+    await bus.start()
+    manager = WebSocketManager(bus=bus, worker_id="holder")
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, "client")
+    ready.set()
+    for _ in range(200):
+        if len(websocket.sent) >= 2:
+            break
+        await asyncio.sleep(0.025)
+    received.put([(frame["type"], frame["content"]) for frame in websocket.sent])
+    await bus.close()
+
+async def _send_from_elsewhere(address, authkey, ready):
+    """Worker that runs the turn for a client it has no socket for."""
+    bus = MultiprocessEventBus(address, authkey)
+    await bus.start()
+    manager = WebSocketManager(bus=bus, worker_id="sender")
+    ready.wait(10)
+    await manager.send_user_message("client", "reply", role="assistant")
+    await manager.send_internal_comm("client", "TaskManager", "Research", "plan")
+    await asyncio.sleep(0.5)
+    await bus.close()
+
+def holder(address, authkey, ready, received):
+    asyncio.run(_hold_connection(address, authkey, ready, received))
+
+def sender(address, authkey, ready):
+    asyncio.run(_send_from_elsewhere(address, authkey, ready))
+
+def test_message_reaches_client_connected_to_another_process():
+    relay = EventBusRelay().start()
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    received = context.Queue()
+    processes = [
+        context.Process(target=holder, args=(relay.address, relay.authkey, ready, received)),
+        context.Process(target=sender, args=(relay.address, relay.authkey, ready)),
+    ]
+    try:
+        for process in processes:
+            process.start()
+        frames = received.get(timeout=30)
+    finally:
+        for process in processes:
+            process.join(10)
+        relay.close()
+    assert frames == [("user_message", "reply"), ("internal_comm", "plan")]
+
+def test_worker_ignores_its_own_and_unknown_clients_events():
+    async def run():
+        bus = LocalEventBus()
+        first = WebSocketManager(bus=bus, worker_id="first")
+        second = WebSocketManager(bus=bus, worker_id="second")
+        websocket = FakeWebSocket()
+        await second.connect(websocket, "client")
+        await first.send_message("client", {"type": "agent_trace", "content": "x"})
+        await first.send_message("nobody", {"type": "agent_trace", "content": "y"})
+        await asyncio.sleep(0.05)
+        return websocket.sent, first.received, second.received
+
+    sent, first_received, second_received = asyncio.run(run())
+    assert [frame["content"] for frame in sent] == ["x"]
+    assert (first_received, second_received) == (0, 1)
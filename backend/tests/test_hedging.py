@@ -0,0 +1,78 @@
+import asyncio
+
+from services.hedging import CircuitBreaker, Hedger
+
+def test_half_open_breaker_lets_one_trial_call_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert [breaker.allow() for _ in range(5)] == [True, False, False, False, False]
+    breaker.release()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert all(breaker.allow() for _ in range(5))
+
+def test_losing_attempt_does_not_close_its_breaker():
+    hedger = Hedger(min_samples=1, breaker_failures=1, breaker_reset=0)
+    hedger._breaker("slow").record_failure()
+    # Hedge threshold 0: the hedge starts at once and wins
+    hedger._tracker("agent").record(0.0)
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "slow"
+
+    async def fast():
+        return "fast"
+
+    async def run():
+        return await hedger.run("agent", 10, [("slow", slow), ("fast", fast)])
+
+    assert asyncio.run(run()) == "fast"
+    breaker = hedger.breakers["slow"]
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.trial_in_flight
+
+def test_fallback_call_does_not_settle_another_calls_trial():
+    hedger = Hedger(breaker_failures=1, breaker_reset=0)
+    breaker = hedger._breaker("primary")
+    breaker.record_failure()
+    # Another call holds the half-open trial
+    assert breaker.allow()
+
+    async def fails():
+        raise RuntimeError("down")
+
+    async def run():
+        try:
+            await hedger.run("agent", 10, [("primary", fails)])
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.trial_in_flight
+
+def test_call_is_cancelled_when_its_budget_runs_out():
+    hedger = Hedger(min_samples=1, breaker_failures=1)
+    hedger._tracker("agent").record(0.0)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        started_at = asyncio.get_running_loop().time()
+        try:
+            await hedger.run("agent", 0.05, [("primary", slow), ("hedge", slow)])
+        except asyncio.TimeoutError:
+            return asyncio.get_running_loop().time() - started_at
+
+    elapsed = asyncio.run(run())
+    assert elapsed is not None and elapsed < 1
+    assert cancelled == [True, True]
+    assert hedger.breakers["primary"].state == CircuitBreaker.OPEN
@@ -0,0 +1,59 @@
+import asyncio
+
+from services.job_manager import JobManager, JOB_CANCELLED, JOB_COMPLETED
+
+def test_cancelling_a_queued_job_reports_it():
+    async def run():
+        updates = []
+
+        async def runner(job):
+            await asyncio.sleep(0)
+
+        async def on_update(job):
+            updates.append((job.id, job.status))
+
+        manager = JobManager(runner, max_workers=1, on_update=on_update)
+        # Accepted before the workers start
+        queued = manager.submit("client", "first")
+        assert await manager.cancel(queued.id)
+        kept = manager.submit("client", "second")
+        manager.start()
+        for _ in range(100):
+            if kept.finished:
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return queued, kept, updates
+
+    queued, kept, updates = asyncio.run(run())
+    assert queued.status == JOB_CANCELLED
+    assert kept.status == JOB_COMPLETED
+    assert updates[0] == (queued.id, JOB_CANCELLED)
+    assert (queued.id, "running") not in updates
+
+def test_cancel_while_reporting_the_start_stops_the_job():
+    async def run():
+        ran = []
+        manager = None
+
+        async def runner(job):
+            ran.append(job.id)
+
+        async def on_update(job):
+            if job.status == "running":
+                # A DELETE arriving while the start is being reported
+                await manager.cancel(job.id)
+
+        manager = JobManager(runner, max_workers=1, on_update=on_update)
+        job = manager.submit("client", "prompt")
+        manager.start()
+        for _ in range(100):
+            if job.finished:
+                break
+            await asyncio.sleep(0.01)
+        await manager.stop()
+        return job, ran
+
+    job, ran = asyncio.run(run())
+    assert job.status == JOB_CANCELLED
+    assert ran == []
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from services.session_state import SessionManager
+
+def test_removing_a_held_session_waits_for_its_last_holder():
+    manager = SessionManager()
+    session = manager.create_session("client")
+    agent_context = session.get_agent_context("Research")
+    with manager.hold(session):
+        with manager.hold(session):
+            # The WebSocket went away while a request and a job still run
+            manager.remove_session("client")
+        assert manager.get_session("client") is session
+        assert session.agent_contexts["Research"] is agent_context
+    assert manager.get_session("client") is None
+    assert session.agent_contexts == {}
+    assert manager.context_pool.get_stats()["free"] == 1
+
+def test_session_wanted_again_is_kept_after_its_holders():
+    manager = SessionManager()
+    session = manager.create_session("client")
+    with manager.hold(session):
+        manager.remove_session("client")
+        assert manager.get_session("client") is session
+        # The client reconnected before the request finished
+        assert asyncio.run(manager.get_or_create_session("client")) is session
+    assert manager.get_session("client") is session
+
+def test_held_sessions_do_not_expire():
+    manager = SessionManager(timeout=0)
+    session = manager.create_session("client")
+    session.last_accessed = time.time() - 10
+    with manager.hold(session):
+        assert manager.cleanup_expired_sessions() == 0
+    session.last_accessed = time.time() - 10
+    assert manager.cleanup_expired_sessions() == 1
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from services.session_state import SessionManager
+from services.session_store import SQLiteSessionStore
+
+def test_purge_sees_touches_queued_before_it(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), flush_interval=0.5)
+    now = time.time()
+    store.touch("old", now - 100, now - 100)
+    store.flush()
+    # Committed in one batch: the touch must land before the purge runs
+    store.touch("old", now - 100, now)
+    store.purge(now - 10)
+    data = store.load("old", {})
+    store.close()
+    assert data is not None
+    assert data["last_accessed"] == now
+
+def test_load_waits_for_queued_writes_of_the_session(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.db"), flush_interval=5)
+    store.touch("client", 1.0, 2.0)
+    store.append("client", "conversation", {"role": "user", "content": "hi", "timestamp": 2.0})
+    started_at = time.monotonic()
+    data = store.load("client", {"conversation": 10})
+    waited = time.monotonic() - started_at
+    store.close()
+    assert [event["content"] for event in data["events"]["conversation"]] == ["hi"]
+    # The flush cut the batch short instead of waiting out the interval
+    assert waited < 1
+    assert not store.has_pending_writes("client")
+
+def test_agent_histories_survive_leaving_memory(tmp_path):
+    async def run():
+        manager = SessionManager(store=SQLiteSessionStore(str(tmp_path / "sessions.db")))
+        session = await manager.get_or_create_session("client")
+        research = session.get_agent_context("Research")
+        research.message_history.append({"role": "user", "content": "hi"})
+        research.summary = "greeted"
+        manager.remove_session("client")
+
+        loaded = await manager.load_session("client")
+        restored = loaded.get_agent_context("Research").to_payload()
+        manager.close()
+        return restored
+
+    restored = asyncio.run(run())
+    assert restored["message_history"] == [{"role": "user", "content": "hi"}]
+    assert restored["summary"] == "greeted"
@@ -0,0 +1,42 @@
+import asyncio
+
+from agents.agent_context import AgentContext
+from agents.base_agent import BaseAgent, ACCEPT_DRAFT
+from agents.llm_backend import LLMBackend
+
+class ScriptedBackend(LLMBackend):
+    name = "scripted"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+
+    async def stream(self, messages):
+        for chunk in self.chunks:
+            # Chunks arrive over the network
+            await asyncio.sleep(0.001)
+            self.read += 1
+            yield chunk
+
+def _process_with_draft(backend):
+    agent = BaseAgent("Creative", "You write.", response_cache=None)
+    agent.backend = backend
+    speculation = {}
+    response = asyncio.run(agent.process_message(
+        "hi", previous_agent_response="upstream", agent_context=AgentContext("Creative"),
+        draft="draft", speculation=speculation
+    ))
+    return response, speculation
+
+def test_accepting_a_draft_stops_reading_the_check():
+    backend = ScriptedBackend([ACCEPT_DRAFT[:6], ACCEPT_DRAFT[6:], " because"] + ["..."] * 100)
+    response, speculation = _process_with_draft(backend)
+    assert response == "draft"
+    assert speculation["accepted"]
+    assert backend.read == 2
+
+def test_a_rejected_draft_is_replaced_by_the_revised_reply():
+    backend = ScriptedBackend(["Better ", "answer"])
+    response, speculation = _process_with_draft(backend)
+    assert response == "Better answer"
+    assert not speculation["accepted"]
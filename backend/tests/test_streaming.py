@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+from agents.base_agent import BaseAgent, default_response_cache
+from agents.agent_context import AgentContext
+from agents.llm_backend import LLMBackend
+from services.llm_scheduler import LLMScheduler
+from services.response_cache import ResponseCache
+
+class PausingBackend(LLMBackend):
+    name = "pausing"
+
+    async def stream(self, messages):
+        yield "a"
+        yield "b"
+        await asyncio.sleep(0.5)
+        yield "c"
+
+class RecordingManager:
+    def __init__(self):
+        self.frames = []
+        self.started_at = time.monotonic()
+
+    async def send_agent_delta(self, client_id, agent_name, content, agent_id=None, done=False):
+        self.frames.append((content, done, time.monotonic() - self.started_at))
+
+def test_buffered_delta_is_flushed_while_the_model_pauses():
+    manager = RecordingManager()
+    agent = BaseAgent("Research", "You research.", ws_manager=manager)
+    agent.backend = PausingBackend()
+
+    reply = asyncio.run(agent._stream_to_client([{"role": "user", "content": "hi"}], "client"))
+
+    assert reply == "abc"
+    assert [(content, done) for content, done, _ in manager.frames] == [("a", False), ("b", False), ("c", False), ("", True)]
+    # "b" goes out after the frame delay, not when "c" arrives
+    assert manager.frames[1][2] < 0.3
+
+def test_stream_generator_is_scheduled_and_cached():
+    agent = BaseAgent("Research", "You research.", response_cache=ResponseCache())
+    agent.backend = PausingBackend()
+    agent.scheduler = LLMScheduler(max_concurrency=1)
+
+    async def run():
+        active = []
+        async for chunk in agent.process_message_stream("hi", client_id="client", agent_context=AgentContext("Research")):
+            active.append(agent.scheduler.active)
+        cached = [chunk async for chunk in agent.process_message_stream("hi", client_id="client", agent_context=AgentContext("Research"))]
+        return active, cached
+
+    active, cached = asyncio.run(run())
+    # The slot is held while the model streams and released once it ends
+    assert active[:2] == [1, 1]
+    assert agent.scheduler.active == 0
+    assert agent.scheduler.completed == 1
+    assert cached == ["abc"]
+
+def test_agents_share_the_default_cache_unless_given_none():
+    shared = BaseAgent("Research", "You research.")
+    uncached = BaseAgent("Research", "You research.", response_cache=None)
+    assert shared.response_cache is default_response_cache
+    assert uncached.response_cache is None
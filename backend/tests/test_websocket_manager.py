@@ -0,0 +1,82 @@
+import asyncio
+
+from fakes import FakeWebSocket
+from services.websocket_manager import WebSocketManager
+
+def test_resume_after_overflow_does_not_repeat_merged_deltas():
+    async def run():
+        manager = WebSocketManager(send_queue_size=2)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")
+        # Queued faster than the writer runs: the queue overflows and merges deltas
+        for index in range(5):
+            await manager.send_agent_delta("client", "Research", f"[{index}]", done=index == 4)
+        buffered = [(frame["seq"], frame["content"]) for frame in manager.replay["client"][None].frames]
+        await asyncio.sleep(0.05)
+        await manager.disconnect("client", websocket=websocket)
+
+        last_seq = websocket.sent[-1]["seq"]
+        resumed = FakeWebSocket({"resume": str(last_seq)})
+        await manager.connect(resumed, "client")
+        await asyncio.sleep(0.05)
+        return buffered, websocket.sent, resumed.sent
+
+    buffered, sent, resumed = asyncio.run(run())
+    assert buffered == [(1, "[0]"), (2, "[1]"), (3, "[2]"), (4, "[3]"), (5, "[4]")]
+    assert [frame["seq"] for frame in sent] == sorted(frame["seq"] for frame in sent)
+    assert "".join(frame["content"] for frame in sent) == "[0][1][2][3][4]"
+    assert sent[-1]["done"]
+    assert [frame["type"] for frame in resumed] == ["resume"]
+    assert resumed[0]["replayed"] == 0
+
+def _drop_and_resume(policy, fail_after, send_between):
+    """Frames a client sees across a socket that drops after ``fail_after`` frames and its resume."""
+    async def run():
+        manager = WebSocketManager(send_queue_size=2, overflow_policy=policy)
+        websocket = FakeWebSocket(fail_after=fail_after)
+        await manager.connect(websocket, "client")
+        await manager.send_agent_delta("client", "Research", "x")
+        if send_between:
+            # The writer sends "x" before the rest is queued
+            await asyncio.sleep(0.01)
+        await manager.send_user_message("client", "next", role="system")
+        await manager.send_agent_delta("client", "Research", "y")
+        await manager.send_agent_delta("client", "Research", "z", done=True)
+        await asyncio.sleep(0.05)
+        await manager.disconnect("client", websocket=websocket)
+
+        last_seq = websocket.sent[-1]["seq"] if websocket.sent else 0
+        resumed = FakeWebSocket({"resume": str(last_seq)})
+        await manager.connect(resumed, "client")
+        await asyncio.sleep(0.05)
+        return websocket.sent + resumed.sent[1:]
+
+    return asyncio.run(run())
+
+def test_merged_deltas_never_overtake_other_frames():
+    for policy in ("drop_oldest", "coalesce"):
+        for send_between in (False, True):
+            for fail_after in range(4):
+                frames = _drop_and_resume(policy, fail_after, send_between)
+                text = "".join(frame["content"] if frame["type"] == "agent_delta" else "|" for frame in frames)
+                assert text == "x|yz", (policy, send_between, fail_after)
+
+def test_long_replay_does_not_overflow_the_queue():
+    async def run():
+        manager = WebSocketManager(send_queue_size=2, overflow_policy="disconnect")
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "client")
+        await manager.disconnect("client", websocket=websocket)
+        for index in range(50):
+            await manager.send_agent_trace("client", "Research", str(index))
+
+        resumed = FakeWebSocket({"resume": "0"})
+        await manager.connect(resumed, "client")
+        await manager.send_agent_trace("client", "Research", "live")
+        await asyncio.sleep(0.05)
+        return resumed
+
+    resumed = asyncio.run(run())
+    assert resumed.closed_with is None
+    assert resumed.sent[0]["replayed"] == 50
+    assert [frame["content"] for frame in resumed.sent[1:]] == [str(index) for index in range(50)] + ["live"]
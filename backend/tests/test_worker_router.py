@@ -0,0 +1,34 @@
+from services.worker_router import HashRing, WorkerRouter
+
+NODES = ["127.0.0.1:9001", "127.0.0.1:9002", "127.0.0.1:9003", "127.0.0.1:9004"]
+
+def test_removing_a_node_only_moves_its_clients():
+    ring = HashRing(NODES)
+    clients = [f"client-{index}" for index in range(1000)]
+    before = {client: ring.get_node(client) for client in clients}
+    assert set(before.values()) == set(NODES)
+
+    ring.remove_node(NODES[0])
+    moved = [client for client in clients if ring.get_node(client) != before[client]]
+    assert moved == [client for client in clients if before[client] == NODES[0]]
+
+def test_router_serves_its_own_clients_and_names_the_owner_of_others():
+    routers = [WorkerRouter(NODES, node) for node in NODES]
+    for client in (f"client-{index}" for index in range(100)):
+        owners = [router.owner(client) for router in routers]
+        # Exactly one worker serves the client; the others agree on who it is
+        assert owners.count(None) == 1
+        local = routers[owners.index(None)].node
+        assert all(owner in (None, local) for owner in owners)
+
+def test_router_without_nodes_serves_everything_locally():
+    assert WorkerRouter().owner("client") is None
+
+def test_ids_minted_on_a_worker_route_back_to_it():
+    routers = [WorkerRouter(NODES, node) for node in NODES]
+    job_id = routers[2].id_prefix + "abc"
+    assert routers[2].owner_of_id(job_id) is None
+    assert all(router.owner_of_id(job_id) == NODES[2] for index, router in enumerate(routers) if index != 2)
+    # Ids from a single-worker setup are served locally
+    assert routers[0].owner_of_id("0123abc") is None
+    assert WorkerRouter().id_prefix == ""
@@ -0,0 +1,16 @@
+import json
+
+from services.ws_protocol import FrameEncoder
+
+def test_refs_only_point_at_bodies_a_fifo_client_still_has():
+    encoder = FrameEncoder(ref_min_length=1, ref_limit=2)
+    # What the documented client keeps: the last ref_limit content ids
+    remembered = {}
+    for content in ["a", "b", "a", "c", "a", "b", "a"]:
+        frame = json.loads(encoder.encode([{"type": "agent_trace", "content": content}]))
+        if "content_ref" in frame:
+            assert remembered[frame["content_ref"]] == content
+        else:
+            remembered[frame["content_id"]] = frame["content"]
+            for content_id in sorted(remembered)[:-2]:
+                del remembered[content_id]
@@ -119,6 +119,12 @@ export const useWebSocketChat = (clientId: string, agentId: string, initialConte
           try {
             const data = JSON.parse(event.data);
             
+            // Heartbeat: the server closes connections that stay silent
+            if (data.type === 'ping') {
+              ws.send(JSON.stringify({ type: 'pong' }));
+              return;
+            }
+            
             if (data.type === 'user_message') {
               setMessages(prev => [...prev, {
                 role: data.role,
@@ -95,6 +95,12 @@ export function DirectAgentChat({ agentId, agentName, clientId, onClose }: Direc
         const data = JSON.parse(event.data);
         console.log(`Received message from ${agentName}:`, data);
         
+        // Heartbeat: the server closes connections that stay silent
+        if (data.type === 'ping') {
+          ws.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+        
         if (data.type === 'user_message') {
           // Only add messages from the assistant role to prevent duplicates
           if (data.role === 'assistant') {
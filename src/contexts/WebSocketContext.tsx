@@ -1,4 +1,4 @@
-import React, { createContext, useContext, useEffect, useState, useCallback, useMemo, ReactNode } from 'react';
+import React, { createContext, useContext, useEffect, useState, useCallback, useMemo, useRef, ReactNode } from 'react';
 import { v4 as uuidv4 } from 'uuid';
 import { toast } from 'sonner';
 import { 
@@ -62,11 +62,14 @@ export const WebSocketProvider: React.FC<WebSocketProviderProps> = ({ children }
   const [agentTraces, setAgentTraces] = useState<AgentTrace[]>([]);
   const [internalComms, setInternalComms] = useState<InternalComm[]>([]);
   const [isSubmitting, setIsSubmitting] = useState<boolean>(false);
+  // Sequence number of the last frame received, used to resume after a reconnect
+  const lastSeqRef = useRef<number | null>(null);
 
   // Connect to WebSocket
   const connectWebSocket = useCallback(() => {
     try {
-      const ws = new WebSocket(`ws://localhost:8000/ws/${clientId}`);
+      const resume = lastSeqRef.current !== null ? `?resume=${lastSeqRef.current}` : '';
+      const ws = new WebSocket(`ws://localhost:8000/ws/${clientId}${resume}`);
       
       ws.onopen = () => {
         setConnectionState(prev => ({
@@ -104,6 +107,9 @@ export const WebSocketProvider: React.FC<WebSocketProviderProps> = ({ children }
       ws.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data) as WebSocketMessage;
+          if (data.seq !== undefined) {
+            lastSeqRef.current = data.seq;
+          }
           
           switch (data.type) {
             case 'agent_trace':
@@ -153,6 +159,17 @@ export const WebSocketProvider: React.FC<WebSocketProviderProps> = ({ children }
               }]);
               break;
               
+            case 'ping':
+              ws.send(JSON.stringify({ type: 'pong' }));
+              break;
+              
+            case 'resume':
+              // Missed frames follow; if some were lost the turn still completes
+              if (!data.complete) {
+                toast.warning('Some updates were missed while disconnected');
+              }
+              break;
+              
             default:
               console.warn('Unknown message type:', data);
           }
@@ -239,6 +256,10 @@ export const WebSocketProvider: React.FC<WebSocketProviderProps> = ({ children }
                 }]);
                 break;
                 
+              case 'ping':
+                ws.send(JSON.stringify({ type: 'pong' }));
+                break;
+                
               default:
                 console.warn('Unknown message type:', data);
             }
@@ -53,7 +53,7 @@ export interface ErrorMessage {
   message: string;
 }
 
-export type WebSocketMessage = 
+export type WebSocketMessage = (
   | {
       type: 'user_message';
       content: string;
@@ -77,7 +77,24 @@ export type WebSocketMessage =
       type: 'error';
       message: string;
       timestamp: number;
-    };
+    }
+  | {
+      type: 'ping';
+      timestamp: number;
+    }
+  | {
+      type: 'resume';
+      last_seq: number;
+      replayed: number;
+      complete: boolean;
+      timestamp: number;
+    }
+) & {
+  // Sequence number of the frame on its connection; pings have none
+  seq?: number;
+  // Set on frames of sampled turns, to find the turn's trace
+  trace_id?: string;
+};
 
 // Direct Agent Communication
 export interface DirectAgentMessage {
@@ -108,6 +125,11 @@ export interface StatusResponse {
   status: 'running' | 'error';
   autogen_installed: boolean;
   openai_api_key_configured: boolean;
+  llm_backend?: string;
+  ready?: boolean;
+  warm_up?: 'pending' | 'running' | 'ready' | 'failed';
+  startup_seconds?: number | null;
+  warm_up_seconds?: number | null;
 }
 
 // Health Response